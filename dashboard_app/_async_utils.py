@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Any, Coroutine, Optional
+
+
+class LoopRunner:
+	"""
+	Long-lived event loop running on a dedicated daemon thread, one per process.
+	Callbacks submit their coroutines to it, so loop-bound resources (e.g. the asyncpg pool) outlive a single callback.
+	"""
+
+	def __init__(self, name: str = "dashboard-loop"):
+		self.name = name
+		self._loop: Optional[asyncio.AbstractEventLoop] = None
+		self._thread: Optional[threading.Thread] = None
+		self._lock = threading.Lock()
+		# forked worker processes inherit the runner without its thread, start a new loop there
+		os.register_at_fork(after_in_child=self._reset)
+
+	def _reset(self):
+		self._loop = None
+		self._thread = None
+		self._lock = threading.Lock()
+
+	def get_loop(self) -> asyncio.AbstractEventLoop:
+		"""Get the runner loop, starting its thread on first use"""
+		with self._lock:
+			if self._loop is None or self._loop.is_closed():
+				self._loop = asyncio.new_event_loop()
+				self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+				self._thread.start()
+			return self._loop
+
+	def run(self, coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+		"""Run a coroutine on the runner loop and wait for its result"""
+		return asyncio.run_coroutine_threadsafe(coro, self.get_loop()).result(timeout)
+
+	def submit(self, coro: Coroutine[Any, Any, Any]):
+		"""Schedule a coroutine on the runner loop without waiting for it"""
+		return asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+
+
+# process-wide loop runner
+loop_runner = LoopRunner()
+
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import time
+
+import diskcache
+
+# consecutive failures opening a breaker and the time it stays open before a trial call
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30  # seconds
+
+
+class CircuitOpenError(Exception):
+	"""Raised when a call is rejected by an open circuit breaker"""
+	pass
+
+
+class CircuitBreaker:
+	"""
+	Circuit breaker shared by all processes.
+	Opens after consecutive failures and rejects calls for the reset timeout, then lets a single trial call through (half-open),
+	which closes the breaker on success or opens it again on failure.
+	"""
+
+	def __init__(self, store: diskcache.Cache, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+		self.store = store
+		self.name = name
+		self.key = f"breaker/{name}"
+		self.failure_threshold = failure_threshold
+		self.reset_timeout = reset_timeout
+
+	def is_open(self) -> bool:
+		"""Check whether calls are rejected right now"""
+		_, opened_at = self.store.get(self.key, (0, None))
+		return opened_at is not None and time.time() - opened_at < self.reset_timeout
+
+	def check(self):
+		"""Raise CircuitOpenError when the breaker is open, letting only one trial call through once the reset timeout passed"""
+		if self.key not in self.store:
+			return
+		with self.store.transact():
+			failures, opened_at = self.store.get(self.key, (0, None))
+			if opened_at is None:
+				return
+			if time.time() - opened_at < self.reset_timeout:
+				raise CircuitOpenError(f"Circuit breaker {self.name} is open after {failures} failures")
+			# half-open, the other callers are rejected until the trial call finishes
+			self.store.set(self.key, (failures, time.time()))
+
+	def record_success(self):
+		"""Close the breaker"""
+		if self.key in self.store:
+			self.store.delete(self.key)
+
+	def record_failure(self):
+		"""Count a failure, opening the breaker at the failure threshold"""
+		with self.store.transact():
+			failures, opened_at = self.store.get(self.key, (0, None))
+			failures += 1
+			if failures >= self.failure_threshold:
+				if opened_at is None:
+					print(f"🔌 Opening circuit breaker {self.name} after {failures} failures")
+				opened_at = time.time()
+			self.store.set(self.key, (failures, opened_at))
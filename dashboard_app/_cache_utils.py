@@ -0,0 +1,865 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# default directory of the local file cache
+CACHE_QUERIES_DIR = os.path.join(os.getcwd(), "dashboard_app", "cached-queries")
+# manifest of the local file cache entries (sqlite database in the cache directory)
+CACHE_MANIFEST_FILE = "manifest.sqlite"
+# eviction of expired entries is checked at most once per interval per process (the byte budget on every write)
+CACHE_GC_INTERVAL = 60  # seconds
+# suffix of the cache files being written
+CACHE_TMP_SUFFIX = ".tmp"
+# the query keys are locked through a fixed number of lock files (keys sharing a file wait on each other)
+QUERY_LOCK_STRIPES = 4096
+QUERY_LOCK_POLL_INTERVAL = 0.05  # seconds
+# byte budget of the shared memory cache of the worker processes and its index (the segments live in the shared memory filesystem)
+SHARED_CACHE_BYTES = 512 * 1024 * 1024
+SHARED_CACHE_INDEX = os.path.join(os.path.dirname(__file__), "dash_cache", "shared-cache.sqlite")
+SHARED_MEMORY_DIR = "/dev/shm"
+# lookups only read the index, the access times and holders of the hits are written with the next write or after the interval
+SHARED_CACHE_FLUSH_INTERVAL = 1.0  # seconds
+
+
+# ---- Cache Formats ----
+# schema metadata key of the cache entry metadata (data version, range end, ...)
+CACHE_METADATA_KEY = b"dashboard_app"
+
+
+class CacheFormat(ABC):
+	"""File format of the cached query results"""
+	extension: str = ""
+	# suffixes of the files written next to a cached result
+	sidecars: List[str] = []
+
+	@abstractmethod
+	def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+		"""Read a cached result, optionally projecting only the given columns"""
+		pass
+
+	@abstractmethod
+	def write(self, path: str, df: pd.DataFrame, metadata: Optional[Dict[str, str]] = None):
+		"""Write a result to the cache together with its entry metadata"""
+		pass
+
+	@abstractmethod
+	def read_metadata(self, path: str) -> Dict[str, str]:
+		"""Read only the entry metadata of a cached result"""
+		pass
+
+	@abstractmethod
+	def open_writer(self, path: str, metadata: Optional[Dict[str, str]] = None) -> ChunkWriter:
+		"""Open a writer of a result written chunk by chunk (e.g. a streamed query result)"""
+		pass
+
+	def write_atomic(self, path: str, df: pd.DataFrame, metadata: Optional[Dict[str, str]] = None):
+		"""Write a result to a temporary file renamed into place, so concurrent readers never see a partially written result"""
+		with self._replace_atomic(path) as tmp_path:
+			self.write(tmp_path, df, metadata)
+
+	@contextlib.contextmanager
+	def open_writer_atomic(self, path: str, metadata: Optional[Dict[str, str]] = None) -> Iterator[ChunkWriter]:
+		"""Write a result chunk by chunk to a temporary file renamed into place once all chunks are written"""
+		with self._replace_atomic(path) as tmp_path:
+			writer = self.open_writer(tmp_path, metadata)
+			try:
+				yield writer
+			finally:
+				writer.close()
+
+	@contextlib.contextmanager
+	def _replace_atomic(self, path: str) -> Iterator[str]:
+		"""Get a temporary path to write an entry to, renamed into place (with its sidecars) when the block succeeds"""
+		tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}{CACHE_TMP_SUFFIX}"
+		try:
+			yield tmp_path
+			# the sidecars first, the result file appearing completes the entry
+			for sidecar in self.sidecars:
+				os.replace(f"{tmp_path}{sidecar}", f"{path}{sidecar}")
+			os.replace(tmp_path, path)
+		except BaseException:
+			for file in [tmp_path, *[f"{tmp_path}{sidecar}" for sidecar in self.sidecars]]:
+				with contextlib.suppress(OSError):
+					os.remove(file)
+			raise
+
+
+class ChunkWriter(ABC):
+	"""Writes a result to a cache file chunk by chunk, holding only the written chunk in memory"""
+
+	@abstractmethod
+	def write(self, df: pd.DataFrame):
+		pass
+
+	@abstractmethod
+	def close(self):
+		pass
+
+
+def _to_arrow_table(df: pd.DataFrame, metadata: Optional[Dict[str, str]]) -> pa.Table:
+	"""Convert a DataFrame to an Arrow table with the entry metadata in its schema"""
+	table = pa.Table.from_pandas(df, preserve_index=False)
+	return table.replace_schema_metadata({ **(table.schema.metadata or { }), CACHE_METADATA_KEY: json.dumps(metadata or { }) })
+
+
+def _from_arrow_schema(schema: pa.Schema) -> Dict[str, str]:
+	"""Get the entry metadata from an Arrow schema"""
+	return json.loads((schema.metadata or { }).get(CACHE_METADATA_KEY, b"{}"))
+
+
+def _widen_schema(schema: pa.Schema, other: pa.Schema) -> pa.Schema:
+	"""Get the schema holding the values of both schemas (of the same columns), columns of incompatible types become strings"""
+	fields = []
+	for field in schema:
+		try:
+			fields.append(pa.unify_schemas([pa.schema([field]), pa.schema([other.field(field.name)])], promote_options="permissive").field(0))
+		except (pa.ArrowInvalid, pa.ArrowTypeError):
+			fields.append(field.with_type(pa.string()))
+	# the pandas metadata has the dtypes of the first chunk, only the entry metadata still holds
+	return pa.schema(fields, metadata={ CACHE_METADATA_KEY: schema.metadata[CACHE_METADATA_KEY] })
+
+
+class ArrowChunkWriter(ChunkWriter):
+	"""
+	Writes chunks as Arrow tables (Parquet row groups or IPC record batches), opened with the schema of the first chunk.
+	A later chunk with wider column types (e.g. fractional values after integral ones, values in a column that was all NULLs) widens the schema,
+	the written batches are then rewritten one by one with the wider types. Columns of incompatible types become strings.
+	"""
+
+	def __init__(self, path: str, open_writer: Callable[[str, pa.Schema], Any], read_batches: Callable[[str], Iterator[pa.RecordBatch]],
+	             metadata: Optional[Dict[str, str]] = None):
+		self.path = path
+		self._open_writer = open_writer
+		self._read_batches = read_batches
+		self.metadata = metadata
+		self._writer = None
+		self._schema: Optional[pa.Schema] = None
+
+	def write(self, df: pd.DataFrame):
+		table = _to_arrow_table(df, self.metadata)
+		if self._writer is None:
+			self._schema = table.schema
+			self._writer = self._open_writer(self.path, self._schema)
+		elif not table.schema.equals(self._schema):
+			schema = _widen_schema(self._schema, table.schema)
+			if not schema.equals(self._schema):
+				self._rewrite(schema)
+		self._writer.write_table(table.cast(self._schema))
+
+	def _rewrite(self, schema: pa.Schema):
+		"""Rewrite the written batches with a wider schema, holding one batch in memory at a time"""
+		self._writer.close()
+		narrow_path = f"{self.path}.narrow"
+		os.replace(self.path, narrow_path)
+		try:
+			self._writer = self._open_writer(self.path, schema)
+			for batch in self._read_batches(narrow_path):
+				self._writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+		finally:
+			os.remove(narrow_path)
+		self._schema = schema
+
+	def close(self):
+		if self._writer is not None:
+			self._writer.close()
+
+
+class CsvChunkWriter(ChunkWriter):
+	"""Appends chunks to a CSV file, the header is written with the first chunk and the metadata sidecar on close"""
+
+	def __init__(self, path: str, metadata: Optional[Dict[str, str]] = None):
+		self.path = path
+		self.metadata = metadata
+		self._file = open(path, "w", newline="")
+		self._header = True
+
+	def write(self, df: pd.DataFrame):
+		df.to_csv(self._file, index=False, header=self._header)
+		self._header = False
+
+	def close(self):
+		self._file.close()
+		with open(f"{self.path}.json", "w") as f:
+			json.dump(self.metadata or { }, f)
+
+
+class CsvCacheFormat(CacheFormat):
+	"""Legacy CSV cache format (loses dtypes, kept for backwards compatibility)"""
+	extension = "csv"
+	sidecars = [".json"]
+
+	def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+		csv = pd.read_csv(path, usecols=columns)
+		# replace NaN with None
+		return csv.where(pd.notnull(csv), None)
+
+	def write(self, path: str, df: pd.DataFrame, metadata: Optional[Dict[str, str]] = None):
+		df.to_csv(path, index=False)
+		# CSV has no schema, keep the metadata in a sidecar file
+		with open(f"{path}.json", "w") as f:
+			json.dump(metadata or { }, f)
+
+	def open_writer(self, path: str, metadata: Optional[Dict[str, str]] = None) -> ChunkWriter:
+		return CsvChunkWriter(path, metadata)
+
+	def read_metadata(self, path: str) -> Dict[str, str]:
+		if not os.path.exists(f"{path}.json"):
+			# make sure a missing entry is still a cache miss
+			os.stat(path)
+			return { }
+		with open(f"{path}.json", "r") as f:
+			return json.load(f)
+
+
+class ParquetCacheFormat(CacheFormat):
+	"""Columnar Parquet cache format keeping the result schema"""
+	extension = "parquet"
+
+	def __init__(self, compression: str = "zstd"):
+		self.compression = compression
+
+	def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+		return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+	def write(self, path: str, df: pd.DataFrame, metadata: Optional[Dict[str, str]] = None):
+		pq.write_table(_to_arrow_table(df, metadata), path, compression=self.compression)
+
+	def open_writer(self, path: str, metadata: Optional[Dict[str, str]] = None) -> ChunkWriter:
+		return ArrowChunkWriter(path, lambda path, schema: pq.ParquetWriter(path, schema, compression=self.compression), self._read_batches, metadata)
+
+	@staticmethod
+	def _read_batches(path: str) -> Iterator[pa.RecordBatch]:
+		with pq.ParquetFile(path) as parquet_file:
+			yield from parquet_file.iter_batches()
+
+	def read_metadata(self, path: str) -> Dict[str, str]:
+		return _from_arrow_schema(pq.read_schema(path, memory_map=True))
+
+
+class ArrowCacheFormat(CacheFormat):
+	"""Arrow IPC (Feather v2) cache format, uncompressed so it can be memory-mapped without copying"""
+	extension = "arrow"
+
+	def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+		return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+	def write(self, path: str, df: pd.DataFrame, metadata: Optional[Dict[str, str]] = None):
+		feather.write_feather(_to_arrow_table(df, metadata), path, compression="uncompressed")
+
+	def open_writer(self, path: str, metadata: Optional[Dict[str, str]] = None) -> ChunkWriter:
+		# Feather v2 is the Arrow IPC file format
+		return ArrowChunkWriter(path, pa.ipc.new_file, self._read_batches, metadata)
+
+	@staticmethod
+	def _read_batches(path: str) -> Iterator[pa.RecordBatch]:
+		with pa.memory_map(path) as source:
+			reader = pa.ipc.open_file(source)
+			for i in range(reader.num_record_batches):
+				yield reader.get_batch(i)
+
+	def read_metadata(self, path: str) -> Dict[str, str]:
+		with pa.memory_map(path) as source:
+			return _from_arrow_schema(pa.ipc.open_file(source).schema)
+
+
+cache_formats: Dict[str, type[CacheFormat]] = {
+	"csv": CsvCacheFormat,
+	"parquet": ParquetCacheFormat,
+	"arrow": ArrowCacheFormat,
+}
+
+
+def get_cache_format(name: str) -> CacheFormat:
+	"""Get a cache format instance by its name"""
+	if name not in cache_formats:
+		raise ValueError(f"Unknown cache format '{name}', expected one of {list(cache_formats.keys())}")
+	return cache_formats[name]()
+
+
+# ---- Memory Cache ----
+@dataclass
+class MemoryCacheEntry:
+	df: pd.DataFrame
+	size: int
+	expires_at: Optional[float] = None
+	metadata: Dict[str, str] = field(default_factory=dict)
+
+
+class MemoryCache:
+	"""In-process LRU cache of query results limited by a byte budget"""
+
+	def __init__(self, max_bytes: int):
+		self.max_bytes = max_bytes
+		self.size = 0
+		self._entries: OrderedDict[str, MemoryCacheEntry] = OrderedDict()
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def get_size(df: pd.DataFrame) -> int:
+		"""Get the in-memory size of a DataFrame in bytes"""
+		return int(df.memory_usage(index=True, deep=True).sum())
+
+	def get(self, key: str) -> Optional[pd.DataFrame]:
+		"""Get a copy-on-write view of a cached result, returns None on cache miss or expired entry"""
+		entry = self.get_entry(key)
+		return entry.df if entry is not None else None
+
+	def get_entry(self, key: str) -> Optional[MemoryCacheEntry]:
+		"""Get a cache entry with a copy-on-write view of its result, returns None on cache miss or expired entry"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				return None
+			if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+				self._remove(key)
+				return None
+			# mark as most recently used
+			self._entries.move_to_end(key)
+			return MemoryCacheEntry(df=entry.df.copy(deep=False), size=entry.size, expires_at=entry.expires_at, metadata=entry.metadata)
+
+	def put(self, key: str, df: pd.DataFrame, ttl: Optional[float] = None, metadata: Optional[Dict[str, str]] = None):
+		"""Store a result, evicting the least recently used entries to stay within the byte budget"""
+		size = self.get_size(df)
+		if size > self.max_bytes:
+			return
+		with self._lock:
+			if key in self._entries:
+				self._remove(key)
+			while self._entries and self.size + size > self.max_bytes:
+				self._remove(next(iter(self._entries)))
+			self._entries[key] = MemoryCacheEntry(
+				df=df.copy(deep=False),
+				size=size,
+				expires_at=time.monotonic() + ttl if ttl is not None else None,
+				metadata=metadata or { },
+			)
+			self.size += size
+
+	def invalidate(self, key: str):
+		"""Remove a result from the cache"""
+		with self._lock:
+			if key in self._entries:
+				self._remove(key)
+
+	def invalidate_matching(self, predicate: Callable[[str], bool]):
+		"""Remove the results whose key matches the predicate"""
+		with self._lock:
+			for key in [key for key in self._entries if predicate(key)]:
+				self._remove(key)
+
+	def clear(self):
+		"""Remove all results from the cache"""
+		with self._lock:
+			self._entries.clear()
+			self.size = 0
+
+	def _remove(self, key: str):
+		self.size -= self._entries.pop(key).size
+
+
+# ---- Shared Memory Cache ----
+class SharedMemoryCache:
+	"""
+	LRU cache of query results shared by all worker processes, limited by a byte budget.
+	Each result is an Arrow IPC stream in its own shared memory segment, indexed in a small sqlite database shared by the processes.
+	Readers map the segment and get a DataFrame whose numeric columns are zero-copy views of it (other columns are converted).
+	The index counts the readers still holding a view per process: evicted segments are unlinked once no reader holds them,
+	and the views of dead processes are dropped.
+	Lookups do not take the index write lock, the hits are recorded in batches (a segment unlinked meanwhile stays mapped).
+	"""
+
+	def __init__(self, index_path: str = SHARED_CACHE_INDEX, max_bytes: int = SHARED_CACHE_BYTES):
+		self.index_path = index_path
+		# writing past the free space of the shared memory filesystem crashes the writer (SIGBUS), so stay well within it
+		if os.path.isdir(SHARED_MEMORY_DIR):
+			stats = os.statvfs(SHARED_MEMORY_DIR)
+			max_bytes = min(max_bytes, stats.f_bavail * stats.f_frsize // 2)
+		self.max_bytes = max_bytes
+		self._conn: Optional[sqlite3.Connection] = None
+		self._pid: Optional[int] = None
+		self._lock = threading.Lock()
+		# segments whose views were garbage collected, released in the index by the next cache operation
+		self._released: deque[str] = deque()
+		# segments read by lookups (with the access time), recorded as held in the index by the next cache operation
+		self._accessed: deque[Tuple[str, float]] = deque()
+		self._last_flush = 0.0
+
+	def _get_conn(self) -> sqlite3.Connection:
+		"""Get the index connection of this process"""
+		# forked processes must not reuse the parent's connection
+		if self._conn is None or self._pid != os.getpid():
+			os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+			self._conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None, check_same_thread=False)
+			self._conn.execute("PRAGMA journal_mode=WAL")
+			self._conn.execute("PRAGMA synchronous=NORMAL")
+			self._conn.execute(
+				"CREATE TABLE IF NOT EXISTS segments (segment TEXT PRIMARY KEY, key TEXT NOT NULL, size INTEGER NOT NULL, metadata TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL, evicted INTEGER NOT NULL DEFAULT 0)"
+			)
+			self._conn.execute("CREATE INDEX IF NOT EXISTS segments_key ON segments (key)")
+			self._conn.execute("CREATE TABLE IF NOT EXISTS holders (segment TEXT NOT NULL, pid INTEGER NOT NULL, refs INTEGER NOT NULL, PRIMARY KEY (segment, pid))")
+			self._pid = os.getpid()
+			self._released.clear()
+			self._accessed.clear()
+		return self._conn
+
+	@contextlib.contextmanager
+	def _transaction(self) -> Iterator[sqlite3.Connection]:
+		"""Run an index transaction holding the write lock, recording the hits and releasing the collected views first"""
+		with self._lock:
+			conn = self._get_conn()
+			conn.execute("BEGIN IMMEDIATE")
+			try:
+				# the hits first, a view is released only after its hit
+				while self._accessed:
+					segment, accessed_at = self._accessed.popleft()
+					conn.execute("UPDATE segments SET accessed_at = MAX(accessed_at, ?) WHERE segment = ?", (accessed_at, segment))
+					conn.execute("INSERT INTO holders VALUES (?, ?, 1) ON CONFLICT (segment, pid) DO UPDATE SET refs = refs + 1", (segment, os.getpid()))
+				while self._released:
+					segment = self._released.popleft()
+					conn.execute("UPDATE holders SET refs = refs - 1 WHERE segment = ? AND pid = ?", (segment, os.getpid()))
+				conn.execute("DELETE FROM holders WHERE refs <= 0")
+				yield conn
+				conn.execute("COMMIT")
+				self._last_flush = time.monotonic()
+			except BaseException:
+				conn.execute("ROLLBACK")
+				raise
+
+	@staticmethod
+	def _attach(segment: str) -> shared_memory.SharedMemory:
+		"""Map an existing segment, the cache (not the resource tracker of this process) decides when it is unlinked"""
+		shm = shared_memory.SharedMemory(name=segment)
+		resource_tracker.unregister(shm._name, "shared_memory")
+		return shm
+
+	@staticmethod
+	def _unlink(segments: List[str]):
+		for segment in segments:
+			try:
+				# attaching registers the segment with the resource tracker again, unlinking unregisters it
+				shm = shared_memory.SharedMemory(name=segment)
+				shm.close()
+				shm.unlink()
+			except FileNotFoundError:
+				pass
+
+	@staticmethod
+	def _collect(conn: sqlite3.Connection) -> List[str]:
+		"""Remove the evicted segments no reader holds from the index, returns them to be unlinked"""
+		segments = [row[0] for row in conn.execute("SELECT segment FROM segments WHERE evicted = 1 AND segment NOT IN (SELECT segment FROM holders)")]
+		conn.executemany("DELETE FROM segments WHERE segment = ?", [(segment,) for segment in segments])
+		return segments
+
+	def _release(self, segment: str, shm: shared_memory.SharedMemory, pid: int):
+		"""Unmap a segment once its last view in this process is garbage collected"""
+		if os.getpid() != pid:
+			# a forked process inherited the view, the holder is the parent
+			return
+		shm.close()
+		self._released.append(segment)
+
+	def get(self, key: str) -> Optional[pd.DataFrame]:
+		"""Get a view of a cached result, returns None on cache miss or expired entry"""
+		entry = self.get_entry(key)
+		return entry.df if entry is not None else None
+
+	def get_entry(self, key: str) -> Optional[MemoryCacheEntry]:
+		"""
+		Get a cache entry with a view of its result mapped from shared memory, returns None on cache miss or expired entry.
+		The lookup only reads the index, expired entries are evicted by the next write.
+		"""
+		now = time.time()
+		with self._lock:
+			row = self._get_conn().execute("SELECT segment, size, metadata, expires_at FROM segments WHERE key = ? AND evicted = 0", (key,)).fetchone()
+		if row is None:
+			return None
+		segment, size, metadata, expires_at = row
+		if expires_at is not None and expires_at <= now:
+			return None
+
+		try:
+			shm = self._attach(segment)
+		except FileNotFoundError:
+			# evicted since the lookup, or lost with a reboot (the segments do not survive it, the index does)
+			with self._transaction() as conn:
+				conn.execute("DELETE FROM segments WHERE segment = ?", (segment,))
+				conn.execute("DELETE FROM holders WHERE segment = ?", (segment,))
+			return None
+		# the hit is recorded before the view can be released
+		self._accessed.append((segment, now))
+		if time.monotonic() - self._last_flush > SHARED_CACHE_FLUSH_INTERVAL:
+			with self._transaction():
+				pass
+		# the views keep this memoryview alive, the segment is released when the last of them is garbage collected
+		view = shm.buf[:size]
+		weakref.finalize(view, self._release, segment, shm, os.getpid())
+		table = pa.ipc.open_stream(pa.py_buffer(view)).read_all()
+		return MemoryCacheEntry(
+			df=table.to_pandas(split_blocks=True),
+			size=size,
+			expires_at=time.monotonic() + expires_at - now if expires_at is not None else None,
+			metadata=json.loads(metadata),
+		)
+
+	def put(self, key: str, df: pd.DataFrame, ttl: Optional[float] = None, metadata: Optional[Dict[str, str]] = None):
+		"""Store a result in a new segment, evicting the least recently used entries to stay within the byte budget"""
+		table = _to_arrow_table(df, metadata)
+		sink = pa.MockOutputStream()
+		with pa.ipc.new_stream(sink, table.schema) as writer:
+			writer.write_table(table)
+		size = sink.size()
+		if size > self.max_bytes:
+			return
+
+		segment = f"dash_{uuid.uuid4().hex[:16]}"
+		shm = shared_memory.SharedMemory(name=segment, create=True, size=size)
+		resource_tracker.unregister(shm._name, "shared_memory")
+		try:
+			buffer = pa.py_buffer(shm.buf)
+			with pa.ipc.new_stream(pa.FixedSizeBufferWriter(buffer), table.schema) as writer:
+				writer.write_table(table)
+			del buffer, writer
+		except BaseException:
+			shm.close()
+			self._unlink([segment])
+			raise
+		shm.close()
+
+		now = time.time()
+		with self._transaction() as conn:
+			# readers still holding the replaced result keep it until they drop it
+			conn.execute("UPDATE segments SET evicted = 1 WHERE key = ?", (key,))
+			conn.execute("INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?, 0)", (segment, key, size, json.dumps(metadata or { }), now + ttl if ttl is not None else None, now))
+			segments = self._evict(conn)
+		self._unlink(segments)
+
+	def _evict(self, conn: sqlite3.Connection) -> List[str]:
+		"""Evict the expired entries and the least recently used entries over the byte budget (held segments count until released), returns the segments to unlink"""
+		pids = [row[0] for row in conn.execute("SELECT DISTINCT pid FROM holders")]
+		for pid in pids:
+			try:
+				os.kill(pid, 0)
+			except ProcessLookupError:
+				conn.execute("DELETE FROM holders WHERE pid = ?", (pid,))
+			except PermissionError:
+				pass
+		conn.execute("UPDATE segments SET evicted = 1 WHERE evicted = 0 AND expires_at <= ?", (time.time(),))
+		excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM segments").fetchone()[0] - self.max_bytes
+		if excess > 0:
+			for segment, size in conn.execute("SELECT segment, size FROM segments WHERE evicted = 0 ORDER BY accessed_at").fetchall():
+				if excess <= 0:
+					break
+				conn.execute("UPDATE segments SET evicted = 1 WHERE segment = ?", (segment,))
+				excess -= size
+		return self._collect(conn)
+
+	def invalidate(self, key: str):
+		"""Remove a result from the cache"""
+		self.invalidate_matching(lambda other: other == key)
+
+	def invalidate_matching(self, predicate: Callable[[str], bool]):
+		"""Remove the results whose key matches the predicate"""
+		with self._transaction() as conn:
+			rows = conn.execute("SELECT segment, key FROM segments WHERE evicted = 0").fetchall()
+			conn.executemany("UPDATE segments SET evicted = 1 WHERE segment = ?", [(segment,) for segment, key in rows if predicate(key)])
+			segments = self._collect(conn)
+		self._unlink(segments)
+
+	def clear(self):
+		"""Remove all results from the cache"""
+		self.invalidate_matching(lambda key: True)
+
+	def get_stats(self) -> Dict[str, int]:
+		"""Get the number and size of the cached results and of the evicted segments still held by readers"""
+		with self._transaction() as conn:
+			segments = self._evict(conn)
+			row = conn.execute(
+				"SELECT COUNT(*) FILTER (WHERE evicted = 0), COALESCE(SUM(size) FILTER (WHERE evicted = 0), 0), COUNT(*) FILTER (WHERE evicted = 1), COALESCE(SUM(size) FILTER (WHERE evicted = 1), 0) FROM segments"
+			).fetchone()
+		self._unlink(segments)
+		return { "entries": row[0], "size": row[1], "held": row[2], "held_size": row[3] }
+
+
+# ---- File Cache Manifest ----
+@dataclass
+class CacheEntryStats:
+	query_name: str
+	entries: int
+	size: int
+
+
+class CacheManifest:
+	"""
+	Index of the local file cache entries with their size and access time, shared by all processes.
+	Keeps the file cache within a byte budget (least recently used entries are evicted first) and removes entries older than the TTL,
+	without walking the cache directory tree.
+	"""
+
+	def __init__(self, cache_dir: str, max_bytes: Optional[int] = None, ttl: Optional[float] = None, key_version: Optional[str] = None):
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self.ttl = ttl
+		self.key_version = key_version
+		self._conn: Optional[sqlite3.Connection] = None
+		self._pid: Optional[int] = None
+		self._lock = threading.Lock()
+
+	def _get_conn(self) -> sqlite3.Connection:
+		"""
+		Get the manifest connection of this process, indexing the existing cache files when the manifest is created
+		and purging the entries written with another format of the cache keys.
+		"""
+		# forked processes must not reuse the parent's connection
+		if self._conn is None or self._pid != os.getpid():
+			os.makedirs(self.cache_dir, exist_ok=True)
+			path = os.path.join(self.cache_dir, CACHE_MANIFEST_FILE)
+			created = not os.path.exists(path)
+			self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+			self._conn.execute("PRAGMA journal_mode=WAL")
+			self._conn.execute("PRAGMA synchronous=NORMAL")
+			self._conn.execute(
+				"CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, query_name TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+			)
+			self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+			self._conn.execute("CREATE INDEX IF NOT EXISTS entries_query_name ON entries (query_name)")
+			self._conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+			self._pid = os.getpid()
+			if created:
+				self._index_existing()
+			if self.key_version is not None:
+				self._purge_key_version()
+		return self._conn
+
+	def _index_existing(self):
+		"""Index the cache files written before the manifest existed (one-time directory walk)"""
+		rows = []
+		for root, _, files in os.walk(self.cache_dir):
+			if root == self.cache_dir:
+				continue
+			for file in files:
+				if file.endswith(".json") or file.endswith(CACHE_TMP_SUFFIX):
+					continue
+				path = os.path.join(root, file)
+				stat = os.stat(path)
+				key = f"{os.path.relpath(root, self.cache_dir)}/{os.path.splitext(file)[0]}"
+				rows.append((key, os.path.splitext(file)[0], path, stat.st_size, stat.st_mtime, stat.st_mtime))
+		self._conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+	def _purge_key_version(self):
+		"""
+		Remove all entries (and their files) when the cache keys changed format since they were written, their results are unreachable by the new keys.
+		The first process to see the new key version purges, the version check and the deletion are one transaction.
+		"""
+		self._conn.execute("BEGIN IMMEDIATE")
+		try:
+			row = self._conn.execute("SELECT value FROM settings WHERE name = 'key_version'").fetchone()
+			if row is not None and row[0] == self.key_version:
+				self._conn.execute("COMMIT")
+				return
+			rows = self._conn.execute("SELECT key, path, size FROM entries").fetchall()
+			self._conn.execute("DELETE FROM entries")
+			self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('key_version', ?)", (self.key_version,))
+			self._conn.execute("COMMIT")
+		except BaseException:
+			self._conn.execute("ROLLBACK")
+			raise
+		freed = self._remove_files(rows)
+		if rows:
+			print(f"🧹 Purged {len(rows)} cached queries of a previous key format ({freed / 1024 / 1024:.1f} MiB)")
+
+	def open(self):
+		"""Open the manifest ahead of writing a cache file, so the file is not indexed (and purged) as one written before the manifest existed"""
+		with self._lock:
+			self._get_conn()
+
+	def reindex(self):
+		"""Rebuild the manifest from the cache files (e.g. after they were changed outside of the manifest)"""
+		with self._lock:
+			conn = self._get_conn()
+			conn.execute("DELETE FROM entries")
+			self._index_existing()
+
+	def record_write(self, key: str, query_name: str, path: str, size: int):
+		"""Add or replace an entry, then evict entries over the byte budget (and expired entries once per GC interval)"""
+		now = time.time()
+		with self._lock:
+			conn = self._get_conn()
+			conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", (key, query_name, path, size, now, now))
+			# the last GC time is shared by all processes (and kept across restarts)
+			last_gc = conn.execute("SELECT value FROM settings WHERE name = 'last_gc'").fetchone()
+		self.evict(expired=last_gc is None or now - float(last_gc[0]) > CACHE_GC_INTERVAL)
+
+	def record_access(self, key: str):
+		"""Mark an entry as recently used"""
+		with self._lock:
+			self._get_conn().execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+
+	def get_keys(self, query_name: str) -> List[str]:
+		"""Get the keys of the entries of a query"""
+		with self._lock:
+			return [row[0] for row in self._get_conn().execute("SELECT key FROM entries WHERE query_name = ?", (query_name,))]
+
+	def get_size(self) -> int:
+		"""Get the total size of the entries in bytes"""
+		with self._lock:
+			return self._get_conn().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+	def get_stats(self) -> List[CacheEntryStats]:
+		"""Get the number of entries and their size per query name, largest first"""
+		with self._lock:
+			rows = self._get_conn().execute("SELECT query_name, COUNT(*), SUM(size) FROM entries GROUP BY query_name ORDER BY SUM(size) DESC").fetchall()
+		return [CacheEntryStats(query_name, entries, size) for query_name, entries, size in rows]
+
+	def remove(self, keys: List[str]) -> int:
+		"""Remove entries and their files, returns the number of freed bytes"""
+		if not keys:
+			return 0
+		with self._lock:
+			conn = self._get_conn()
+			rows = []
+			for i in range(0, len(keys), 500):
+				chunk = keys[i:i + 500]
+				rows += conn.execute(f"SELECT key, path, size FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+				conn.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+		return self._remove_files(rows)
+
+	@staticmethod
+	def _remove_files(rows: List[Tuple[str, str, int]]) -> int:
+		"""Remove the files of removed entries (key, path, size rows), returns the number of freed bytes"""
+		freed = 0
+		for _, path, size in rows:
+			for file in (path, f"{path}.json"):
+				try:
+					os.remove(file)
+				except FileNotFoundError:
+					pass
+				except OSError as e:
+					print(f"Failed to remove cached query {file}: {e}")
+			# remove the emptied parameter directory
+			try:
+				os.rmdir(os.path.dirname(path))
+			except OSError:
+				pass
+			freed += size
+		return freed
+
+	def evict(self, expired: bool = True) -> int:
+		"""Remove the expired entries (when asked) and the least recently used entries over the byte budget, returns the number of freed bytes"""
+		keys = []
+		with self._lock:
+			conn = self._get_conn()
+			if expired and self.ttl is not None:
+				conn.execute("INSERT OR REPLACE INTO settings VALUES ('last_gc', ?)", (str(time.time()),))
+				keys += [row[0] for row in conn.execute("SELECT key FROM entries WHERE created_at < ?", (time.time() - self.ttl,))]
+			if self.max_bytes is not None:
+				excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self.max_bytes
+				if excess > 0:
+					for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+						if excess <= 0:
+							break
+						if key not in keys:
+							keys.append(key)
+							excess -= size
+		freed = self.remove(keys)
+		if keys:
+			print(f"🧹 Evicted {len(keys)} cached queries ({freed / 1024 / 1024:.1f} MiB)")
+		return freed
+
+
+# ---- Query Locks ----
+class QueryLocks:
+	"""
+	Advisory file locks of the query keys shared by all processes, so only one process computes a missing result.
+	The operating system releases the locks of crashed or killed processes, so the locks need no expiry.
+	"""
+
+	def __init__(self, directory: str, stripes: int = QUERY_LOCK_STRIPES):
+		self.directory = directory
+		self.stripes = stripes
+
+	def get_path(self, key: str) -> str:
+		"""Get the lock file of a key"""
+		stripe = int(hashlib.md5(key.encode()).hexdigest(), 16) % self.stripes
+		return os.path.join(self.directory, f"{stripe:04x}.lock")
+
+	@contextlib.asynccontextmanager
+	async def hold(self, key: str) -> AsyncIterator[None]:
+		"""Hold the lock of a key, waiting (without blocking the event loop) while another process or task holds it"""
+		os.makedirs(self.directory, exist_ok=True)
+		# each holder opens its own file description, so tasks of the same process exclude each other too
+		fd = os.open(self.get_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+		try:
+			while True:
+				try:
+					fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+					break
+				except BlockingIOError:
+					await asyncio.sleep(QUERY_LOCK_POLL_INTERVAL)
+			yield
+		finally:
+			# closing the file releases the lock
+			os.close(fd)
+
+
+# ---- CSV Cache Migration ----
+def read_legacy_csv(path: str) -> pd.DataFrame:
+	"""Read a legacy CSV cache file, restoring the datetime columns it stored as strings"""
+	df = pd.read_csv(path)
+	for column in df.columns:
+		if df[column].dtype != object:
+			continue
+		values = df[column].dropna()
+		if values.empty or not values.map(lambda v: isinstance(v, str)).all():
+			continue
+		try:
+			df[column] = pd.to_datetime(df[column], format="ISO8601")
+		except (ValueError, TypeError):
+			pass
+	return df
+
+
+if __name__ == '__main__':
+	# usage: python -m dashboard_app._cache_utils migrate (migrates the legacy CSV cache of the preset date ranges, run it before the app)
+	# usage: python -m dashboard_app._cache_utils stats (prints the file cache size per query)
+	# usage: python -m dashboard_app._cache_utils shared (prints the shared memory cache size)
+	if len(sys.argv) > 1 and sys.argv[1] == "stats":
+		for stats in CacheManifest(CACHE_QUERIES_DIR).get_stats():
+			print(f"{stats.size / 1024 / 1024:>10.1f} MiB  {stats.entries:>6} entries  {stats.query_name}")
+		sys.exit(0)
+	if len(sys.argv) > 1 and sys.argv[1] == "shared":
+		shared_stats = SharedMemoryCache().get_stats()
+		print(f"{shared_stats['size'] / 1024 / 1024:>10.1f} MiB  {shared_stats['entries']:>6} entries")
+		print(f"{shared_stats['held_size'] / 1024 / 1024:>10.1f} MiB  {shared_stats['held']:>6} evicted segments still held by readers")
+		sys.exit(0)
+	if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+		# the legacy keys can be recomputed only for known executions, the ones of the warm-up
+		from dashboard_app._async_utils import loop_runner
+		from dashboard_app.app import create_cache_warmer
+
+		cache_warmer = create_cache_warmer()
+		print(f"-- Migrating the CSV query cache to {cache_warmer.query_manager.cache_format.extension} --")
+		migrated = loop_runner.run(cache_warmer.query_manager.migrate_csv_cache([(task.query_name, task.parameters) for task in cache_warmer.get_tasks()]))
+		print(f"-- Migrated {migrated} cached queries --")
+		sys.exit(0)
+	print("usage: python -m dashboard_app._cache_utils migrate|stats|shared")
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import datetime
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from dashboard_app._db_utils import BucketSpec, QueryDefinition, QueryManager, QueryParameter
+
+# directory of the SQL query catalog, one query per file named after the query
+QUERIES_DIR = os.path.join(os.path.dirname(__file__), "queries")
+# reload the changed SQL files while the app is running (development)
+CATALOG_HOT_RELOAD = False
+CATALOG_RELOAD_INTERVAL = 2  # seconds
+
+# types of the "-- param <name>: <type>" declarations
+parameter_types: Dict[str, type] = {
+	"datetime": datetime.datetime,
+	"date": datetime.date,
+	"int": int,
+	"float": float,
+	"str": str,
+	"bool": bool,
+}
+# options of the parameter declarations, e.g. "-- param date_to: datetime grid=minute bound=end"
+parameter_options = ["grid", "bound"]
+
+
+def _parse_bool(value: str) -> bool:
+	if value.lower() not in ("true", "false"):
+		raise ValueError(f"Expected true or false, got '{value}'")
+	return value.lower() == "true"
+
+
+def _parse_list(value: str) -> List[str]:
+	return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# QueryDefinition options of the "-- <option>: <value>" header lines
+header_options: Dict[str, Callable[[str], Any]] = {
+	"description": str,
+	"default_data": str,
+	"ttl": float,
+	"streaming": _parse_bool,
+	"chunk_size": int,
+	"priority": str,
+	"heavy": _parse_bool,
+	"fresh_for": float,
+	"max_staleness": float,
+	"read_only": _parse_bool,
+	"max_replica_lag": float,
+	"materialized": _parse_bool,
+	# bucket grids and key columns of additive queries
+	"buckets": _parse_list,
+	"bucket_keys": _parse_list,
+}
+
+HEADER_LINE = re.compile(r"^--\s*(param\s+)?(\w+)\s*:\s*(.*?)\s*$")
+PLACEHOLDER = re.compile(r":(\w+)\$(\d+)")
+
+
+def parse_sql_query(name: str, sql_file: str, overrides: Optional[Dict[str, Any]] = None) -> QueryDefinition:
+	"""
+	Compile a catalog SQL file into a query definition.
+	The leading comment block declares the options ("-- ttl: 60") and the parameter types ("-- param date_from: datetime grid=minute"),
+	the parameters and their positions come from the ":name$n" placeholders.
+	"""
+	options: Dict[str, Any] = { }
+	declared: Dict[str, QueryParameter] = { }
+	for line in sql_file.splitlines():
+		if not line.strip():
+			continue
+		if not line.startswith("--"):
+			break
+		match = HEADER_LINE.match(line)
+		if match is None:
+			continue
+		is_param, key, value = match.groups()
+		if is_param:
+			# "<type> [grid=<grid>] [bound=start|end]"
+			type_name, *param_options = value.split()
+			if type_name not in parameter_types:
+				raise ValueError(f"Unknown type '{type_name}' of parameter {key} in query {name}, expected one of {list(parameter_types.keys())}")
+			param_options = dict(option.partition("=")[::2] for option in param_options)
+			unknown = [option for option in param_options if option not in parameter_options]
+			if unknown:
+				raise ValueError(f"Unknown options {unknown} of parameter {key} in query {name}, expected some of {parameter_options}")
+			declared[key] = QueryParameter(key, parameter_types[type_name], **param_options)
+		elif key in header_options:
+			options[key] = header_options[key](value)
+		else:
+			raise ValueError(f"Unknown option '{key}' in query {name}, expected one of {list(header_options.keys())}")
+
+	positions: Dict[int, str] = { }
+	for param_name, position in PLACEHOLDER.findall(sql_file):
+		if positions.setdefault(int(position), param_name) != param_name:
+			raise ValueError(f"Parameters {positions[int(position)]} and {param_name} share the position ${position} in query {name}")
+	if sorted(positions.keys()) != list(range(1, len(positions) + 1)):
+		raise ValueError(f"Parameter positions of query {name} are not consecutive from $1: {sorted(positions.keys())}")
+	undeclared = [p for p in positions.values() if p not in declared]
+	if undeclared:
+		raise ValueError(f"Parameters {undeclared} of query {name} have no type declaration")
+
+	grids, keys = options.pop("buckets", None), options.pop("bucket_keys", None)
+	if grids is not None:
+		options["buckets"] = BucketSpec(grids=grids, keys=keys or [])
+	options.update(overrides or { })
+	return QueryDefinition(
+		name=name,
+		sql=QueryManager.process_sql_query(sql_file),
+		parameters=[declared[positions[i]] for i in sorted(positions.keys())],
+		**options
+	)
+
+
+class QueryCatalog:
+	"""
+	Registers the SQL files of the query catalog into the registry of a query manager.
+	Options that cannot be declared in SQL (e.g. reducers or bucket finalizers) are given as overrides per query name.
+	"""
+
+	def __init__(self, query_manager: QueryManager, directory: str = QUERIES_DIR, overrides: Optional[Dict[str, Dict[str, Any]]] = None):
+		self.query_manager = query_manager
+		self.directory = directory
+		self.overrides = overrides or { }
+		# modification time of the loaded files by query name
+		self._mtimes: Dict[str, float] = { }
+		self._watcher: Optional[threading.Thread] = None
+
+	def _scan(self) -> Dict[str, str]:
+		"""Get the catalog files by query name"""
+		return {
+			file[:-len(".sql")]: os.path.join(self.directory, file)
+			for file in sorted(os.listdir(self.directory))
+			if file.endswith(".sql")
+		}
+
+	def load(self) -> List[str]:
+		"""
+		Register the new and changed catalog files, returns the names of the (re)registered queries.
+		Cached results of changed queries are invalidated, files failing to compile keep their previous definition.
+		"""
+		changed = []
+		for name, path in self._scan().items():
+			mtime = os.path.getmtime(path)
+			if self._mtimes.get(name) == mtime:
+				continue
+			reloaded = name in self._mtimes
+			self._mtimes[name] = mtime
+			try:
+				with open(path, "r") as f:
+					query_def = parse_sql_query(name, f.read(), self.overrides.get(name))
+			except Exception as e:
+				print(f"🚨 Failed to load query {name}: {e}")
+				continue
+			self.query_manager.registry.register_query(query_def)
+			if reloaded:
+				print(f"🔄 Reloaded query {name}")
+				self.query_manager.invalidate_query(name)
+			changed.append(name)
+		return changed
+
+	def watch(self, interval: float = CATALOG_RELOAD_INTERVAL):
+		"""Hot reload the changed catalog files on a daemon thread"""
+		if self._watcher is not None:
+			return
+
+		def poll():
+			while True:
+				time.sleep(interval)
+				try:
+					self.load()
+				except Exception as e:
+					print(f"Failed to reload the query catalog: {e}")
+
+		self._watcher = threading.Thread(target=poll, name="query-catalog-watcher", daemon=True)
+		self._watcher.start()
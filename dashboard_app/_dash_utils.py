@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import hashlib
+import inspect
+import json
 import os
-from uuid import uuid4
+from typing import Any, Callable, Sequence, Tuple
 
 import diskcache
 import dash
+from plotly.utils import PlotlyJSONEncoder
+
+from dashboard_app._db_utils import get_data_version_scope
 
 # use optimized directory for cache usage
 CACHE_DIR = os.path.join(os.path.dirname(__file__), 'dash_cache')
@@ -16,31 +22,49 @@ cache = diskcache.Cache(
 	eviction_policy='least-recently-used',
 )
 
-# unique launch_uid to refresh cache when the app restarts
-launch_uid = uuid4()
-background_callback_manager = dash.DiskcacheManager(
-	cache,
-	cache_by=[lambda: launch_uid],
-	expire=300
-)
+# callback outputs are cached for 5 minutes
+CALLBACK_CACHE_EXPIRE = 300
+
+
+class CallbackCache:
+	"""
+	Outputs of the query callbacks, shared across sessions and worker processes and scoped by the source data version of their date range.
+	The callbacks run in the long-lived server process (on its loop runner, reusing the pool and the memory caches),
+	so their outputs are cached here instead of by a background callback manager forking a process per call.
+	"""
+
+	def __init__(self, cache: diskcache.Cache, expire: float = CALLBACK_CACHE_EXPIRE):
+		self.cache = cache
+		self.expire = expire
+
+	@staticmethod
+	def get_callback_id(func: Callable) -> str:
+		"""Get the id of a callback, changing with its source code (like the background callback managers)"""
+		return f"{func.__name__}/{hashlib.md5(inspect.getsource(func).encode()).hexdigest()}"
+
+	@staticmethod
+	def get_key(callback_id: str, args: Sequence[Any]) -> str:
+		"""
+		Get the cache key of a callback call, only calls whose date range reaches the live tail change with the data version.
+		The key is the same in every worker process: the arguments are JSON values of the browser, serialized with sorted keys.
+		"""
+		return f"callback/{hashlib.md5(json.dumps([callback_id, list(args), get_data_version_scope(list(args))], default=str, sort_keys=True).encode()).hexdigest()}"
+
+	def get(self, key: str) -> Tuple[bool, Any]:
+		"""Get the cached output of a callback call, returns whether it was cached and the output"""
+		output = self.cache.get(key, default=_MISSING)
+		return (False, None) if output is _MISSING else (True, output)
+
+	def set(self, key: str, output: Any):
+		"""Cache the output of a callback call as JSON (like the background callback results), the components are sent to the browser as is"""
+		outputs = output if isinstance(output, (list, tuple)) else [output]
+		if any(value is dash.no_update for value in outputs):
+			return
+		self.cache.set(key, json.loads(json.dumps(output, cls=PlotlyJSONEncoder)), expire=self.expire)
 
 
-def create_cache_key(callback_id: str):
-	"""Create a cache key for a callback with an ID"""
-	scoped_cache_dir = os.path.join(CACHE_DIR, callback_id)
-	os.makedirs(scoped_cache_dir, exist_ok=True)
-	return dash.DiskcacheManager(
-		cache=diskcache.Cache(
-			directory=scoped_cache_dir,
-			size_limit=3e9,
-			eviction_policy='least-recently-used',
-		),
-		cache_by=[
-			lambda: launch_uid,
-			lambda: callback_id,
-		],
-		expire=300
-	)
+_MISSING = object()
+callback_cache = CallbackCache(cache)
 
 
 external_script = ["https://tailwindcss.com/", { "src": "https://cdn.tailwindcss.com" }]
@@ -1,17 +1,121 @@
 from __future__ import annotations, annotations
 
 import asyncio
+import contextlib
+import contextvars
+import copy
+import datetime
 import hashlib
 import os
+import random
 import re
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 
 import asyncpg
+import diskcache
 import pandas as pd
 
+from dashboard_app._breaker_utils import CircuitBreaker, CircuitOpenError
+from dashboard_app._cache_utils import CACHE_QUERIES_DIR, SHARED_CACHE_BYTES, SHARED_CACHE_INDEX, CacheFormat, CacheManifest, MemoryCache, QueryLocks, SharedMemoryCache, \
+	get_cache_format, read_legacy_csv
+from dashboard_app._decode_utils import records_to_dataframe
+from dashboard_app._explain_utils import PlanCapture
+from dashboard_app._metrics_utils import query_metrics
+from dashboard_app._scheduler_utils import DEFAULT_PRIORITY, PRIORITY_CLASSES, QueryScheduler
+
 LOG_CACHE = False
+# file format of the local query cache ("parquet", "arrow" or legacy "csv")
+CACHE_FORMAT = "parquet"
+# query execution backend: "postgres", or "duckdb" to run the additive queries in-process over local Parquet snapshots
+# (offline, e.g. without the database reachable), the other queries are then served from the cache only
+QUERY_BACKEND = "postgres"
+QUERY_BACKENDS = ["postgres", "duckdb"]
+# byte budget of the in-process memory cache tier (0 disables it)
+MEMORY_CACHE_BYTES = 256 * 1024 * 1024
+# byte budget of the local file cache (least recently used results are evicted) and the age of results removed from it
+DISK_CACHE_BYTES = 4 * 1024 * 1024 * 1024
+DISK_CACHE_TTL = 14 * 24 * 60 * 60  # seconds
+# format version of the query keys (bump when get_query_key or serialize_parameter change),
+# the local file cache entries of another version are unreachable and purged once
+CACHE_KEY_VERSION = "2"
+
+# cross-process query state: locks and the polled data version (shared by all server worker processes)
+QUERY_STATE_DIR = os.path.join(os.path.dirname(__file__), "dash_cache", "query-state")
+QUERY_LOCK_EXPIRE = 180  # seconds
+query_state = diskcache.Cache(directory=QUERY_STATE_DIR)
+# advisory file locks of the query keys
+QUERY_LOCKS_DIR = os.path.join(os.path.dirname(__file__), "dash_cache", "query-locks")
+
+# data version (watermark) of the source data, derived from the ingested transactions: the version is the newest transaction id
+# (changed by every ingest, including late arrivals) and the watermark the newest transaction time, both read from their indexes
+DATA_SOURCE_TABLE = "transactions"
+DATA_SOURCE_ID_COLUMN = "id"
+DATA_SOURCE_TIME_COLUMN = "created_at"
+# the query must return a "version" and the "max_timestamp" (timestamptz) of the newest ingested transaction, the rollup views use it too
+DATA_VERSION_SQL = f"SELECT max({DATA_SOURCE_ID_COLUMN})::text AS version, max({DATA_SOURCE_TIME_COLUMN}) AS max_timestamp FROM {DATA_SOURCE_TABLE}"
+DATA_VERSION_POLL_INTERVAL = 30  # seconds
+# transactions may arrive late (offline sale points), ranges ending this long before the watermark are final
+DATA_LATE_ARRIVAL_GRACE = datetime.timedelta(hours=1)
+DATA_VERSION_KEY = "data-version"
+
+# retries of connection errors with jittered exponential backoff
+QUERY_MAX_RETRIES = 3
+QUERY_RETRY_BASE_DELAY = 0.5  # seconds
+QUERY_RETRY_MAX_DELAY = 5.0  # seconds
+# errors of a broken connection or an unreachable database host (socket errors are OSErrors)
+CONNECTION_ERRORS = (
+	asyncpg.ConnectionDoesNotExistError,
+	asyncpg.ConnectionFailureError,
+	asyncpg.CannotConnectNowError,
+	ConnectionError,
+	OSError,
+)
+# query-level errors that are no connection errors, although timeouts are OSErrors too (e.g. command_timeout)
+QUERY_ERRORS = (
+	TimeoutError,
+	asyncio.TimeoutError,
+	asyncpg.QueryCanceledError,
+)
+
+# replica health probing (shared by all processes)
+HOST_HEALTH_INTERVAL = 10  # seconds
+HOST_HEALTH_TIMEOUT = 2  # seconds
+# replicas not probed for this long are not routed to
+HOST_HEALTH_EXPIRE = 3 * HOST_HEALTH_INTERVAL
+# replication lag in seconds, 0 when the replica replayed all received WAL
+REPLICA_LAG_SQL = """
+SELECT CASE
+	WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+	ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END AS lag
+"""
+# default replication lag tolerance of read-only queries, kept below the late arrival grace so final results stay final
+DEFAULT_MAX_REPLICA_LAG = 30  # seconds
+
+# maximum number of prepared statements kept per pool connection
+PREPARED_STATEMENTS_LIMIT = 100
+# prepare the registered queries on every new pool connection (instead of on first use), trading slower connects for no first-use round-trip
+PREPARE_ON_CONNECT = False
+
+# time bucket grids of additive queries
+BUCKET_GRIDS = {
+	"day": datetime.timedelta(days=1),
+	"hour": datetime.timedelta(hours=1),
+}
+# date ranges are inclusive with second precision (e.g. 06:00:00 - 05:59:59)
+BUCKET_END_GAP = datetime.timedelta(seconds=1)
+
+# grids datetime parameters are snapped to, so near-identical ranges share their cached results
+PARAMETER_GRIDS = {
+	"second": datetime.timedelta(seconds=1),
+	"minute": datetime.timedelta(minutes=1),
+	"5min": datetime.timedelta(minutes=5),
+	"15min": datetime.timedelta(minutes=15),
+	"hour": datetime.timedelta(hours=1),
+}
 
 
 def get_db_config():
@@ -25,7 +129,134 @@ def get_db_config():
 	}
 
 
+def get_db_hosts() -> List[Dict[str, str]]:
+	"""Get the database hosts with their roles ("primary" or "replica"), read-only queries are routed to the replicas"""
+	return [
+		{ **get_db_config(), "role": "primary" },
+		# { **get_db_config(), "host": "replica-1", "port": "5432", "role": "replica" },
+	]
+
+
+def is_connection_error(error: BaseException) -> bool:
+	"""Check whether an error comes from a broken connection or an unreachable host, and not from the query itself"""
+	return isinstance(error, CONNECTION_ERRORS) and not isinstance(error, QUERY_ERRORS)
+
+
+def get_data_version_uid() -> str:
+	"""Get the last polled data version, used to scope the callback caches across restarts"""
+	state = query_state.get(DATA_VERSION_KEY)
+	return state[0].version if state else "unknown"
+
+
+def get_data_version_scope(values: List[Any]) -> str:
+	"""
+	Get the data version scoping a cached callback output by the dates among its arguments (datetimes or ISO strings).
+	Ranges ending before the last polled watermark (with late arrival grace) are final and keep their outputs across data versions,
+	the others are scoped by the last polled data version.
+	"""
+	state = query_state.get(DATA_VERSION_KEY)
+	if not state or state[0].max_timestamp is None:
+		return get_data_version_uid()
+	range_ends = []
+	for value in values:
+		if isinstance(value, str):
+			try:
+				value = datetime.datetime.fromisoformat(value)
+			except ValueError:
+				continue
+		if isinstance(value, datetime.datetime):
+			range_ends.append(to_utc_naive(value))
+	if range_ends and max(range_ends) < state[0].max_timestamp - DATA_LATE_ARRIVAL_GRACE:
+		return "final"
+	return state[0].version
+
+
+def _floor_to_grid(dt: datetime.datetime, step: datetime.timedelta, origin: datetime.timedelta) -> datetime.datetime:
+	"""Floor a datetime to the grid of the step, shifted by the origin"""
+	epoch = datetime.datetime(1970, 1, 1, tzinfo=dt.tzinfo) + origin
+	return dt - (dt - epoch) % step
+
+
+def get_time_buckets(date_from: datetime.datetime, date_to: datetime.datetime, grids: List[datetime.timedelta], origin: datetime.timedelta = datetime.timedelta()) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+	"""
+	Split an inclusive date range into aligned time buckets, largest grid first.
+	The range edges not covering a whole bucket of the smallest grid are returned as they are.
+	"""
+	if not grids:
+		return [(date_from, date_to)] if date_from <= date_to else []
+	step = grids[0]
+	# first bucket start within the range and the end boundary of the last whole bucket within the range
+	first_start = _floor_to_grid(date_from - datetime.timedelta(microseconds=1), step, origin) + step
+	last_end = _floor_to_grid(date_to + BUCKET_END_GAP, step, origin)
+	if first_start >= last_end:
+		return get_time_buckets(date_from, date_to, grids[1:], origin)
+
+	buckets = []
+	if date_from < first_start:
+		buckets += get_time_buckets(date_from, first_start - BUCKET_END_GAP, grids[1:], origin)
+	bucket_start = first_start
+	while bucket_start < last_end:
+		buckets.append((bucket_start, bucket_start + step - BUCKET_END_GAP))
+		bucket_start += step
+	if last_end <= date_to:
+		buckets += get_time_buckets(last_end, date_to, grids[1:], origin)
+	return buckets
+
+
+def to_utc_naive(dt: datetime.datetime) -> datetime.datetime:
+	"""Convert a datetime to a naive UTC datetime (naive datetimes are considered UTC)"""
+	if dt.tzinfo is not None:
+		return dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+	return dt
+
+
 # ---- Data Models ----
+@dataclass
+class DataVersion:
+	version: str
+	max_timestamp: Optional[datetime.datetime] = None
+
+
+@dataclass
+class DatabaseHost:
+	config: Dict[str, str]
+	role: str = "primary"
+	pool: Optional[asyncpg.Pool] = None
+	# queries in flight on the host from this (long-lived server) process, the callbacks of a process share one loop and its pools,
+	# so the count balances the concurrent callbacks (least outstanding requests balancing)
+	outstanding: int = 0
+
+	@property
+	def name(self) -> str:
+		return f"{self.config.get('host')}:{self.config.get('port')}"
+
+
+@dataclass
+class HostHealth:
+	healthy: bool
+	lag: float
+	checked_at: float
+
+
+def serialize_parameter(value: Any) -> str:
+	"""Serialize a parameter value stably and type-aware, the same instant or number always serializes the same"""
+	if value is None:
+		return "null"
+	if isinstance(value, bool):
+		return f"bool:{str(value).lower()}"
+	if isinstance(value, int):
+		return f"int:{value}"
+	if isinstance(value, float):
+		return f"float:{value!r}"
+	if isinstance(value, datetime.datetime):
+		return f"datetime:{to_utc_naive(value).isoformat()}"
+	if isinstance(value, datetime.date):
+		return f"date:{value.isoformat()}"
+	if isinstance(value, (list, tuple)):
+		return f"[{','.join(serialize_parameter(v) for v in value)}]"
+	return f"{type(value).__name__}:{value}"
+
+
 @dataclass
 class QueryParameter:
 	name: str
@@ -33,6 +264,59 @@ class QueryParameter:
 	required: bool = True
 	default: Any = None
 	validator: Optional[Callable[[Any], bool]] = None
+	# datetime values are snapped to the grid (PARAMETER_GRIDS), range starts are floored
+	# and (inclusive) range ends are moved to the last second of their grid slot
+	grid: Optional[str] = "second"
+	bound: str = "start"
+
+	def __post_init__(self):
+		if self.grid is not None and self.grid not in PARAMETER_GRIDS:
+			raise ValueError(f"Unknown grid '{self.grid}' of parameter {self.name}, expected one of {list(PARAMETER_GRIDS.keys())}")
+		if self.bound not in ("start", "end"):
+			raise ValueError(f"Unknown bound '{self.bound}' of parameter {self.name}, expected start or end")
+
+	def canonicalize(self, value: Any) -> Any:
+		"""Get the canonical form of a value: datetimes in naive UTC snapped to the grid, integral floats of int parameters as ints"""
+		if isinstance(value, datetime.datetime):
+			value = to_utc_naive(value)
+			if isinstance(value, pd.Timestamp):
+				value = value.to_pydatetime()
+			if self.grid is not None:
+				step = PARAMETER_GRIDS[self.grid]
+				value = _floor_to_grid(value, step, datetime.timedelta())
+				if self.bound == "end":
+					value += step - BUCKET_END_GAP
+			return value
+		if self.type is int and isinstance(value, float) and value.is_integer():
+			return int(value)
+		if self.type is float and isinstance(value, int) and not isinstance(value, bool):
+			return float(value)
+		return value
+
+
+@dataclass
+class BucketSpec:
+	"""
+	Declares a query result additive over its date range, so it can be summed from cached aligned time buckets.
+	Numeric columns are summed (grouped by the key columns), other columns are dropped.
+	"""
+	grids: List[str] = field(default_factory=lambda: ["day", "hour"])
+	keys: List[str] = field(default_factory=list)
+	# grid alignment, the event days start at 06:00
+	origin: datetime.timedelta = datetime.timedelta(hours=6)
+	date_from: str = "date_from"
+	date_to: str = "date_to"
+	# applied to the summed result, e.g. to sort and limit it
+	finalize: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+
+	def combine(self, pieces: List[pd.DataFrame], finalize: bool = True) -> pd.DataFrame:
+		"""Sum the bucket results, finalize=False keeps the sum additive (e.g. to combine it with other sums)"""
+		combined = pd.concat(pieces, ignore_index=True)
+		if self.keys:
+			df = combined.groupby(self.keys, as_index=False, dropna=False).sum(numeric_only=True)
+		else:
+			df = combined.sum(numeric_only=True).to_frame().T
+		return self.finalize(df) if finalize and self.finalize else df
 
 
 @dataclass
@@ -42,29 +326,218 @@ class QueryDefinition:
 	parameters: List[QueryParameter]
 	description: str = ""
 	default_data: Optional[pd.DataFrame] | str = None
+	# time to live of the result in the memory cache (seconds, None = until evicted)
+	ttl: Optional[float] = None
+	# stream the result through a server-side cursor in chunks, reduced by the reducer or (without one) written to the file cache chunk by chunk
+	streaming: bool = False
+	chunk_size: int = 10_000
+	reducer: Optional[ChunkReducer] = None
+	# additive queries are computed from cached time buckets of their date range
+	buckets: Optional[BucketSpec] = None
+	# scheduling priority class ("kpi", "table" or "chart"), heavy queries are capped in flight
+	priority: str = DEFAULT_PRIORITY
+	heavy: bool = False
+	# stale-while-revalidate: cached results of the live tail older than fresh_for (seconds) are returned immediately
+	# and refreshed in the background, results older than max_staleness (seconds) are refreshed blocking
+	fresh_for: Optional[float] = None
+	max_staleness: Optional[float] = None
+	# read-only queries are routed to replicas lagging at most max_replica_lag (seconds, DEFAULT_MAX_REPLICA_LAG by default)
+	read_only: bool = True
+	max_replica_lag: Optional[float] = None
+	# additive queries summed from an hourly rollup materialized view over the whole final hours of their date range
+	materialized: bool = False
 
-	def __init__(self, name: str, sql: str, parameters: List[QueryParameter], description: str = "", default_data: Optional[pd.DataFrame] | str = None):
+	def __init__(self, name: str, sql: str, parameters: List[QueryParameter], description: str = "", default_data: Optional[pd.DataFrame] | str = None, ttl: Optional[float] = None,
+	             streaming: bool = False, chunk_size: int = 10_000, reducer: Optional[ChunkReducer] = None, buckets: Optional[BucketSpec] = None,
+	             priority: str = DEFAULT_PRIORITY, heavy: bool = False, fresh_for: Optional[float] = None, max_staleness: Optional[float] = None,
+	             read_only: bool = True, max_replica_lag: Optional[float] = None, materialized: bool = False):
+		if priority not in PRIORITY_CLASSES:
+			raise ValueError(f"Unknown priority '{priority}' of query {name}, expected one of {list(PRIORITY_CLASSES.keys())}")
+		if streaming and reducer is None and default_data != "FSCacheDefault":
+			raise ValueError(f"Streaming query {name} needs a reducer or the file cache (FSCacheDefault) to write its chunks to")
 		self.name = name
 		self.sql = sql
 		self.parameters = parameters
 		self.description = description
 		self.default_data = default_data
+		self.ttl = ttl
+		self.streaming = streaming
+		self.chunk_size = chunk_size
+		self.reducer = reducer
+		self.buckets = buckets
+		self.priority = priority
+		self.heavy = heavy
+		self.fresh_for = fresh_for
+		self.max_staleness = max_staleness
+		self.read_only = read_only
+		self.max_replica_lag = max_replica_lag
+		self.materialized = materialized
+
+	@property
+	def streams_to_file(self) -> bool:
+		"""Whether the result is streamed to the file cache chunk by chunk, such results are unbounded and kept out of the memory caches"""
+		return self.streaming and self.reducer is None
+
+	def canonicalize(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+		"""Get the canonical parameters, the cache key and the executed query both use them"""
+		declared = { param.name: param for param in self.parameters }
+		return {
+			name: declared[name].canonicalize(value) if name in declared else to_utc_naive(value) if isinstance(value, datetime.datetime) else value
+			for name, value in parameters.items()
+		}
+
+
+class OfflineQueryError(Exception):
+	"""Raised when the offline backend can neither execute a query nor serve it from the cache"""
+	pass
 
 
 class DataTransformer(ABC):
+	# transformers handling every row on its own opt in to transform the chunks of streamed results with transform
+	row_wise: bool = False
+
 	@abstractmethod
 	async def transform(self, df: pd.DataFrame) -> pd.DataFrame:
 		pass
 
+	async def transform_chunk(self, df: pd.DataFrame) -> pd.DataFrame:
+		"""Transform a single chunk of a streamed result, transformers that are not row-wise must override it"""
+		if not self.row_wise:
+			raise NotImplementedError(f"{type(self).__name__} is not row-wise and cannot transform the chunks of a streamed result")
+		return await self.transform(df)
+
 
 class SimpleTransformer(DataTransformer):
-	def __init__(self, transform_fn: Callable[[pd.DataFrame], pd.DataFrame]):
+	def __init__(self, transform_fn: Callable[[pd.DataFrame], pd.DataFrame], row_wise: bool = False):
 		self.transform_fn = transform_fn
+		self.row_wise = row_wise
 
 	async def transform(self, df: pd.DataFrame) -> pd.DataFrame:
 		return self.transform_fn(df)
 
 
+# ---- Chunk Reducers ----
+class ChunkReducer(ABC):
+	"""Incrementally reduces the chunks of a streamed result, keeping only the reduction state in memory"""
+
+	def initial(self) -> Any:
+		return None
+
+	@abstractmethod
+	def reduce(self, state: Any, chunk: pd.DataFrame) -> Any:
+		pass
+
+	@abstractmethod
+	def result(self, state: Any) -> pd.DataFrame:
+		pass
+
+
+class ConcatReducer(ChunkReducer):
+	"""Concatenates all chunks (unbounded, the state is as large as the whole query result)"""
+
+	def initial(self) -> List[pd.DataFrame]:
+		return []
+
+	def reduce(self, state: List[pd.DataFrame], chunk: pd.DataFrame) -> List[pd.DataFrame]:
+		state.append(chunk)
+		return state
+
+	def result(self, state: List[pd.DataFrame]) -> pd.DataFrame:
+		return pd.concat(state, ignore_index=True)
+
+
+class SumReducer(ChunkReducer):
+	"""Sums the numeric columns, optionally grouped by the key columns"""
+
+	def __init__(self, by: Optional[List[str]] = None):
+		self.by = by or []
+
+	def reduce(self, state: Optional[pd.DataFrame], chunk: pd.DataFrame) -> pd.DataFrame:
+		frames = [chunk] if state is None else [state, chunk]
+		combined = pd.concat(frames, ignore_index=True)
+		if self.by:
+			return combined.groupby(self.by, as_index=False, dropna=False).sum(numeric_only=True)
+		return combined.sum(numeric_only=True).to_frame().T
+
+	def result(self, state: pd.DataFrame) -> pd.DataFrame:
+		return state
+
+
+class TopKReducer(ChunkReducer):
+	"""Keeps only the k rows with the largest (or smallest) values of a column"""
+
+	def __init__(self, k: int, column: str, ascending: bool = False):
+		self.k = k
+		self.column = column
+		self.ascending = ascending
+
+	def reduce(self, state: Optional[pd.DataFrame], chunk: pd.DataFrame) -> pd.DataFrame:
+		combined = chunk if state is None else pd.concat([state, chunk], ignore_index=True)
+		if self.ascending:
+			return combined.nsmallest(self.k, self.column)
+		return combined.nlargest(self.k, self.column)
+
+	def result(self, state: pd.DataFrame) -> pd.DataFrame:
+		return state.reset_index(drop=True)
+
+
+class QueryResults(dict):
+	"""Results of multiple queries by name, with the errors of the failed ones (raised again when their result is accessed)"""
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.errors: Dict[str, BaseException] = { }
+
+	def __missing__(self, key: str):
+		if key in self.errors:
+			raise self.errors[key]
+		raise KeyError(key)
+
+
+# ---- Batched Connections ----
+class BatchConnection:
+	"""A single pool connection per database host shared by a batch of queries, used by one query at a time"""
+
+	def __init__(self):
+		self._connections: Dict[str, Tuple[DatabaseHost, QueryConnection]] = { }
+		self._locks: Dict[str, asyncio.Lock] = { }
+
+	@contextlib.asynccontextmanager
+	async def acquire(self, host: DatabaseHost):
+		"""Acquire the batch connection of a host, taking it from the host pool on first use"""
+		async with self._locks.setdefault(host.name, asyncio.Lock()):
+			if host.name not in self._connections:
+				self._connections[host.name] = (host, await host.pool.acquire())
+			conn = self._connections[host.name][1]
+			try:
+				yield conn
+			finally:
+				# give a broken connection back, the next query of the batch takes a new one
+				if conn.is_closed():
+					await self._release(host.name)
+
+	async def _release(self, name: str):
+		host, conn = self._connections.pop(name)
+		if host.pool is not None:
+			await host.pool.release(conn)
+
+	async def release(self):
+		"""Release the batch connections back to their pools"""
+		for name in list(self._connections.keys()):
+			await self._release(name)
+
+
+# batch connection of the currently executed execute_queries() call
+_batch_connection: contextvars.ContextVar[Optional[BatchConnection]] = contextvars.ContextVar("batch_connection", default=None)
+# set while refreshing a stale result, so its parts (e.g. time buckets) are not served stale either
+_revalidating: contextvars.ContextVar[bool] = contextvars.ContextVar("revalidating", default=False)
+# browser session of the current callback, the scheduler queues fairly across sessions
+query_session: contextvars.ContextVar[str] = contextvars.ContextVar("query_session", default="")
+# bound of the concurrent database round-trips of the current task and the tasks it starts (e.g. the warm-up),
+# held per fetch so the sub-queries of bucketed and rollup executions count against it too
+fetch_limit: contextvars.ContextVar[Optional[asyncio.Semaphore]] = contextvars.ContextVar("fetch_limit", default=None)
+
+
 # ---- Query Registry ----
 class QueryRegistry:
 	def __init__(self):
@@ -87,14 +560,88 @@ class QueryRegistry:
 	def get_transformers(self, name: str) -> List[DataTransformer]:
 		return self._transformers.get(name, [])
 
+	def get_queries(self) -> List[QueryDefinition]:
+		return list(self._queries.values())
+
+
+# ---- Prepared Statements ----
+class QueryConnection(asyncpg.Connection):
+	"""Pool connection keeping its prepared statements keyed by SQL text"""
+	__slots__ = ("_prepared_statements",)
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._prepared_statements: Dict[str, asyncpg.prepared_stmt.PreparedStatement] = { }
+
+	async def prepare_cached(self, sql: str, query_name: str) -> asyncpg.prepared_stmt.PreparedStatement:
+		"""Get the prepared statement of the SQL text, preparing it on first use"""
+		stmt = self._prepared_statements.get(sql)
+		if stmt is not None:
+			query_metrics.increment("dashboard_prepared_statements_total", query=query_name, result="hit")
+			return stmt
+		query_metrics.increment("dashboard_prepared_statements_total", query=query_name, result="miss")
+		stmt = await self.prepare(sql)
+		# drop the oldest statement when over the limit
+		if len(self._prepared_statements) >= PREPARED_STATEMENTS_LIMIT:
+			self._prepared_statements.pop(next(iter(self._prepared_statements)))
+		self._prepared_statements[sql] = stmt
+		return stmt
+
+	def invalidate_prepared(self, sql: str, query_name: str):
+		"""Forget the prepared statement of the SQL text (e.g. after a schema change)"""
+		if self._prepared_statements.pop(sql, None) is not None:
+			query_metrics.increment("dashboard_prepared_statements_total", query=query_name, result="invalidation")
+
 
 class QueryManager:
-	def __init__(self, db_config: Dict[str, str]):
-		self.db_config = db_config
-		self.pool = None
+	def __init__(self, db_config: Dict[str, str] | List[Dict[str, str]], cache_format: CacheFormat | str = CACHE_FORMAT, memory_cache_bytes: int = MEMORY_CACHE_BYTES,
+	             disk_cache_bytes: Optional[int] = DISK_CACHE_BYTES, disk_cache_ttl: Optional[float] = DISK_CACHE_TTL, backend: str = QUERY_BACKEND,
+	             shared_cache_bytes: int = SHARED_CACHE_BYTES):
+		if backend not in QUERY_BACKENDS:
+			raise ValueError(f"Unknown query backend '{backend}', expected one of {QUERY_BACKENDS}")
+		# a single config is the primary host, otherwise the configs have a "role" ("primary" or "replica")
+		host_configs = [{ **db_config, "role": "primary" }] if isinstance(db_config, dict) else db_config
+		self.hosts = [DatabaseHost(config={ k: v for k, v in c.items() if k != "role" }, role=c.get("role", "primary")) for c in host_configs]
+		if sum(1 for host in self.hosts if host.role == "primary") != 1:
+			raise ValueError("Exactly one primary database host is required")
+		self.primary = next(host for host in self.hosts if host.role == "primary")
+		self.cache_format = get_cache_format(cache_format) if isinstance(cache_format, str) else cache_format
+		self.memory_cache = MemoryCache(memory_cache_bytes)
+		# results shared by the worker processes, between the memory cache of each process and the file cache (0 disables it)
+		self.shared_cache = SharedMemoryCache(SHARED_CACHE_INDEX, shared_cache_bytes) if shared_cache_bytes else None
+		self.cache_manifest = CacheManifest(CACHE_QUERIES_DIR, disk_cache_bytes, disk_cache_ttl, key_version=CACHE_KEY_VERSION)
+		self.query_locks = QueryLocks(QUERY_LOCKS_DIR)
+		self.offline_engine = None
+		if backend == "duckdb":
+			# duckdb is needed only by the offline backend
+			from dashboard_app._duckdb_utils import OfflineEngine
+			self.offline_engine = OfflineEngine()
 		self.registry = QueryRegistry()
 		self._initialize_queries()
 		self._pool_lock = asyncio.Lock()
+		# in-flight query futures keyed by query key (single-flight)
+		self._in_flight: Dict[str, asyncio.Future] = { }
+		# background revalidations running on the loop (referenced until done, so they are not garbage collected)
+		self._revalidations: Set[asyncio.Task] = set()
+		# admission control of the database round-trips across processes
+		self.scheduler = QueryScheduler(query_state)
+		# circuit breakers by query name and database host
+		self._breakers: Dict[str, CircuitBreaker] = { }
+		# execution plans of slow queries
+		self.plan_capture = PlanCapture(query_state)
+		# rollups of the materialized queries (set by MaterializedViewManager)
+		self.materialized_views = None
+		# forked worker processes must not reuse the parent's connections and loop-bound state
+		os.register_at_fork(after_in_child=self._reset_after_fork)
+
+	def _reset_after_fork(self):
+		"""Drop the connection pools and loop-bound state inherited from the parent process"""
+		for host in self.hosts:
+			host.pool = None
+			host.outstanding = 0
+		self._pool_lock = asyncio.Lock()
+		self._in_flight = { }
+		self._revalidations = set()
 
 	def _initialize_queries(self):
 		"""Register all queries and transformers"""
@@ -122,18 +669,42 @@ class QueryManager:
 			sql_file = f.read()
 			return QueryManager.process_sql_query(sql_file)
 
+	async def _prepare_queries(self, conn: QueryConnection):
+		"""Prepare the registered queries on a new pool connection, a query failing to prepare is prepared again on first use"""
+		for query_def in self.registry.get_queries():
+			try:
+				await conn.prepare_cached(query_def.sql, query_def.name)
+			except Exception as e:
+				print(f"Failed to prepare query {query_def.name}: {e}")
+
 	async def init_pool(self):
+		"""
+		Create the connection pools of the hosts without one.
+		Replicas known to be unhealthy are retried only after the health interval, the pool of the primary on every call.
+		Raises only when no host has a pool.
+		"""
+		if self.offline_engine is not None:
+			return
 		async with self._pool_lock:
-			if not self.pool:
+			error = None
+			for host in self.hosts:
+				if host.pool is not None:
+					continue
+				health = self.get_host_health(host)
+				if host.role == "replica" and health is not None and not health.healthy and time.time() - health.checked_at < HOST_HEALTH_INTERVAL:
+					continue
 				try:
-					self.pool = await asyncpg.create_pool(
-						**self.db_config,
+					host.pool = await asyncpg.create_pool(
+						**host.config,
 						min_size=5,
 						max_size=20,
 						command_timeout=60,
 						max_queries=50000,
 						# Add connection timeout
 						timeout=10.0,
+						# Reuse prepared statements per connection (prepared lazily on first use of a query, or on connect when opted in)
+						connection_class=QueryConnection,
+						init=self._prepare_queries if PREPARE_ON_CONNECT else None,
 						# Add connection retry logic
 						# setup=lambda conn: conn.add_listener(
 						# 	'connection_cleanup',
@@ -141,8 +712,66 @@ class QueryManager:
 						# )
 					)
 				except Exception as e:
-					print(f"Failed to create connection pool: {e}")
-					raise
+					print(f"Failed to create connection pool of {host.role} {host.name}: {e}")
+					if host.role == "replica":
+						self._set_host_health(host, HostHealth(healthy=False, lag=float("inf"), checked_at=time.time()))
+					error = e
+			if error is not None and all(host.pool is None for host in self.hosts):
+				raise error
+
+	def _acquire(self, host: DatabaseHost):
+		"""Acquire a connection to a host, the shared batch connection when running inside a batch"""
+		batch = _batch_connection.get()
+		if batch is not None:
+			return batch.acquire(host)
+		return host.pool.acquire()
+
+	def get_host_health(self, host: DatabaseHost) -> Optional[HostHealth]:
+		"""Get the last probed health of a host, None when not probed yet"""
+		return query_state.get(f"health/{host.name}")
+
+	def _set_host_health(self, host: DatabaseHost, health: HostHealth):
+		query_state.set(f"health/{host.name}", health)
+
+	async def _probe_hosts(self):
+		"""Probe the health and replication lag of the replicas, once per health interval across all processes"""
+		for host in self.hosts:
+			if host.role != "replica" or host.pool is None:
+				continue
+			health = self.get_host_health(host)
+			if health is not None and time.time() - health.checked_at < HOST_HEALTH_INTERVAL:
+				continue
+			if not query_state.add(f"health/{host.name}-poll", os.getpid(), expire=HOST_HEALTH_INTERVAL):
+				continue
+			try:
+				async with host.pool.acquire(timeout=HOST_HEALTH_TIMEOUT) as conn:
+					lag = await conn.fetchval(REPLICA_LAG_SQL, timeout=HOST_HEALTH_TIMEOUT)
+				health = HostHealth(healthy=True, lag=float(lag), checked_at=time.time())
+			except Exception as e:
+				print(f"Replica {host.name} failed the health probe: {e}")
+				health = HostHealth(healthy=False, lag=float("inf"), checked_at=time.time())
+			self._set_host_health(host, health)
+
+	def _select_host(self, query_def: QueryDefinition) -> DatabaseHost:
+		"""
+		Select the host of a query: the replica with the least outstanding requests among the healthy ones within the lag tolerance of the query,
+		failing over to the primary. Queries that are not read-only always go to the primary.
+		"""
+		if query_def.read_only:
+			max_lag = query_def.max_replica_lag if query_def.max_replica_lag is not None else DEFAULT_MAX_REPLICA_LAG
+			replicas = []
+			for host in self.hosts:
+				if host.role != "replica" or host.pool is None or self.get_breaker(f"host/{host.name}").is_open():
+					continue
+				health = self.get_host_health(host)
+				if health is not None and health.healthy and health.lag <= max_lag and time.time() - health.checked_at < HOST_HEALTH_EXPIRE:
+					replicas.append(host)
+			if replicas:
+				# random tie-break, so idle processes do not all pick the first replica
+				return min(replicas, key=lambda h: (h.outstanding, random.random()))
+		if self.primary.pool is None:
+			raise ConnectionError(f"Primary {self.primary.name} is not available")
+		return self.primary
 
 	async def _cleanup_connection(self, conn):
 		"""Cleanup callback for terminated connections"""
@@ -153,11 +782,12 @@ class QueryManager:
 			print(f"Error during connection cleanup: {e}")
 
 	async def close_pool(self):
-		"""Properly close the connection pool"""
-		if self.pool:
-			async with self._pool_lock:
-				await self.pool.close()
-				self.pool = None
+		"""Properly close the connection pools"""
+		async with self._pool_lock:
+			for host in self.hosts:
+				if host.pool is not None:
+					await host.pool.close()
+					host.pool = None
 
 	def get_query_key(self, query_name: str, parameters: Dict[str, Any]) -> str:
 		"""
@@ -167,110 +797,694 @@ class QueryManager:
 		# Sort parameters by name to ensure consistent order
 		sorted_params = sorted(parameters.items())
 		# Convert parameters to a string
-		param_str = ",".join(f"{k}={v}" for k, v in sorted_params)
+		param_str = ",".join(f"{k}={serialize_parameter(v)}" for k, v in sorted_params)
 		# Use hashlib for a consistent hash across sessions
 		param_str_hash = hashlib.md5(param_str.encode()).hexdigest()
 		# Combine query name and parameters
 		return f"{param_str_hash}/{query_name}"
 
-	async def execute_query(self, query_name: str, parameters: Dict[str, Any], or_query_def: Optional[QueryDefinition]) -> pd.DataFrame:
-		"""Execute a single query by name with given parameters"""
+	@staticmethod
+	def get_legacy_query_key(query_name: str, parameters: Dict[str, Any]) -> str:
+		"""Get the key of a query in the legacy CSV cache, its parameters serialized with str (before the typed serialization)"""
+		param_str = ",".join(f"{k}={v}" for k, v in sorted(parameters.items()))
+		return f"{hashlib.md5(param_str.encode()).hexdigest()}/{query_name}"
+
+	async def migrate_csv_cache(self, executions: List[Tuple[str, Dict[str, Any]]]) -> int:
+		"""
+		Migrate the legacy CSV cache entries of the given query executions (name and parameters, e.g. the warm-up tasks) to their current keys
+		in the cache format, returns the number of migrated entries.
+		The legacy keys hash the parameters, so the entries of other executions cannot be re-keyed and are purged with the previous key version.
+		The entries are moved out of the cache directory before the manifest is opened (which purges them), so run it before the app.
+		They are stamped like the fetched results, with the current data version and the time the CSV file was written.
+		"""
+		migration_dir = f"{CACHE_QUERIES_DIR}-migration"
+		legacy_keys = { }
+		canonical_parameters = { }
+		for query_name, parameters in executions:
+			canonical = self.registry.get_query(query_name).canonicalize(parameters)
+			legacy_keys[self.get_legacy_query_key(query_name, parameters)] = self.get_query_key(query_name, canonical)
+			canonical_parameters[self.get_query_key(query_name, canonical)] = canonical
+		for root, _, files in os.walk(CACHE_QUERIES_DIR):
+			for file in files:
+				query_key = legacy_keys.get(f"{os.path.relpath(root, CACHE_QUERIES_DIR)}/{file[:-len('.csv')]}") if file.endswith(".csv") else None
+				if query_key is not None:
+					os.makedirs(os.path.dirname(os.path.join(migration_dir, query_key)), exist_ok=True)
+					os.replace(os.path.join(root, file), os.path.join(migration_dir, f"{query_key}.csv"))
+		# open the manifest before writing, its purge of the entries left behind must not catch the migrated ones
+		self.cache_manifest.open()
+
+		data_version = await self.get_data_version()
+		migrated = 0
+		for root, _, files in os.walk(migration_dir):
+			for file in files:
+				path = os.path.join(root, file)
+				query_name = file[:-len(".csv")]
+				query_key = f"{os.path.relpath(root, migration_dir)}/{query_name}"
+				metadata = self.get_cache_metadata(canonical_parameters.get(query_key, { }), data_version)
+				metadata["cached_at"] = str(os.path.getmtime(path))
+				try:
+					self._write_fs_cache(query_name, query_key, read_legacy_csv(path), metadata)
+				except Exception as e:
+					print(f"Failed to migrate cached query {path}: {e}")
+					continue
+				# failed entries stay in the migration directory for the next run
+				if query_key in self.cache_manifest.get_keys(query_name):
+					os.remove(path)
+					migrated += 1
+		for root, _, _ in os.walk(migration_dir, topdown=False):
+			with contextlib.suppress(OSError):
+				os.rmdir(root)
+		return migrated
+
+	def get_effective_range(self, date_from: datetime.datetime, date_to: datetime.datetime) -> Tuple[datetime.datetime, datetime.datetime]:
+		"""Get the (naive UTC) date range the registered queries run over, the range snapped to the coarsest grid of their date parameters"""
+		parameters = [param for query_def in self.registry.get_queries() for param in query_def.parameters if param.grid is not None]
+		date_from_params = [param for param in parameters if param.name == "date_from"]
+		date_to_params = [param for param in parameters if param.name == "date_to"]
+		if date_from_params:
+			date_from = max(date_from_params, key=lambda param: PARAMETER_GRIDS[param.grid]).canonicalize(date_from)
+		if date_to_params:
+			date_to = max(date_to_params, key=lambda param: PARAMETER_GRIDS[param.grid]).canonicalize(date_to)
+		return date_from, date_to
+
+	def get_cache_path(self, query_key: str) -> str:
+		"""Get the local file cache path for a query key"""
+		return os.path.join(CACHE_QUERIES_DIR, f"{query_key}.{self.cache_format.extension}")
+
+	def invalidate_query(self, query_name: str):
+		"""Remove all cached results of a query (e.g. after its SQL changed) from the memory and local file cache"""
+		# together with the cached rollup rows of the query
+		suffixes = (f"/{query_name}", f"/{query_name}@rollup")
+		self.memory_cache.invalidate_matching(lambda key: key.endswith(suffixes))
+		if self.shared_cache is not None:
+			self.shared_cache.invalidate_matching(lambda key: key.endswith(suffixes))
+		self.cache_manifest.remove(self.cache_manifest.get_keys(query_name) + self.cache_manifest.get_keys(f"{query_name}@rollup"))
+
+	async def get_data_version(self) -> Optional[DataVersion]:
+		"""
+		Get the current data version of the source data.
+		The version is polled with one cheap query per polling interval, shared by all processes.
+		Returns None when the data version is unavailable (e.g. database unreachable).
+		The offline backend uses the version of its snapshots.
+		"""
+		if self.offline_engine is not None:
+			version, max_timestamp = self.offline_engine.get_data_version()
+			return DataVersion(version=version, max_timestamp=max_timestamp)
+		state = query_state.get(DATA_VERSION_KEY)
+		if state is not None and time.time() - state[1] < DATA_VERSION_POLL_INTERVAL:
+			return state[0]
+		# let only one process poll the data version, others use the last known version
+		if not query_state.add(f"{DATA_VERSION_KEY}-poll", os.getpid(), expire=DATA_VERSION_POLL_INTERVAL):
+			return state[0] if state else None
+		try:
+			await self.init_pool()
+			# the data version comes from the primary, replicas might lag behind it
+			if self.primary.pool is None:
+				raise ConnectionError(f"Primary {self.primary.name} is not available")
+			async with self.primary.pool.acquire() as conn:
+				data_version = await self.fetch_data_version(conn)
+			query_state.set(DATA_VERSION_KEY, (data_version, time.time()))
+			query_state.delete(f"{DATA_VERSION_KEY}-poll")
+			return data_version
+		except Exception as e:
+			# the poll lock expires after the polling interval, so a failing database is not polled on every query
+			print(f"Failed to poll data version: {e}")
+			return state[0] if state else None
+
+	@staticmethod
+	async def fetch_data_version(conn: asyncpg.Connection) -> DataVersion:
+		"""Fetch the data version of the data visible on a connection"""
+		row = await conn.fetchrow(DATA_VERSION_SQL)
+		return DataVersion(
+			version=str(row["version"]),
+			max_timestamp=to_utc_naive(row["max_timestamp"]) if row["max_timestamp"] else None
+		)
+
+	@staticmethod
+	def get_cache_metadata(parameters: Dict[str, Any], data_version: Optional[DataVersion]) -> Dict[str, str]:
+		"""Get the metadata to stamp a cached result with: data version, its watermark, the queried range end and the caching time"""
+		range_ends = [to_utc_naive(v) for v in parameters.values() if isinstance(v, datetime.datetime)]
+		return {
+			"data_version": data_version.version if data_version else "",
+			"data_max_timestamp": data_version.max_timestamp.isoformat() if data_version and data_version.max_timestamp else "",
+			"range_end": max(range_ends).isoformat() if range_ends else "",
+			"cached_at": str(time.time()),
+		}
+
+	@staticmethod
+	def is_cache_final(metadata: Dict[str, str]) -> bool:
+		"""Check whether a cached result ended before the data watermark (with late arrival grace) at the time of caching"""
+		if not metadata.get("data_max_timestamp") or not metadata.get("range_end"):
+			return False
+		watermark = datetime.datetime.fromisoformat(metadata["data_max_timestamp"])
+		return datetime.datetime.fromisoformat(metadata["range_end"]) < watermark - DATA_LATE_ARRIVAL_GRACE
+
+	@staticmethod
+	def is_cache_valid(metadata: Dict[str, str], data_version: Optional[DataVersion]) -> bool:
+		"""
+		Check whether a cached result is still valid for the current data version.
+		Final results stay valid forever, results overlapping the live tail are valid only for the same data version.
+		"""
+		if data_version is None or metadata.get("data_version") == data_version.version:
+			return True
+		return QueryManager.is_cache_final(metadata)
+
+	def get_cache_state(self, metadata: Dict[str, str], query_def: QueryDefinition, data_version: Optional[DataVersion]) -> str:
+		"""
+		Get the state of a cached result: "fresh" (served as is), "stale" (served while refreshed in the background) or "expired" (refreshed blocking).
+		Without a freshness window the results are fresh until the data version changes.
+		"""
+		valid = self.is_cache_valid(metadata, data_version)
+		if query_def.fresh_for is None:
+			return "fresh" if valid else "expired"
+		if self.is_cache_final(metadata):
+			return "fresh"
+		# entries cached before the freshness tracking are infinitely old
+		age = time.time() - float(metadata.get("cached_at") or 0)
+		if valid and age <= query_def.fresh_for:
+			return "fresh"
+		if query_def.max_staleness is not None and age > query_def.max_staleness:
+			return "expired"
+		return "stale"
+
+	def _read_cache(self, query_name: str, query_key: str, query_def: QueryDefinition, data_version: Optional[DataVersion], columns: Optional[List[str]] = None,
+	                allow_stale: bool = False) -> Tuple[Optional[pd.DataFrame], bool]:
+		"""
+		Read a query result from the memory cache, falling back to the local file cache.
+		Full file cache reads are promoted to the memory cache, projected reads and results streamed to the file cache are not.
+		Returns the result (None on cache miss) and whether it is stale, stale results are returned only when allowed.
+		"""
+		entry = self.memory_cache.get_entry(query_key)
+		if entry is not None:
+			if self.get_cache_state(entry.metadata, query_def, data_version) == "fresh":
+				if LOG_CACHE:
+					print(f"⚡ Returning memory cached data for query {query_name}")
+				query_metrics.increment("dashboard_query_cache_total", query=query_name, tier="memory")
+				return (entry.df[columns] if columns else entry.df), False
+			# another process might have refreshed the result in the file cache already
+			self.memory_cache.invalidate(query_key)
+
+		entry = self.shared_cache.get_entry(query_key) if self.shared_cache is not None else None
+		if entry is not None:
+			if self.get_cache_state(entry.metadata, query_def, data_version) == "fresh":
+				if LOG_CACHE:
+					print(f"⚡ Returning shared memory cached data for query {query_name}")
+				query_metrics.increment("dashboard_query_cache_total", query=query_name, tier="shared")
+				self.memory_cache.put(query_key, entry.df, query_def.ttl, entry.metadata)
+				return (entry.df[columns] if columns else entry.df), False
+			self.shared_cache.invalidate(query_key)
+
+		with query_metrics.timer(query_name, "cache_read"):
+			metadata = self._read_fs_cache_metadata(query_key)
+			state = self.get_cache_state(metadata, query_def, data_version) if metadata is not None else "expired"
+			if state == "fresh" or (state == "stale" and allow_stale):
+				df = self._read_fs_cache(query_name, query_key, columns)
+			else:
+				df = None
+		query_metrics.increment("dashboard_query_cache_total", query=query_name, tier=("stale" if state == "stale" else "file") if df is not None else "miss")
+		if df is not None and not columns and not query_def.streams_to_file:
+			self._put_memory_cache(query_key, df, query_def.ttl, metadata)
+		return df, df is not None and state == "stale"
+
+	def _put_memory_cache(self, query_key: str, df: pd.DataFrame, ttl: Optional[float], metadata: Dict[str, str]):
+		"""Save a query result to the memory cache of this process and to the shared memory cache of the worker processes"""
+		self.memory_cache.put(query_key, df, ttl, metadata)
+		if self.shared_cache is None:
+			return
+		try:
+			self.shared_cache.put(query_key, df, ttl, metadata)
+		except Exception as e:
+			print(f"Failed to save query {query_key} to the shared memory cache: {e}")
+
+	def _read_fs_cache_metadata(self, query_key: str) -> Optional[Dict[str, str]]:
+		"""Read the metadata of a query result in the local file cache, returns None on cache miss"""
+		try:
+			return self.cache_format.read_metadata(self.get_cache_path(query_key))
+		except Exception as e:
+			return None
+
+	def _read_fs_cache(self, query_name: str, query_key: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+		"""Read a query result from the local file cache, returns None on cache miss"""
+		try:
+			df = self.cache_format.read(self.get_cache_path(query_key), columns=columns)
+			self.cache_manifest.record_access(query_key)
+			if LOG_CACHE:
+				print(f"⚡ Returning cached data for query {query_name}")
+			# return the cached data as a DataFrame
+			return df
+		except Exception as e:
+			return None
+
+	def _write_fs_cache(self, query_name: str, query_key: str, df: pd.DataFrame, metadata: Dict[str, str]):
+		"""Save a query result to the local file cache"""
+		if LOG_CACHE:
+			print(f"💾 Saving query {query_name} to cache as {query_key}")
+		try:
+			self.cache_manifest.open()
+			with query_metrics.timer(query_name, "cache_write"):
+				# create the directories if they don't exist
+				os.makedirs(os.path.dirname(self.get_cache_path(query_key)), exist_ok=True)
+				# save the query result in the configured cache format (renamed into place, so readers never see a partial file)
+				self.cache_format.write_atomic(self.get_cache_path(query_key), df, metadata)
+			self.cache_manifest.record_write(query_key, query_name, self.get_cache_path(query_key), os.path.getsize(self.get_cache_path(query_key)))
+		except Exception as e:
+			print(f"Failed to save query {query_name} to cache: {e}")
+
+	async def execute_query(self, query_name: str, parameters: Dict[str, Any], or_query_def: Optional[QueryDefinition], columns: Optional[List[str]] = None) -> pd.DataFrame:
+		"""
+		Execute a single query by name with given parameters.
+		When columns are given, only those columns are read from the cache and returned.
+		"""
+		started = time.perf_counter()
 		query_def = or_query_def if or_query_def else self.registry.get_query(query_name)
+		parameters = query_def.canonicalize(parameters)
 		query_key = self.get_query_key(query_name, parameters)
+		data_version = await self.get_data_version() if query_def.default_data == "FSCacheDefault" else None
 
 		# Return default data if available
 		if query_def.default_data is not None:
 			if query_def.default_data == "FSCacheDefault":
-				try:
-					if LOG_CACHE:
-						print(f"⚡ Returning cached data for query {query_name}")
-					# read CSV from cache
-					file_path = os.path.join(os.getcwd(), "dashboard_app", "cached-queries", f"{query_key}.csv")
-					csv = pd.read_csv(file_path)
-					# replace NaN with None
-					csv = csv.where(pd.notnull(csv), None)
-					# return the cached data as a DataFrame
-					return csv
-				except Exception as e:
-					pass
+				cached, stale = self._read_cache(query_name, query_key, query_def, data_version, columns, allow_stale=not _revalidating.get())
+				if cached is not None:
+					if stale:
+						self._revalidate_in_background(query_name, query_key, query_def, parameters)
+					self._record_query(query_name, "stale" if stale else "cache", started)
+					return cached
 			else:
 				if LOG_CACHE:
 					print(f"Returning default data for query {query_name}")
+				self._record_query(query_name, "default", started)
 				return query_def.default_data
 
-		# Initialize pool if needed
-		await self.init_pool()
+		# Coalesce concurrent callers of the same query into a single database round-trip
+		while (in_flight := self._in_flight.get(query_key)) is not None:
+			if LOG_CACHE:
+				print(f"🔗 Awaiting in-flight query {query_name}")
+			try:
+				df = await asyncio.shield(in_flight)
+			except asyncio.CancelledError:
+				# the caller executing the query was cancelled (not this one), so this one takes over
+				if in_flight.cancelled() and not asyncio.current_task().cancelling():
+					continue
+				raise
+			self._record_query(query_name, "in_flight", started)
+			# every waiter gets its own (copy-on-write) DataFrame, so adding columns does not leak to the other callers
+			return df[columns] if columns else df.copy(deep=False)
 
-		max_retries = 3
-		retry_delay = 1.0  # seconds
+		future = asyncio.get_running_loop().create_future()
+		self._in_flight[query_key] = future
+		try:
+			df, source = await self._execute_query_single_flight(query_name, query_key, query_def, parameters, data_version)
+			future.set_result(df)
+			self._record_query(query_name, source, started)
+			return df[columns] if columns else df.copy(deep=False)
+		except Exception as e:
+			future.set_exception(e)
+			# mark the exception as retrieved when there are no other waiters
+			future.exception()
+			query_metrics.increment("dashboard_query_errors_total", query=query_name)
+			raise
+		finally:
+			# a cancelled (or interrupted) caller cancels its waiters too, they retry the query instead of hanging
+			if not future.done():
+				future.cancel()
+			self._in_flight.pop(query_key, None)
+
+	@staticmethod
+	def _record_query(query_name: str, source: str, started: float):
+		"""Record the latency of an executed query by where its result came from"""
+		query_metrics.observe("dashboard_query_seconds", time.perf_counter() - started, query=query_name, source=source)
+		query_metrics.increment("dashboard_query_total", query=query_name, source=source)
 
-		for attempt in range(max_retries):
+	async def _execute_query_single_flight(self, query_name: str, query_key: str, query_def: QueryDefinition, parameters: Dict[str, Any], data_version: Optional[DataVersion]) -> Tuple[pd.DataFrame, str]:
+		"""
+		Execute a query while holding the cross-process lock of its query key.
+		Only file-cached queries are coalesced across processes, since the other processes read the result back from the file cache.
+		Returns the result and where it came from ("database", "offline", "rollup", "bucketed" or "cache").
+		"""
+		metadata = self.get_cache_metadata(parameters, data_version)
+		if self.offline_engine is not None:
+			return await self._execute_offline(query_name, query_key, query_def, parameters, metadata)
+		if query_def.materialized and query_def.buckets is not None and self.materialized_views is not None and query_def.default_data == "FSCacheDefault":
+			rollup = await self._execute_rollup(query_name, query_key, query_def, parameters, metadata)
+			if rollup is not None:
+				return rollup, "rollup"
+		if query_def.buckets is not None and query_def.default_data == "FSCacheDefault":
+			bucketed = await self._execute_bucketed(query_name, query_key, query_def, parameters, metadata)
+			if bucketed is not None:
+				return bucketed, "bucketed"
+		if query_def.default_data != "FSCacheDefault":
+			return await self._fetch_query(query_name, query_key, query_def, parameters, metadata), "database"
+
+		async with self.query_locks.hold(query_key):
+			# another process might have computed the result while we were waiting for the lock
+			cached, _ = self._read_cache(query_name, query_key, query_def, data_version)
+			if cached is not None:
+				return cached, "cache"
+			return await self._fetch_query(query_name, query_key, query_def, parameters, metadata), "database"
+
+	def _revalidate_in_background(self, query_name: str, query_key: str, query_def: QueryDefinition, parameters: Dict[str, Any]):
+		"""
+		Refresh a stale result in a task on the running loop (the long-lived loop of the server process, reusing its pool),
+		deduplicated by query key across processes.
+		"""
+		if query_key in self._in_flight or not query_state.add(f"refresh/{query_key}", os.getpid(), expire=QUERY_LOCK_EXPIRE):
+			return
+
+		async def refresh():
 			try:
-				async with self.pool.acquire() as conn:
-					print(f"⌛ Executing query {query_name}")
-					# Execute the query and get both records and description
-					stmt = await conn.prepare(query_def.sql)
-					records = await stmt.fetch(
-						*[
-							parameters.get(param.name, param.default)
-							for param in query_def.parameters
-						]
-					)
+				await self._revalidate(query_name, query_key, query_def, parameters)
+			except Exception as e:
+				print(f"Failed to refresh query {query_name}: {e}")
+			finally:
+				query_state.delete(f"refresh/{query_key}")
 
-					# Get column names from the statement
-					column_names = [desc.name for desc in stmt.get_attributes()]
+		task = asyncio.get_running_loop().create_task(refresh())
+		self._revalidations.add(task)
+		task.add_done_callback(self._revalidations.discard)
 
-					# Create DataFrame with explicit column names
-					df = pd.DataFrame(records, columns=column_names)
+	async def _revalidate(self, query_name: str, query_key: str, query_def: QueryDefinition, parameters: Dict[str, Any]):
+		"""Recompute a stale result, updating the caches read by all processes"""
+		# the task runs in a copy of the caller context, so only the revalidation reads the cache without stale results
+		_revalidating.set(True)
+		print(f"🔄 Refreshing stale query {query_name}")
+		# through the in-flight futures, so callers of the same process whose result expired meanwhile await the refresh
+		await self.execute_query(query_name, parameters, query_def)
 
-					# Apply transformers
-					for transformer in self.registry.get_transformers(query_name):
-						df = await transformer.transform(df)
+	async def _execute_bucketed(self, query_name: str, query_key: str, query_def: QueryDefinition, parameters: Dict[str, Any], metadata: Dict[str, str]) -> Optional[pd.DataFrame]:
+		"""
+		Execute an additive query as the sum of its aligned time buckets, each cached on its own.
+		Moving the date range then only fetches the buckets that are not cached yet.
+		Returns None when the date range does not span more than one bucket.
+		"""
+		spec = query_def.buckets
+		date_from, date_to = parameters.get(spec.date_from), parameters.get(spec.date_to)
+		if not isinstance(date_from, datetime.datetime) or not isinstance(date_to, datetime.datetime):
+			return None
+		buckets = get_time_buckets(date_from, date_to, [BUCKET_GRIDS[grid] for grid in spec.grids], spec.origin)
+		if len(buckets) < 2:
+			return None
 
-					# Save the result to local file cache
-					if LOG_CACHE:
-						print(f"💾 Saving query {query_name} to cache as {query_key}")
-					try:
-						# get the directories from query_key
-						dir_path = "/".join(query_key.split("/")[:-1])
-						# create the directories if they don't exist
-						os.makedirs(os.path.join(os.getcwd(), "dashboard_app", "cached-queries", dir_path), exist_ok=True)
-						# save the query result to a csv file
-						df.to_csv(os.path.join(os.getcwd(), "dashboard_app", "cached-queries", f"{query_key}.csv"), index=False)
-					except Exception as e:
-						print(f"Failed to save query {query_name} to cache: {e}")
+		# the buckets are plain (not bucketed) executions of the same query
+		bucket_def = copy.copy(query_def)
+		bucket_def.buckets = None
+		pieces = await asyncio.gather(
+			*[
+				self.execute_query(query_name, { **parameters, spec.date_from: bucket_from, spec.date_to: bucket_to }, bucket_def)
+				for bucket_from, bucket_to in buckets
+			]
+		)
+		df = spec.combine(list(pieces))
+		# the summed result is cheap to recompute, so it is kept only in the memory cache
+		self._put_memory_cache(query_key, df, query_def.ttl, metadata)
+		return df
+
+	async def _execute_offline(self, query_name: str, query_key: str, query_def: QueryDefinition, parameters: Dict[str, Any], metadata: Dict[str, str]) -> Tuple[pd.DataFrame, str]:
+		"""
+		Execute an additive query with the offline engine, other queries are served from any cached result regardless of its data version.
+		The snapshots are partitioned by hour, so the date range is widened to whole hours and the result is keyed by the widened range
+		(never by the exact one). The offline results are kept only in the memory cache.
+		"""
+		if query_def.buckets is not None and self.offline_engine.supports(query_def.sql):
+			parameters = self.get_offline_parameters(query_def, parameters)
+			query_key = self.get_query_key(query_name, parameters)
+			cached = self.memory_cache.get(query_key)
+			if cached is not None:
+				return cached, "cache"
+			metadata = { **metadata, "range_end": parameters[query_def.buckets.date_to].isoformat() }
+			args = [parameters.get(param.name, param.default) for param in query_def.parameters]
+			async with fetch_limit.get() or contextlib.nullcontext():
+				with query_metrics.timer(query_name, "offline"):
+					df = await self.offline_engine.execute(query_def.sql, args)
+			for transformer in self.registry.get_transformers(query_name):
+				df = await transformer.transform(df)
+			# sum the hourly rows the query did not aggregate itself
+			df = query_def.buckets.combine([df])
+			self._put_memory_cache(query_key, df, query_def.ttl, metadata)
+			return df, "offline"
 
-					return df
+		cached = self.memory_cache.get(query_key)
+		if cached is None:
+			cached = self._read_fs_cache(query_name, query_key)
+		if cached is None:
+			raise OfflineQueryError(f"Query {query_name} cannot run offline and has no cached result")
+		return cached, "stale"
 
-			except (asyncpg.ConnectionDoesNotExistError, asyncpg.ConnectionFailureError) as e:
-				if attempt == max_retries - 1:
-					print(f"Failed to execute query after {max_retries} attempts: {e}")
-					raise
-				print(f"Connection error on attempt {attempt + 1}, retrying in {retry_delay} seconds...")
-				await asyncio.sleep(retry_delay)
-				# Reset the pool on connection errors
-				await self.close_pool()
+	@staticmethod
+	def get_offline_parameters(query_def: QueryDefinition, parameters: Dict[str, Any]) -> Dict[str, Any]:
+		"""Get the parameters of an additive query with its date range widened to the whole hours the offline engine reads"""
+		spec, hour = query_def.buckets, BUCKET_GRIDS["hour"]
+		return {
+			**parameters,
+			spec.date_from: _floor_to_grid(parameters[spec.date_from], hour, datetime.timedelta()),
+			spec.date_to: _floor_to_grid(parameters[spec.date_to], hour, datetime.timedelta()) + hour - BUCKET_END_GAP,
+		}
+
+	async def _execute_rollup(self, query_name: str, query_key: str, query_def: QueryDefinition, parameters: Dict[str, Any], metadata: Dict[str, str]) -> Optional[pd.DataFrame]:
+		"""
+		Execute an additive query as the sum of its rollup rows over the whole final hours of the date range
+		and of the remaining (partial or not yet final) hours at the edges of the range, executed against the raw data.
+		Returns None when the rollup covers no hour of the date range.
+		"""
+		spec = query_def.buckets
+		date_from, date_to = parameters.get(spec.date_from), parameters.get(spec.date_to)
+		if not isinstance(date_from, datetime.datetime) or not isinstance(date_to, datetime.datetime):
+			return None
+		covered = self.materialized_views.get_covered_range(query_def, date_from, date_to)
+		if covered is None:
+			return None
+		rollup_from, rollup_to = covered
+
+		# the rollup rows of final hours never change, so they are cached like any other final result (keyed by the view, changing with the query SQL)
+		view = self.materialized_views.get_view_name(query_def)
+		rollup_def = QueryDefinition(
+			name=f"{query_name}@rollup",
+			sql=self.materialized_views.get_read_sql(query_def),
+			parameters=[QueryParameter("rollup_from", datetime.datetime), QueryParameter("rollup_to", datetime.datetime)],
+			default_data="FSCacheDefault",
+			ttl=query_def.ttl,
+			priority=query_def.priority,
+		)
+		# the edges are plain executions of the same query, summed before finalizing
+		edge_def = copy.copy(query_def)
+		edge_def.buckets = None
+		edge_def.materialized = False
+		second = datetime.timedelta(seconds=1)
+		edges = [
+			(from_, to_) for from_, to_ in [(to_utc_naive(date_from), rollup_from - second), (rollup_to, to_utc_naive(date_to))]
+			if from_ <= to_
+		]
+		rollup, *pieces = await asyncio.gather(
+			self.execute_query(rollup_def.name, { "view": view, "rollup_from": rollup_from, "rollup_to": rollup_to }, rollup_def),
+			*[
+				self.execute_query(query_name, { **parameters, spec.date_from: edge_from, spec.date_to: edge_to }, edge_def)
+				for edge_from, edge_to in edges
+			]
+		)
+		df = spec.combine([rollup.drop(columns=["bucket_start", "bucket_row"]), *pieces])
+		# the summed result is cheap to recompute, so it is kept only in the memory cache
+		self._put_memory_cache(query_key, df, query_def.ttl, metadata)
+		return df
+
+	async def _fetch_query(self, query_name: str, query_key: str, query_def: QueryDefinition, parameters: Dict[str, Any], metadata: Dict[str, str]) -> pd.DataFrame:
+		"""
+		Fetch a query result from the database, apply transformers and save it to the file cache.
+		Connection errors are retried with jittered exponential backoff, replacing only the broken connection.
+		Failing queries and unreachable hosts trip their circuit breakers, so they fail fast instead of piling up.
+		Query-level errors (including timeouts and cancellations) count against the query breaker only and are not retried.
+		A replica failing with a connection error is marked unhealthy, so the retry fails over to another replica or the primary.
+		"""
+		query_breaker = self.get_breaker(f"query/{query_name}")
+		query_breaker.check()
+
+		for attempt in range(QUERY_MAX_RETRIES):
+			host = None
+			try:
+				# Initialize pools if needed
 				await self.init_pool()
+				await self._probe_hosts()
+				host = self._select_host(query_def)
+				host_breaker = self.get_breaker(f"host/{host.name}")
+				host_breaker.check()
+				query_metrics.increment("dashboard_query_routed_total", query=query_name, host=host.name, role=host.role)
+				df, metadata = await self._fetch_from_host(host, query_name, query_def, parameters, query_key, metadata)
+				query_breaker.record_success()
+				host_breaker.record_success()
 
-			except Exception as e:
-				print(f"🚨 Error executing query {query_name}: {e}")
+				# Save the result to the memory and local file cache (results streamed to the file cache are only read from it)
+				if not query_def.streams_to_file:
+					if query_def.default_data == "FSCacheDefault":
+						self._put_memory_cache(query_key, df, query_def.ttl, metadata)
+					self._write_fs_cache(query_name, query_key, df, metadata)
+
+				return df
+
+			except CircuitOpenError:
 				raise
 
-	async def execute_queries(self, query_names: List[str], parameters: Dict[str, Any], or_query_defs: Dict[str, QueryDefinition] = { }) -> Dict[str, pd.DataFrame]:
-		"""Execute multiple queries concurrently"""
-		await self.init_pool()
+			except Exception as e:
+				if not is_connection_error(e):
+					query_breaker.record_failure()
+					print(f"🚨 Error executing query {query_name}: {e}")
+					raise
+				if host is not None:
+					self.get_breaker(f"host/{host.name}").record_failure()
+					if host.role == "replica":
+						self._set_host_health(host, HostHealth(healthy=False, lag=float("inf"), checked_at=time.time()))
+				if attempt == QUERY_MAX_RETRIES - 1:
+					print(f"Failed to execute query after {QUERY_MAX_RETRIES} attempts: {e}")
+					raise
+				# full jitter, so concurrent callers do not reconnect in lockstep
+				retry_delay = random.uniform(0, min(QUERY_RETRY_MAX_DELAY, QUERY_RETRY_BASE_DELAY * 2 ** attempt))
+				print(f"Connection error on attempt {attempt + 1}, retrying in {retry_delay:.2f} seconds...")
+				await asyncio.sleep(retry_delay)
+
+	async def _fetch_from_host(self, host: DatabaseHost, query_name: str, query_def: QueryDefinition, parameters: Dict[str, Any], query_key: str,
+	                           metadata: Dict[str, str]) -> Tuple[pd.DataFrame, Dict[str, str]]:
+		"""
+		Fetch a query result on a connection of a host, returns the result and the metadata to cache it with.
+		Results of a replica are stamped with the data version the replica replayed (read before the query), not the one of the primary,
+		so a lagging replica's result is neither final nor valid for newer data versions.
+		"""
+		host.outstanding += 1
+		try:
+			# wait for a slot of the query priority class before taking a pool connection, so queued queries do not hold connections
+			# and cheap queries are not queued behind heavy scans
+			queue_started = time.perf_counter()
+			async with fetch_limit.get() or contextlib.nullcontext(), self.scheduler.slot(query_def.priority, query_def.heavy, query_session.get()):
+				query_metrics.observe("dashboard_query_stage_seconds", time.perf_counter() - queue_started, query=query_name, stage="queue")
+				acquire_started = time.perf_counter()
+				async with self._acquire(host) as conn:
+					query_metrics.observe("dashboard_query_stage_seconds", time.perf_counter() - acquire_started, query=query_name, stage="pool_acquire")
+					try:
+						if host.role == "replica":
+							metadata = self.get_cache_metadata(parameters, await self.fetch_data_version(conn))
+						print(f"⌛ Executing query {query_name}")
+						args = [parameters.get(param.name, param.default) for param in query_def.parameters]
+						fetch_started = time.perf_counter()
+						try:
+							df = await self._fetch_dataframe(conn, query_name, query_key, query_def, args, metadata)
+						except (asyncpg.InvalidCachedStatementError, asyncpg.exceptions.OutdatedSchemaCacheError):
+							# the schema changed since the statement was prepared, prepare it again
+							conn.invalidate_prepared(query_def.sql, query_name)
+							df = await self._fetch_dataframe(conn, query_name, query_key, query_def, args, metadata)
+						# explain slow read-only queries (EXPLAIN ANALYZE executes the query again)
+						if query_def.read_only:
+							parameters_str = { name: serialize_parameter(value) for name, value in parameters.items() }
+							self.plan_capture.observe(query_name, query_def.sql, args, parameters_str, time.perf_counter() - fetch_started, host.config)
+					except Exception as e:
+						# drop only a broken connection, the pool opens a new one on the next acquire (timed out queries are cancelled, the connection stays usable)
+						if is_connection_error(e) and not conn.is_closed():
+							conn.terminate()
+						raise
+		finally:
+			host.outstanding -= 1
+		query_metrics.observe("dashboard_query_rows", len(df), query=query_name)
+		query_metrics.observe("dashboard_query_bytes", MemoryCache.get_size(df), query=query_name)
+		return df, metadata
+
+	def get_breaker(self, name: str) -> CircuitBreaker:
+		"""Get the circuit breaker of a query name or a database host"""
+		if name not in self._breakers:
+			self._breakers[name] = CircuitBreaker(query_state, name)
+		return self._breakers[name]
 
-		async def execute_single_query(name: str) -> tuple[str, pd.DataFrame]:
-			df = await self.execute_query(name, parameters, or_query_defs.get(name))
-			return name, df
+	async def _fetch_dataframe(self, conn: QueryConnection, query_name: str, query_key: str, query_def: QueryDefinition, args: List[Any], metadata: Dict[str, str]) -> pd.DataFrame:
+		"""Execute the (cached) prepared statement of a query, decode its records and apply the transformers"""
+		with query_metrics.timer(query_name, "prepare"):
+			stmt = await conn.prepare_cached(query_def.sql, query_name)
+		if query_def.streaming:
+			with query_metrics.timer(query_name, "stream"):
+				return await self._fetch_streaming(conn, stmt, query_name, query_key, query_def, args, metadata)
 
-		# Execute specified queries concurrently
-		tasks = [execute_single_query(name) for name in query_names]
+		with query_metrics.timer(query_name, "fetch"):
+			records = await stmt.fetch(*args)
+
+		# Decode the records into typed columns using the statement attribute types
+		with query_metrics.timer(query_name, "decode"):
+			df = records_to_dataframe(records, stmt.get_attributes())
+
+		# Apply transformers
+		for transformer in self.registry.get_transformers(query_name):
+			with query_metrics.timer(query_name, f"transform:{type(transformer).__name__}"):
+				df = await transformer.transform(df)
+		return df
+
+	async def _fetch_streaming(self, conn: QueryConnection, stmt: asyncpg.prepared_stmt.PreparedStatement, query_name: str, query_key: str, query_def: QueryDefinition,
+	                           args: List[Any], metadata: Dict[str, str]) -> pd.DataFrame:
+		"""
+		Stream a query result through a server-side cursor in chunks, each decoded and transformed on its own.
+		The chunks are reduced by the query reducer, or written one by one to the file cache entry of the query (read back once complete,
+		memory-mapped, and not kept in the memory caches), so only one chunk and the reduction state are held in memory while streaming.
+		"""
+		chunks = self._iter_chunks(conn, stmt, query_name, query_def, args)
+		if query_def.reducer is not None:
+			state = query_def.reducer.initial()
+			async for chunk in chunks:
+				state = query_def.reducer.reduce(state, chunk)
+			return query_def.reducer.result(state)
+
+		path = self.get_cache_path(query_key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		self.cache_manifest.open()
+		with self.cache_format.open_writer_atomic(path, metadata) as writer:
+			async for chunk in chunks:
+				writer.write(chunk)
+		self.cache_manifest.record_write(query_key, query_name, path, os.path.getsize(path))
+		with query_metrics.timer(query_name, "cache_read"):
+			return self.cache_format.read(path)
+
+	async def _iter_chunks(self, conn: QueryConnection, stmt: asyncpg.prepared_stmt.PreparedStatement, query_name: str, query_def: QueryDefinition,
+	                       args: List[Any]) -> AsyncIterator[pd.DataFrame]:
+		"""Iterate the decoded and transformed chunks of a server-side cursor, at least one (empty) chunk so the result keeps its columns"""
+		transformers = self.registry.get_transformers(query_name)
+		attributes = stmt.get_attributes()
+		chunks = 0
+
+		# server-side cursors only live inside a transaction
+		async with conn.transaction(readonly=True):
+			cursor = await stmt.cursor(*args)
+			while True:
+				records = await cursor.fetch(query_def.chunk_size)
+				if not records and chunks > 0:
+					break
+				chunk = records_to_dataframe(records, attributes)
+				for transformer in transformers:
+					chunk = await transformer.transform_chunk(chunk)
+				yield chunk
+				chunks += 1
+				if len(records) < query_def.chunk_size:
+					break
+
+	async def execute_queries(self, query_names: List[str], parameters: Dict[str, Any], or_query_defs: Dict[str, QueryDefinition] = { }, columns: Dict[str, List[str]] = { }, batch: bool = False) -> QueryResults:
+		"""
+		Execute multiple queries sharing the same parameters, optionally projecting only the given columns per query.
+		The queries run concurrently, each on its own pool connection. With batch=True (opt-in, for groups of cheap queries),
+		the queries that reach the database share a single connection (acquired only when needed), which serializes them.
+		A failing query does not fail the others, its error is kept in the errors of the returned results.
+		"""
 		try:
-			results = await asyncio.gather(*tasks)
-			return dict(results)
+			await self.init_pool()
 		except Exception as e:
-			print(f"Error executing queries: {e}")
-			# Ensure pool is closed on error
-			await self.close_pool()
-			raise
+			# cached results can still be served, the queries reaching the database retry on their own
+			print(f"Failed to initialize the connection pool: {e}")
+
+		batch_connection = BatchConnection() if batch and len(query_names) > 1 else None
+		token = _batch_connection.set(batch_connection)
+		# Execute specified queries concurrently (the tasks inherit the batch connection context)
+		tasks = [self.execute_query(name, parameters, or_query_defs.get(name), columns.get(name)) for name in query_names]
+		try:
+			results = QueryResults()
+			for name, result in zip(query_names, await asyncio.gather(*tasks, return_exceptions=True)):
+				if isinstance(result, asyncio.CancelledError):
+					raise result
+				if isinstance(result, BaseException):
+					print(f"Error executing query {name}: {result}")
+					results.errors[name] = result
+				else:
+					results[name] = result
+			return results
+		finally:
+			_batch_connection.reset(token)
+			if batch_connection is not None:
+				await batch_connection.release()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import datetime
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+# PostgreSQL type OIDs (pg_catalog.pg_type)
+OID_BOOL = 16
+OID_INT8 = 20
+OID_INT2 = 21
+OID_INT4 = 23
+OID_FLOAT4 = 700
+OID_FLOAT8 = 701
+OID_DATE = 1082
+OID_TIMESTAMP = 1114
+OID_TIMESTAMPTZ = 1184
+OID_NUMERIC = 1700
+
+
+# ---- Column Decoders ----
+def _decode_int(values: Sequence[Any]) -> np.ndarray | pd.api.extensions.ExtensionArray:
+	"""Decode integer values into int64, nullable Int64 when the column has NULLs"""
+	if None not in values:
+		return np.fromiter(values, dtype=np.int64, count=len(values))
+	mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+	data = np.fromiter((0 if v is None else v for v in values), dtype=np.int64, count=len(values))
+	return pd.arrays.IntegerArray(data, mask)
+
+
+def _decode_float(values: Sequence[Any]) -> np.ndarray:
+	"""Decode float values into float64, NULLs as NaN"""
+	return np.fromiter((np.nan if v is None else float(v) for v in values), dtype=np.float64, count=len(values))
+
+
+def _decode_numeric(values: Sequence[Any]) -> np.ndarray:
+	"""
+	Decode numeric values (Decimals) into float64, NULLs as NaN.
+	The dtype does not depend on the values, so the chunks of a streamed result share their schema (integral values are exact up to 2**53).
+	"""
+	return _decode_float(values)
+
+
+def _decode_bool(values: Sequence[Any]) -> np.ndarray | pd.api.extensions.ExtensionArray:
+	"""Decode boolean values into bool, nullable boolean when the column has NULLs"""
+	if None not in values:
+		return np.fromiter(values, dtype=bool, count=len(values))
+	mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+	data = np.fromiter((bool(v) for v in values), dtype=bool, count=len(values))
+	return pd.arrays.BooleanArray(data, mask)
+
+
+def _to_datetime64(values: Sequence[Any]) -> np.ndarray:
+	"""Convert naive datetimes to datetime64[ns], NULLs as NaT"""
+	return np.array([np.datetime64("NaT") if v is None else v for v in values], dtype="datetime64[us]").astype("datetime64[ns]")
+
+
+def _decode_timestamp(values: Sequence[Any]) -> pd.DatetimeIndex:
+	"""Decode timestamp values into datetime64[ns]"""
+	return pd.DatetimeIndex(_to_datetime64(values))
+
+
+def _decode_timestamptz(values: Sequence[Any]) -> pd.DatetimeIndex:
+	"""Decode timestamptz values into datetime64[ns, UTC]"""
+	utc_values = [v.astimezone(datetime.timezone.utc).replace(tzinfo=None) if v is not None else None for v in values]
+	return pd.DatetimeIndex(_to_datetime64(utc_values)).tz_localize("UTC")
+
+
+def _decode_date(values: Sequence[Any]) -> pd.DatetimeIndex:
+	"""Decode date values into datetime64[ns]"""
+	return pd.DatetimeIndex(np.array([np.datetime64("NaT") if v is None else v for v in values], dtype="datetime64[D]").astype("datetime64[ns]"))
+
+
+def _decode_object(values: Sequence[Any]) -> np.ndarray:
+	"""Keep values as Python objects (text, json, arrays, ...)"""
+	array = np.empty(len(values), dtype=object)
+	array[:] = values
+	return array
+
+
+column_decoders: Dict[int, Callable[[Sequence[Any]], Any]] = {
+	OID_BOOL: _decode_bool,
+	OID_INT2: _decode_int,
+	OID_INT4: _decode_int,
+	OID_INT8: _decode_int,
+	OID_FLOAT4: _decode_float,
+	OID_FLOAT8: _decode_float,
+	OID_NUMERIC: _decode_numeric,
+	OID_DATE: _decode_date,
+	OID_TIMESTAMP: _decode_timestamp,
+	OID_TIMESTAMPTZ: _decode_timestamptz,
+}
+
+
+def records_to_dataframe(records: List[Any], attributes: Sequence[Any]) -> pd.DataFrame:
+	"""
+	Decode asyncpg records into a DataFrame column by column.
+	The column dtypes come from the statement attribute type OIDs, so pandas does not run a row-wise inference pass.
+	Repeated column names are rejected (alias them in the query), as the columns are keyed by name.
+	"""
+	names = [attribute.name for attribute in attributes]
+	duplicates = sorted({ name for name in names if names.count(name) > 1 })
+	if duplicates:
+		raise ValueError(f"Query result has repeated column names: {', '.join(duplicates)}")
+	# transpose the records into columns (asyncpg Records are sequences)
+	columns = list(zip(*records)) if records else [() for _ in attributes]
+	return pd.DataFrame(
+		{
+			attribute.name: column_decoders.get(attribute.type.oid, _decode_object)(values)
+			for attribute, values in zip(attributes, columns)
+		},
+		columns=names,
+	)
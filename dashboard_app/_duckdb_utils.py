@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import glob
+import hashlib
+import os
+import threading
+from typing import Any, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from dashboard_app._snapshot_utils import FUNCTION_CALL, SNAPSHOT_HOUR_FORMAT, SNAPSHOT_PARTITION, SNAPSHOTS_DIR
+
+
+class OfflineEngine:
+	"""
+	In-process DuckDB engine running the dashboard queries over local Parquet snapshots (without the database).
+	The analytic functions are replaced by table macros of the same name reading the snapshot hours of the queried range,
+	so the query SQL runs unchanged. Only additive (bucketed) queries can be computed from the hourly snapshots,
+	and the date ranges are resolved at hour precision.
+	"""
+
+	def __init__(self, snapshots_dir: str = SNAPSHOTS_DIR):
+		self.snapshots_dir = snapshots_dir
+		self._conn: Optional[duckdb.DuckDBPyConnection] = None
+		self._pid: Optional[int] = None
+		self._lock = threading.Lock()
+		self.functions: List[str] = []
+		self.version: Optional[str] = None
+		self.max_timestamp: Optional[datetime.datetime] = None
+
+	def get_snapshot_glob(self, function: str) -> str:
+		"""Get the glob of the snapshot files of a function"""
+		return os.path.join(self.snapshots_dir, function, f"{SNAPSHOT_PARTITION}=*", "*.parquet")
+
+	def _connect(self) -> duckdb.DuckDBPyConnection:
+		"""Get the connection of this process, defining a macro per function with a snapshot"""
+		with self._lock:
+			# forked processes must not reuse the parent's connection
+			if self._conn is not None and self._pid == os.getpid():
+				return self._conn
+			conn = duckdb.connect()
+			functions, fingerprint, max_timestamp = [], hashlib.md5(), None
+			for function in sorted(os.listdir(self.snapshots_dir)) if os.path.isdir(self.snapshots_dir) else []:
+				files = sorted(glob.glob(self.get_snapshot_glob(function)))
+				if not files:
+					continue
+				conn.execute(f"""
+					CREATE OR REPLACE MACRO {function}(date_from, date_to) AS TABLE
+					SELECT * EXCLUDE (bucket_start, {SNAPSHOT_PARTITION})
+					FROM read_parquet('{self.get_snapshot_glob(function)}', hive_partitioning = true, hive_types = {{ '{SNAPSHOT_PARTITION}': 'VARCHAR' }})
+					WHERE {SNAPSHOT_PARTITION} >= strftime(date_trunc('hour', date_from), '{SNAPSHOT_HOUR_FORMAT}')
+						AND {SNAPSHOT_PARTITION} <= strftime(date_to, '{SNAPSHOT_HOUR_FORMAT}')
+				""")
+				functions.append(function)
+				# the snapshot version changes whenever a snapshot file is added or rewritten
+				for file in files:
+					fingerprint.update(f"{file}:{os.path.getmtime(file)}".encode())
+				last_hour = datetime.datetime.strptime(os.path.basename(os.path.dirname(files[-1])).split("=", 1)[1], SNAPSHOT_HOUR_FORMAT)
+				max_timestamp = max(max_timestamp or last_hour, last_hour)
+			self._conn, self._pid = conn, os.getpid()
+			self.functions = functions
+			self.version = f"snapshot-{fingerprint.hexdigest()[:12]}"
+			# the last hour is complete in the snapshot
+			self.max_timestamp = max_timestamp + datetime.timedelta(hours=1) if max_timestamp else None
+			print(f"🦆 Offline engine loaded snapshots of {functions}")
+			return conn
+
+	def reload(self):
+		"""Pick up new snapshots (e.g. after an export)"""
+		with self._lock:
+			self._conn = None
+		self._connect()
+
+	def get_data_version(self) -> Tuple[Optional[str], Optional[datetime.datetime]]:
+		"""Get the version of the snapshots and the end of their last hour"""
+		self._connect()
+		return self.version, self.max_timestamp
+
+	def supports(self, sql: str) -> bool:
+		"""Check whether all functions a query calls have a snapshot"""
+		self._connect()
+		called = FUNCTION_CALL.findall(sql)
+		return bool(called) and all(function in self.functions for function in called)
+
+	async def execute(self, sql: str, args: List[Any]) -> pd.DataFrame:
+		"""Execute a query over the snapshots (on a worker thread, DuckDB releases the GIL while scanning)"""
+		if not self.supports(sql):
+			raise ValueError(f"Query calls functions without a snapshot: {FUNCTION_CALL.findall(sql)}")
+		conn = self._connect()
+
+		def run() -> pd.DataFrame:
+			# cursors are independent connections to the same database, safe to use from other threads
+			with conn.cursor() as cursor:
+				return cursor.execute(sql.strip().rstrip(";"), args).df()
+
+		return await asyncio.to_thread(run)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import asyncpg
+import diskcache
+
+# queries whose database round-trip takes longer are explained (seconds, None disables the capture)
+SLOW_QUERY_THRESHOLD = 2.0
+# at most one plan per query name within the interval, across all processes
+EXPLAIN_RATE_LIMIT = 10 * 60  # seconds
+# plans captured at once across all processes, each one runs its slow query again on its own connection
+EXPLAIN_CONCURRENCY = 1
+# the explained query runs again, so it is cut off after the timeout
+EXPLAIN_TIMEOUT = 120  # seconds
+# a capture slot of a crashed process is freed after the timeout with room for connecting
+EXPLAIN_SLOT_EXPIRE = EXPLAIN_TIMEOUT + 30  # seconds
+# local plan log, one JSON line per captured plan
+PLAN_LOG_PATH = os.path.join(os.path.dirname(__file__), "dash_cache", "plans", "plans.jsonl")
+
+
+@dataclass
+class PlanNodeStats:
+	# node type with the relation, function or index it works on, e.g. "Function Scan on performance_an_best_vendors"
+	node: str
+	# time spent in the node itself (without its children) summed over the captured plans, in milliseconds
+	self_time: float = 0
+	# blocks read from disk by the node including its children
+	shared_read_blocks: int = 0
+	# number of occurrences in the captured plans
+	plans: int = 0
+
+
+def _describe_node(plan: Dict[str, Any]) -> str:
+	"""Describe a plan node by its type and the relation, function or index it works on"""
+	target = plan.get("Relation Name") or plan.get("Function Name") or plan.get("Index Name") or plan.get("CTE Name")
+	return f"{plan['Node Type']} on {target}" if target else plan["Node Type"]
+
+
+def _iter_nodes(plan: Dict[str, Any]) -> Iterator[tuple[Dict[str, Any], float]]:
+	"""Iterate the plan nodes with their own time (total time of all loops minus the time of their children)"""
+	total = plan.get("Actual Total Time", 0) * plan.get("Actual Loops", 1)
+	children = plan.get("Plans", [])
+	children_total = sum(child.get("Actual Total Time", 0) * child.get("Actual Loops", 1) for child in children)
+	yield plan, max(total - children_total, 0)
+	for child in children:
+		yield from _iter_nodes(child)
+
+
+class PlanCapture:
+	"""
+	Captures the execution plans of slow queries.
+	A query slower than the threshold is explained (EXPLAIN ANALYZE with buffers) on a separate connection in the background,
+	rate limited per query name and capped in concurrency across all processes, and the plan is appended to the plan log
+	with its parameters and latency.
+	"""
+
+	def __init__(self, store: diskcache.Cache, threshold: Optional[float] = SLOW_QUERY_THRESHOLD, path: str = PLAN_LOG_PATH, concurrency: int = EXPLAIN_CONCURRENCY):
+		self.store = store
+		self.threshold = threshold
+		self.path = path
+		self.concurrency = concurrency
+		# running captures, referenced so they are not garbage collected
+		self._captures: Set[asyncio.Task] = set()
+		# forked processes do not inherit the parent's running captures
+		os.register_at_fork(after_in_child=self._captures.clear)
+
+	def _take_slot(self) -> Optional[str]:
+		"""Take a free capture slot shared by all processes, returns its key (None when all slots are taken)"""
+		for slot in range(self.concurrency):
+			key = f"explain/running/{slot}"
+			if self.store.add(key, os.getpid(), expire=EXPLAIN_SLOT_EXPIRE):
+				return key
+		return None
+
+	def observe(self, query_name: str, sql: str, args: List[Any], parameters: Dict[str, str], latency: float, db_config: Dict[str, str]):
+		"""Explain a query in the background when it was slow, a capture slot is free and no plan of it was captured within the rate limit"""
+		if self.threshold is None or latency < self.threshold:
+			return
+		# the slot is taken first, so a skipped capture does not use up the rate limit of the query
+		slot = self._take_slot()
+		if slot is None:
+			return
+		if not self.store.add(f"explain/{query_name}", os.getpid(), expire=EXPLAIN_RATE_LIMIT):
+			self.store.delete(slot)
+			return
+		print(f"🐢 Slow query {query_name} took {latency:.2f}s, capturing its plan")
+
+		async def capture():
+			try:
+				await self.capture(query_name, sql, args, parameters, latency, db_config)
+			except Exception as e:
+				print(f"Failed to capture the plan of query {query_name}: {e}")
+			finally:
+				self.store.delete(slot)
+
+		# on the running loop, the capture waits on its own connection and does not hold up the query
+		task = asyncio.get_running_loop().create_task(capture())
+		self._captures.add(task)
+		task.add_done_callback(self._captures.discard)
+
+	async def capture(self, query_name: str, sql: str, args: List[Any], parameters: Dict[str, str], latency: float, db_config: Dict[str, str]) -> Dict[str, Any]:
+		"""Explain a query on a new connection (not taken from the pool) and append the plan to the plan log"""
+		conn = await asyncpg.connect(**db_config)
+		try:
+			explained = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *args, timeout=EXPLAIN_TIMEOUT)
+		finally:
+			await conn.close()
+		# the JSON format is a list with a single plan
+		plan = (json.loads(explained) if isinstance(explained, str) else explained)[0]
+		entry = {
+			"query": query_name,
+			"captured_at": time.time(),
+			"latency": latency,
+			"parameters": parameters,
+			"host": f"{db_config.get('host')}:{db_config.get('port')}",
+			"plan": plan,
+		}
+		os.makedirs(os.path.dirname(self.path), exist_ok=True)
+		with open(self.path, "a") as f:
+			f.write(json.dumps(entry, default=str) + "\n")
+		print(f"🐢 Captured the plan of query {query_name} (execution {plan.get('Execution Time', 0):.0f} ms)")
+		return entry
+
+	def read_plans(self) -> List[Dict[str, Any]]:
+		"""Read the captured plans, skipping lines broken by an interrupted write"""
+		if not os.path.exists(self.path):
+			return []
+		plans = []
+		with open(self.path, "r") as f:
+			for line in f:
+				try:
+					plans.append(json.loads(line))
+				except json.JSONDecodeError:
+					continue
+		return plans
+
+	def get_report(self, top: int = 5) -> Dict[str, List[PlanNodeStats]]:
+		"""Get the most expensive plan nodes (by their own time) per query name"""
+		nodes: Dict[str, Dict[str, PlanNodeStats]] = { }
+		for entry in self.read_plans():
+			query_nodes = nodes.setdefault(entry["query"], { })
+			for plan, self_time in _iter_nodes(entry["plan"]["Plan"]):
+				stats = query_nodes.setdefault(_describe_node(plan), PlanNodeStats(_describe_node(plan)))
+				stats.self_time += self_time
+				stats.shared_read_blocks += plan.get("Shared Read Blocks", 0)
+				stats.plans += 1
+		return {
+			query_name: sorted(query_nodes.values(), key=lambda stats: stats.self_time, reverse=True)[:top]
+			for query_name, query_nodes in nodes.items()
+		}
+
+
+if __name__ == '__main__':
+	# usage: python -m dashboard_app._explain_utils (summarizes the captured plans)
+	from dashboard_app._db_utils import query_state
+
+	report = PlanCapture(query_state).get_report()
+	if not report:
+		print(f"No plans captured in {PLAN_LOG_PATH}")
+	for query, query_nodes in report.items():
+		print(f"-- {query} --")
+		for stats in query_nodes:
+			print(f"{stats.self_time:>12.1f} ms  {stats.shared_read_blocks:>10} blocks read  {stats.node}")
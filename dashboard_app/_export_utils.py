@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from dashboard_app._db_utils import DATA_LATE_ARRIVAL_GRACE, QueryManager
+from dashboard_app._snapshot_utils import FUNCTION_CALL, SNAPSHOT_HOUR_FORMAT, SNAPSHOT_PARTITION, SNAPSHOTS_DIR
+
+# first hour exported by default (naive UTC)
+EXPORT_START = datetime.datetime(2024, 7, 4)
+EXPORT_STEP = datetime.timedelta(hours=1)
+# slices exported at once, each on its own pool connection
+EXPORT_CONCURRENCY = 8
+EXPORT_ROW_GROUP_SIZE = 128 * 1024
+EXPORT_MANIFEST_FILE = "_manifest.json"
+
+# Arrow types of the Postgres column types (others are kept as strings)
+arrow_types: Dict[str, pa.DataType] = {
+	"int2": pa.int16(),
+	"int4": pa.int32(),
+	"int8": pa.int64(),
+	"float4": pa.float32(),
+	"float8": pa.float64(),
+	# dashboard aggregates are summed as floats, exact decimals are not needed
+	"numeric": pa.float64(),
+	"bool": pa.bool_(),
+	"text": pa.string(),
+	"varchar": pa.string(),
+	"bpchar": pa.string(),
+	"uuid": pa.string(),
+	"date": pa.date32(),
+	"timestamp": pa.timestamp("us"),
+	"timestamptz": pa.timestamp("us", tz="UTC"),
+}
+
+
+@dataclass
+class ExportSource:
+	name: str
+	# SELECT of one slice, formatted with the "start" (inclusive) and "end" (exclusive) timestamp literals
+	slice_sql: str
+
+
+def function_source(function: str) -> ExportSource:
+	"""Export the hourly outputs of an analytic function (the snapshots of the offline engine)"""
+	return ExportSource(function, f"SELECT {{start}}::timestamp AS bucket_start, * FROM {function}({{start}}, {{end}}::timestamp - INTERVAL '1 second')")
+
+
+def table_source(table: str, time_column: str) -> ExportSource:
+	"""Export the rows of a table by its time column"""
+	return ExportSource(
+		table,
+		f"SELECT date_trunc('hour', {time_column} AT TIME ZONE 'UTC') AS bucket_start, * FROM {table} "
+		f"WHERE {time_column} >= {{start}}::timestamp AT TIME ZONE 'UTC' AND {time_column} < {{end}}::timestamp AT TIME ZONE 'UTC'"
+	)
+
+
+class SnapshotExporter:
+	"""
+	Exports sources from Postgres into hour-partitioned Parquet files (zstd, with row group statistics).
+	Every hour is streamed with COPY on its own pool connection, concurrently, and parsed by the Arrow CSV reader off the event loop.
+	A manifest per source records the exported hours, so later exports skip the final hours exported before.
+	"""
+
+	def __init__(self, query_manager: QueryManager, directory: str = SNAPSHOTS_DIR, concurrency: int = EXPORT_CONCURRENCY):
+		self.query_manager = query_manager
+		self.directory = directory
+		self.concurrency = concurrency
+
+	def get_manifest_path(self, source: ExportSource) -> str:
+		return os.path.join(self.directory, source.name, EXPORT_MANIFEST_FILE)
+
+	def read_manifest(self, source: ExportSource) -> Dict[str, Dict[str, object]]:
+		"""Get the exported hours of a source"""
+		if not os.path.exists(self.get_manifest_path(source)):
+			return { }
+		with open(self.get_manifest_path(source), "r") as f:
+			return json.load(f)
+
+	def _write_manifest(self, source: ExportSource, manifest: Dict[str, Dict[str, object]]):
+		tmp_path = f"{self.get_manifest_path(source)}.tmp"
+		with open(tmp_path, "w") as f:
+			json.dump(manifest, f, indent=1, sort_keys=True)
+		os.replace(tmp_path, self.get_manifest_path(source))
+
+	async def _get_schema(self, sql: str) -> pa.Schema:
+		"""Get the Arrow schema of a slice from its prepared statement"""
+		async with self.query_manager.primary.pool.acquire() as conn:
+			stmt = await conn.prepare(sql)
+			return pa.schema([(attr.name, arrow_types.get(attr.type.name, pa.string())) for attr in stmt.get_attributes()])
+
+	@staticmethod
+	def _write_partition(data: bytes, schema: pa.Schema, path: str) -> int:
+		"""Parse a COPY CSV slice with the slice schema and write it as Parquet, returns the number of rows"""
+		table = pa_csv.read_csv(
+			io.BytesIO(data),
+			convert_options=pa_csv.ConvertOptions(
+				column_types=schema,
+				true_values=["t"],
+				false_values=["f"],
+				# COPY writes NULL unquoted and empty strings quoted
+				strings_can_be_null=True,
+				quoted_strings_can_be_null=False,
+			),
+		).select(schema.names)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp_path = f"{path}.tmp"
+		pq.write_table(table, tmp_path, compression="zstd", write_statistics=True, row_group_size=EXPORT_ROW_GROUP_SIZE)
+		os.replace(tmp_path, path)
+		return table.num_rows
+
+	async def _export_slice(self, source: ExportSource, schema: pa.Schema, start: datetime.datetime) -> Dict[str, object]:
+		"""Stream one hour of a source with COPY and write its partition"""
+		sql = source.slice_sql.format(start=f"'{start.isoformat(sep=' ')}'", end=f"'{(start + EXPORT_STEP).isoformat(sep=' ')}'")
+		buffer = io.BytesIO()
+
+		async def write(chunk: bytes):
+			buffer.write(chunk)
+
+		started = time.perf_counter()
+		async with self.query_manager.primary.pool.acquire() as conn:
+			await conn.copy_from_query(sql, output=write, format="csv", header=True)
+		path = os.path.join(self.directory, source.name, f"{SNAPSHOT_PARTITION}={start.strftime(SNAPSHOT_HOUR_FORMAT)}", "part-0.parquet")
+		rows = await asyncio.to_thread(self._write_partition, buffer.getvalue(), schema, path)
+		return { "rows": rows, "bytes": os.path.getsize(path), "csv_bytes": buffer.tell(), "seconds": round(time.perf_counter() - started, 3) }
+
+	async def export(self, source: ExportSource, since: datetime.datetime = EXPORT_START, until: Optional[datetime.datetime] = None, full: bool = False) -> Dict[str, int]:
+		"""
+		Export the hours of a source from since until the data watermark (or until), skipping the final hours already exported unless full.
+		Hours ending after the data watermark (with late arrival grace) are not final and exported again by the next export,
+		without a data watermark no hour is final.
+		"""
+		await self.query_manager.init_pool()
+		data_version = await self.query_manager.get_data_version()
+		watermark = data_version.max_timestamp if data_version and data_version.max_timestamp else None
+		if watermark is None:
+			# without the data watermark no hour is known to be complete, they are all exported again by the next export
+			print(f"⚠️ Data watermark unavailable, exporting {source.name} up to now without marking any hour final")
+		until = until or (watermark or datetime.datetime.utcnow()).replace(minute=0, second=0, microsecond=0) + EXPORT_STEP
+		manifest = { } if full else self.read_manifest(source)
+
+		hours = []
+		start = since.replace(minute=0, second=0, microsecond=0)
+		while start < until:
+			if not manifest.get(start.strftime(SNAPSHOT_HOUR_FORMAT), { }).get("final"):
+				hours.append(start)
+			start += EXPORT_STEP
+		print(f"📦 Exporting {len(hours)} hours of {source.name}")
+		if not hours:
+			return { "hours": 0, "rows": 0, "bytes": 0 }
+
+		schema = await self._get_schema(source.slice_sql.format(start="'2000-01-01'", end="'2000-01-01'"))
+		semaphore = asyncio.Semaphore(self.concurrency)
+		started = time.perf_counter()
+
+		async def export_hour(hour: datetime.datetime):
+			async with semaphore:
+				stats = await self._export_slice(source, schema, hour)
+			stats["final"] = watermark is not None and hour + EXPORT_STEP < watermark - DATA_LATE_ARRIVAL_GRACE
+			manifest[hour.strftime(SNAPSHOT_HOUR_FORMAT)] = stats
+			return stats
+
+		try:
+			results = await asyncio.gather(*[export_hour(hour) for hour in hours])
+		finally:
+			# keep the progress of the exported hours even when one of them fails
+			self._write_manifest(source, manifest)
+		totals = { "hours": len(results), "rows": sum(r["rows"] for r in results), "bytes": sum(r["bytes"] for r in results) }
+		elapsed = time.perf_counter() - started
+		print(f"📦 Exported {source.name}: {totals['rows']} rows in {elapsed:.1f}s ({sum(r['csv_bytes'] for r in results) / 1024 / 1024 / max(elapsed, 1e-9):.1f} MiB/s)")
+		return totals
+
+
+def get_catalog_sources(query_manager: QueryManager) -> List[ExportSource]:
+	"""Get the functions called by the additive queries, the snapshots the offline engine can run them on"""
+	functions = []
+	for query_def in query_manager.registry.get_queries():
+		if query_def.buckets is not None:
+			functions += [function for function in FUNCTION_CALL.findall(query_def.sql) if function not in functions]
+	return [function_source(function) for function in functions]
+
+
+if __name__ == '__main__':
+	# usage: python -m dashboard_app._export_utils [--table <table>:<time column> ...] [--since 2024-07-04T00:00] [--full]
+	from dashboard_app._async_utils import loop_runner
+	from dashboard_app._query_manager import query_manager
+
+	parser = argparse.ArgumentParser(description="Export hour-partitioned Parquet snapshots from Postgres")
+	parser.add_argument("--table", action="append", default=[], help="table and its time column (<table>:<column>), the catalog functions by default")
+	parser.add_argument("--since", type=datetime.datetime.fromisoformat, default=EXPORT_START)
+	parser.add_argument("--until", type=datetime.datetime.fromisoformat, default=None)
+	parser.add_argument("--full", action="store_true", help="export the final hours again")
+	parser.add_argument("--directory", default=SNAPSHOTS_DIR)
+	parser.add_argument("--concurrency", type=int, default=EXPORT_CONCURRENCY)
+	cli_args = parser.parse_args()
+
+	sources = [table_source(*table.split(":", 1)) for table in cli_args.table] or get_catalog_sources(query_manager)
+	exporter = SnapshotExporter(query_manager, cli_args.directory, cli_args.concurrency)
+
+
+	async def main():
+		try:
+			for source in sources:
+				await exporter.export(source, cli_args.since, cli_args.until, cli_args.full)
+		finally:
+			await query_manager.close_pool()
+
+
+	print("-- Exporting snapshots --")
+	loop_runner.run(main())
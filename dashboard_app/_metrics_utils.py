@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import atexit
+import contextlib
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+import diskcache
+
+# metrics are aggregated across all (server worker) processes in a shared store
+METRICS_DIR = os.path.join(os.path.dirname(__file__), "dash_cache", "metrics")
+# the metrics are aggregated in each process and added to the shared store once per interval (and on exit)
+METRICS_FLUSH_INTERVAL = 5  # seconds
+
+# histogram buckets (upper bounds) per metric
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROWS_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+BYTES_BUCKETS = (1_024, 16_384, 131_072, 1_048_576, 8_388_608, 67_108_864, 536_870_912)
+
+histograms = {
+	"dashboard_query_seconds": ("Total execute_query latency per query and result source (cache, database, in_flight, ...)", SECONDS_BUCKETS),
+	"dashboard_query_stage_seconds": ("Duration of the query execution stages (pool acquire, prepare, fetch, decode, transformers, cache read/write)", SECONDS_BUCKETS),
+	"dashboard_query_rows": ("Number of rows of the fetched query results", ROWS_BUCKETS),
+	"dashboard_query_bytes": ("In-memory size of the fetched query results", BYTES_BUCKETS),
+	"dashboard_materialized_view_refresh_seconds": ("Duration of the materialized view refreshes", SECONDS_BUCKETS),
+}
+counters = {
+	"dashboard_query_total": "Number of executed queries per query and result source",
+	"dashboard_query_cache_total": "Number of cache lookups per query and cache tier (memory, shared, file, stale, miss)",
+	"dashboard_query_errors_total": "Number of failed queries",
+	"dashboard_query_routed_total": "Number of database round-trips per query and database host",
+	"dashboard_prepared_statements_total": "Number of prepared statement cache lookups per query and result (hit, miss, invalidation)",
+}
+
+# sums are stored as integers (diskcache increments integers), scaled by this factor
+SUM_SCALE = 1_000_000
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+	return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+	items = list(labels) + list(extra.items())
+	if not items:
+		return ""
+	escaped = [(k, str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for k, v in items]
+	return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+	return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class QueryMetrics:
+	"""
+	Histograms and counters of the query execution, exported in the Prometheus text format.
+	Recording only adds to the in-process aggregates (no I/O on the event loop), a daemon thread flushes them to the shared store periodically.
+	"""
+
+	def __init__(self, directory: str = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL):
+		self._store = diskcache.Cache(directory=directory)
+		self.flush_interval = flush_interval
+		# increments of the store keys aggregated since the last flush
+		self._pending: Dict[tuple, int] = { }
+		self._lock = threading.Lock()
+		self._flusher: Optional[threading.Thread] = None
+		atexit.register(self.flush)
+		# forked processes start their own flusher, the inherited increments are flushed by the parent
+		os.register_at_fork(after_in_child=self._reset)
+
+	def _reset(self):
+		self._pending = { }
+		self._lock = threading.Lock()
+		self._flusher = None
+
+	def _add(self, key: tuple, amount: int):
+		with self._lock:
+			self._pending[key] = self._pending.get(key, 0) + amount
+			if self._flusher is None:
+				self._flusher = threading.Thread(target=self._flush_periodically, name="metrics-flush", daemon=True)
+				self._flusher.start()
+
+	def _flush_periodically(self):
+		while True:
+			time.sleep(self.flush_interval)
+			self.flush()
+
+	def flush(self):
+		"""Add the increments aggregated in this process to the shared store in one transaction"""
+		with self._lock:
+			pending, self._pending = self._pending, { }
+		if not pending:
+			return
+		try:
+			with self._store.transact():
+				for key, amount in pending.items():
+					self._store.incr(key, amount)
+		except Exception as e:
+			print(f"Failed to flush metrics: {e}")
+
+	def observe(self, metric: str, value: float, **labels: str):
+		"""Observe a value of a histogram metric"""
+		key = _labels(labels)
+		bucket = next((le for le in histograms[metric][1] if value <= le), "+Inf")
+		self._add(("bucket", metric, key, bucket), 1)
+		self._add(("count", metric, key), 1)
+		self._add(("sum", metric, key), int(value * SUM_SCALE))
+
+	def increment(self, metric: str, amount: int = 1, **labels: str):
+		"""Increment a counter metric"""
+		self._add(("counter", metric, _labels(labels)), amount)
+
+	@contextlib.contextmanager
+	def timer(self, query_name: str, stage: str) -> Iterator[None]:
+		"""Measure the duration of a query execution stage"""
+		started = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe("dashboard_query_stage_seconds", time.perf_counter() - started, query=query_name, stage=stage)
+
+	def clear(self):
+		with self._lock:
+			self._pending = { }
+		self._store.clear()
+
+	def render(self) -> str:
+		"""Render all metrics in the Prometheus text exposition format (the other processes lag behind by up to their flush interval)"""
+		self.flush()
+		values: Dict[tuple, int] = { }
+		for key in self._store.iterkeys():
+			values[key] = self._store.get(key, 0)
+
+		lines = []
+		for metric, (description, buckets) in histograms.items():
+			lines.append(f"# HELP {metric} {description}")
+			lines.append(f"# TYPE {metric} histogram")
+			label_sets = sorted({ key[2] for key in values if key[0] == "count" and key[1] == metric })
+			for labels in label_sets:
+				cumulative = 0
+				for le in list(buckets) + ["+Inf"]:
+					cumulative += values.get(("bucket", metric, labels, le), 0)
+					lines.append(f"{metric}_bucket{_format_labels(labels, le=str(le))} {cumulative}")
+				lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(values.get(('sum', metric, labels), 0) / SUM_SCALE)}")
+				lines.append(f"{metric}_count{_format_labels(labels)} {values.get(('count', metric, labels), 0)}")
+
+		for metric, description in counters.items():
+			lines.append(f"# HELP {metric} {description}")
+			lines.append(f"# TYPE {metric} counter")
+			for key in sorted(k for k in values if k[0] == "counter" and k[1] == metric):
+				lines.append(f"{metric}{_format_labels(key[2])} {values[key]}")
+
+		return "\n".join(lines) + "\n"
+
+
+# process-wide metrics (flushed to the shared store)
+query_metrics = QueryMetrics()
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import hashlib
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from dashboard_app._async_utils import loop_runner
+from dashboard_app._db_utils import DATA_LATE_ARRIVAL_GRACE, DATA_VERSION_SQL, QueryDefinition, QueryManager, query_state, to_utc_naive
+from dashboard_app._metrics_utils import query_metrics
+
+# create and refresh the hourly rollups of the queries declared as materialized
+MATERIALIZED_VIEWS_ENABLED = True
+MATERIALIZED_VIEW_PREFIX = "dashboard_rollup_"
+# first hour of the rollups (naive UTC), the rollups end at the hour of the data watermark
+ROLLUP_START = datetime.datetime(2024, 7, 4)
+ROLLUP_STEP = datetime.timedelta(hours=1)
+MATERIALIZED_VIEW_REFRESH_INTERVAL = 5 * 60  # seconds
+MATERIALIZED_VIEW_REFRESH_TIMEOUT = 30 * 60  # seconds
+MATERIALIZED_VIEW_POLL_INTERVAL = 30  # seconds
+
+
+@dataclass
+class MaterializedViewState:
+	refreshed_at: float
+	# refresh duration in seconds
+	duration: float
+	rows: int
+	# data watermark when the refresh started, rollup hours ending before it (with late arrival grace) are final
+	watermark: Optional[datetime.datetime]
+	# first and last hour in the rollup
+	covers_from: Optional[datetime.datetime]
+	covers_until: Optional[datetime.datetime]
+
+
+def _ceil_to_hour(dt: datetime.datetime) -> datetime.datetime:
+	floored = dt.replace(minute=0, second=0, microsecond=0)
+	return floored if floored == dt else floored + ROLLUP_STEP
+
+
+class MaterializedViewManager:
+	"""
+	Hourly rollups of the additive queries declared as materialized, kept as materialized views in the database.
+	Each rollup row is the query result of one hour, so any range of whole final hours is summed from the rollup instead of the raw data.
+	The views are created on the primary, refreshed concurrently on a schedule (once across all processes) and their refresh cost and staleness tracked.
+	"""
+
+	def __init__(self, query_manager: QueryManager, refresh_interval: float = MATERIALIZED_VIEW_REFRESH_INTERVAL):
+		self.query_manager = query_manager
+		self.refresh_interval = refresh_interval
+		query_manager.materialized_views = self
+
+	def get_views(self) -> List[QueryDefinition]:
+		"""
+		Get the queries with a rollup: additive queries declared as materialized, parametrized only by their date range
+		and without transformers (the rollup rows are summed as fetched).
+		"""
+		return [
+			query_def for query_def in self.query_manager.registry.get_queries()
+			if query_def.materialized and query_def.buckets is not None and not self.query_manager.registry.get_transformers(query_def.name)
+			and [param.name for param in query_def.parameters] == [query_def.buckets.date_from, query_def.buckets.date_to]
+		]
+
+	@staticmethod
+	def get_view_name(query_def: QueryDefinition) -> str:
+		"""Get the view name of a query, a changed query SQL (or rollup definition) gets a new view"""
+		definition = "\n".join([query_def.sql, DATA_VERSION_SQL, ROLLUP_START.isoformat()])
+		return f"{MATERIALIZED_VIEW_PREFIX}{query_def.name}_{hashlib.md5(definition.encode()).hexdigest()[:8]}"
+
+	def get_view_sql(self, query_def: QueryDefinition) -> str:
+		"""Get the definition of the rollup view, the query executed for every hour up to the data watermark"""
+		hour_sql = re.sub(r"\$1\b", "h.bucket_start", query_def.sql.strip().rstrip(";"))
+		hour_sql = re.sub(r"\$2\b", "(h.bucket_start + INTERVAL '1 hour' - INTERVAL '1 second')", hour_sql)
+		return f"""
+			CREATE MATERIALIZED VIEW IF NOT EXISTS {self.get_view_name(query_def)} AS
+			SELECT h.bucket_start, row_number() OVER (PARTITION BY h.bucket_start) AS bucket_row, q.*
+			FROM generate_series(
+				TIMESTAMP '{ROLLUP_START.isoformat(sep=" ")}',
+				(SELECT date_trunc('hour', v.max_timestamp AT TIME ZONE 'UTC') FROM ({DATA_VERSION_SQL}) AS v),
+				INTERVAL '1 hour'
+			) AS h(bucket_start)
+			CROSS JOIN LATERAL (
+				{hour_sql}
+			) AS q
+			WITH NO DATA
+		"""
+
+	def get_read_sql(self, query_def: QueryDefinition) -> str:
+		"""Get the query reading the rollup rows of a range of hours (start inclusive, end exclusive)"""
+		return f"SELECT * FROM {self.get_view_name(query_def)} WHERE bucket_start >= $1 AND bucket_start < $2"
+
+	def get_state(self, query_def: QueryDefinition) -> Optional[MaterializedViewState]:
+		"""Get the state of the last refresh of the rollup of a query, None when never refreshed"""
+		return query_state.get(f"mview/{self.get_view_name(query_def)}")
+
+	def get_covered_range(self, query_def: QueryDefinition, date_from: datetime.datetime, date_to: datetime.datetime) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+		"""
+		Get the whole final rollup hours within an inclusive date range, as a start (inclusive) and end (exclusive).
+		Returns None when the range covers no such hour.
+		"""
+		state = self.get_state(query_def)
+		if state is None or not state.rows or state.watermark is None:
+			return None
+		final_until = (state.watermark - DATA_LATE_ARRIVAL_GRACE).replace(minute=0, second=0, microsecond=0)
+		start = max(_ceil_to_hour(to_utc_naive(date_from)), state.covers_from)
+		end = min((to_utc_naive(date_to) + datetime.timedelta(seconds=1)).replace(minute=0, second=0, microsecond=0), state.covers_until + ROLLUP_STEP, final_until)
+		if end - start < ROLLUP_STEP:
+			return None
+		return start, end
+
+	async def refresh(self, query_def: QueryDefinition) -> MaterializedViewState:
+		"""Create the rollup of a query if needed and refresh it (concurrently once populated, so readers are not blocked)"""
+		view = self.get_view_name(query_def)
+		await self.query_manager.init_pool()
+		started = time.perf_counter()
+		# materialized views are refreshed on the primary, the replicas receive them through replication
+		async with self.query_manager.primary.pool.acquire() as conn:
+			await conn.execute(self.get_view_sql(query_def))
+			# concurrent refreshes need a unique index covering all rows
+			await conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {view}_bucket ON {view} (bucket_start, bucket_row)")
+			populated = await conn.fetchval("SELECT ispopulated FROM pg_matviews WHERE matviewname = $1", view)
+			watermark = (await QueryManager.fetch_data_version(conn)).max_timestamp
+			await conn.execute(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if populated else ''}{view}", timeout=MATERIALIZED_VIEW_REFRESH_TIMEOUT)
+			row = await conn.fetchrow(f"SELECT count(*) AS rows, min(bucket_start) AS covers_from, max(bucket_start) AS covers_until FROM {view}")
+		duration = time.perf_counter() - started
+
+		state = MaterializedViewState(
+			refreshed_at=time.time(),
+			duration=duration,
+			rows=row["rows"],
+			watermark=watermark,
+			covers_from=row["covers_from"],
+			covers_until=row["covers_until"],
+		)
+		query_state.set(f"mview/{view}", state)
+		query_metrics.observe("dashboard_materialized_view_refresh_seconds", duration, view=view)
+		print(f"🧱 Refreshed materialized view {view} in {duration:.1f}s ({state.rows} rows)")
+		return state
+
+	async def drop_stale_views(self) -> List[str]:
+		"""Drop the rollup views no materialized query reads anymore (e.g. of an older query SQL), returns the dropped views"""
+		current = { self.get_view_name(query_def) for query_def in self.get_views() }
+		await self.query_manager.init_pool()
+		dropped = []
+		async with self.query_manager.primary.pool.acquire() as conn:
+			views = await conn.fetch("SELECT matviewname FROM pg_matviews WHERE left(matviewname, length($1)) = $1", MATERIALIZED_VIEW_PREFIX)
+			for view in [row["matviewname"] for row in views if row["matviewname"] not in current]:
+				# the unique index of the view is dropped with it
+				await conn.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view}")
+				query_state.delete(f"mview/{view}")
+				dropped.append(view)
+		if dropped:
+			print(f"🧱 Dropped stale materialized views: {', '.join(dropped)}")
+		return dropped
+
+	async def refresh_due(self):
+		"""Refresh the rollups not refreshed within the refresh interval, each by one process only, dropping the stale views once per interval"""
+		if query_state.add("mview/drop-stale", os.getpid(), expire=self.refresh_interval):
+			try:
+				await self.drop_stale_views()
+			except Exception as e:
+				print(f"🚨 Failed to drop stale materialized views: {e}")
+		for query_def in self.get_views():
+			state = self.get_state(query_def)
+			if state is not None and time.time() - state.refreshed_at < self.refresh_interval:
+				continue
+			view = self.get_view_name(query_def)
+			if not query_state.add(f"mview/{view}-refresh", os.getpid(), expire=MATERIALIZED_VIEW_REFRESH_TIMEOUT):
+				continue
+			try:
+				await self.refresh(query_def)
+				query_state.delete(f"mview/{view}-refresh")
+			except Exception as e:
+				# the refresh lock expires after the refresh timeout, so a failing refresh is not retried right away
+				print(f"🚨 Failed to refresh materialized view {view}: {e}")
+
+	async def _refresh_loop(self):
+		while True:
+			await self.refresh_due()
+			await asyncio.sleep(MATERIALIZED_VIEW_POLL_INTERVAL)
+
+	def start(self):
+		"""Refresh the rollups on a schedule on the process loop"""
+		loop_runner.submit(self._refresh_loop())
+
+	def get_status(self) -> List[Dict[str, object]]:
+		"""Get the refresh cost and staleness of the rollups"""
+		status = []
+		for query_def in self.get_views():
+			state = self.get_state(query_def)
+			status.append({
+				"view": self.get_view_name(query_def),
+				"query": query_def.name,
+				"refreshed_ago": time.time() - state.refreshed_at if state else None,
+				"refresh_duration": state.duration if state else None,
+				"rows": state.rows if state else None,
+				"watermark": state.watermark.isoformat() if state and state.watermark else None,
+			})
+		return status
+
+
+if __name__ == '__main__':
+	# usage: python -m dashboard_app._mview_utils (drops the stale rollups and refreshes all rollups once)
+	from dashboard_app._query_manager import materialized_views, query_manager
+
+
+	async def main():
+		await materialized_views.drop_stale_views()
+		for query_def in materialized_views.get_views():
+			await materialized_views.refresh(query_def)
+		await query_manager.close_pool()
+
+
+	print("-- Refreshing materialized views --")
+	loop_runner.run(main())
+	for view_status in materialized_views.get_status():
+		print(view_status)
@@ -1,44 +1,28 @@
 from __future__ import annotations
 
-import datetime
-
-from dashboard_app._db_utils import QueryDefinition, QueryManager, QueryParameter, get_db_config
+from dashboard_app._catalog_utils import CATALOG_HOT_RELOAD, QueryCatalog
+from dashboard_app._db_utils import BucketSpec, QueryManager, get_db_hosts
+from dashboard_app._mview_utils import MaterializedViewManager
 
 # Initialize the query manager
-query_manager = QueryManager(get_db_config())
+query_manager = QueryManager(get_db_hosts())
 
-# Sankey diagram query
-query_manager.registry.register_query(
-	QueryDefinition(
-		name="sankey_diagram",
-		sql=QueryManager.process_sql_query(
-			"""
-			SELECT * FROM get_sankey_diagram_data(:date_from$1, :date_to$2)
-			"""
-		),
-		parameters=[
-			QueryParameter("date_from", datetime.datetime),
-			QueryParameter("date_to", datetime.datetime)
-		],
-		default_data="FSCacheDefault"
-	)
+# Register the SQL query catalog (dashboard_app/queries/*.sql)
+query_catalog = QueryCatalog(
+	query_manager,
+	overrides={
+		# the peak hour of each bucket is a candidate of the peak hour of the whole range
+		"transaction_volume_peak": {
+			"buckets": BucketSpec(
+				keys=["hour"],
+				finalize=lambda df: df.sort_values("count", ascending=False).head(1).reset_index(drop=True)
+			),
+		},
+	}
 )
+query_catalog.load()
+if CATALOG_HOT_RELOAD:
+	query_catalog.watch()
 
-# Time series query
-query_manager.registry.register_query(
-	QueryDefinition(
-		name="time_series",
-		sql=QueryManager.process_sql_query(
-			"""
-			SELECT * FROM get_time_series(:date_from$1, :date_to$2, :granularity_minutes$3, :day_start_hour$4)
-			"""
-		),
-		parameters=[
-			QueryParameter("date_from", datetime.datetime),
-			QueryParameter("date_to", datetime.datetime),
-			QueryParameter("granularity_minutes", int),
-			QueryParameter("day_start_hour", int)
-		],
-		default_data="FSCacheDefault"
-	)
-)
+# Hourly rollups of the queries declared as materialized
+materialized_views = MaterializedViewManager(query_manager)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import diskcache
+
+
+@dataclass
+class PriorityClass:
+	# classes with a lower rank are admitted first
+	rank: int
+	# maximum number of queries of the class in flight in a process
+	concurrency: int
+
+
+# priority classes of the queries, headline KPIs above tables above charts
+PRIORITY_CLASSES: Dict[str, PriorityClass] = {
+	"kpi": PriorityClass(rank=0, concurrency=10),
+	"table": PriorityClass(rank=1, concurrency=6),
+	"chart": PriorityClass(rank=2, concurrency=4),
+}
+DEFAULT_PRIORITY = "table"
+
+# limits of the queries in flight, of each process and across all (server worker) processes
+SCHEDULER_MAX_CONCURRENCY = 16
+SCHEDULER_MAX_HEAVY = 2
+SCHEDULER_STATE_KEY = "scheduler/running"
+# interval of retrying a shared slot while all of them are taken
+SCHEDULER_POLL_INTERVAL = 0.05  # seconds
+# slots of crashed processes are dropped after this timeout
+SCHEDULER_RUNNING_EXPIRE = 180  # seconds
+
+
+@dataclass
+class Ticket:
+	priority: str
+	heavy: bool
+	session: str
+	enqueued_at: float
+	seen_at: float
+
+
+@dataclass
+class SchedulerQueue:
+	"""Tickets of a process, waiting and admitted, guarded by the condition of its event loop"""
+	loop: asyncio.AbstractEventLoop
+	condition: asyncio.Condition
+	running: Dict[str, Ticket] = field(default_factory=dict)
+	waiting: Dict[str, Ticket] = field(default_factory=dict)
+
+
+class QueryScheduler:
+	"""
+	Admission control of the database round-trips.
+	Queries wait in a queue of the process ordered by their priority class, then by the number of queries their session already has in flight
+	(so sessions are served round-robin), then by arrival. A query is admitted when its class, the heavy queries and the total are within their limits,
+	then takes one of the slots shared by all processes, which cap the total and the heavy queries across processes.
+	The queue lives on the event loop, only the shared slots go through the store (on a thread of the scheduler, never on the loop),
+	retried at the poll interval only while all of them are taken.
+	"""
+
+	def __init__(self, store: diskcache.Cache, classes: Optional[Dict[str, PriorityClass]] = None, max_concurrency: int = SCHEDULER_MAX_CONCURRENCY, max_heavy: int = SCHEDULER_MAX_HEAVY):
+		self.store = store
+		self.classes = classes or PRIORITY_CLASSES
+		self.max_concurrency = max_concurrency
+		self.max_heavy = max_heavy
+		self._queue: Optional[SchedulerQueue] = None
+		self._executor: Optional[ThreadPoolExecutor] = None
+		self._pid: Optional[int] = None
+
+	def _get_queue(self) -> SchedulerQueue:
+		"""Get the queue of the running event loop"""
+		loop = asyncio.get_running_loop()
+		if self._queue is None or self._queue.loop is not loop:
+			self._queue = SchedulerQueue(loop=loop, condition=asyncio.Condition())
+		return self._queue
+
+	def _get_executor(self) -> ThreadPoolExecutor:
+		"""
+		Get the thread running the store calls of this process.
+		A single thread runs them in order, so the release of a cancelled query runs after its pending acquire.
+		"""
+		# forked processes do not inherit the thread
+		if self._executor is None or self._pid != os.getpid():
+			self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-scheduler")
+			self._pid = os.getpid()
+		return self._executor
+
+	@contextlib.asynccontextmanager
+	async def slot(self, priority: str, heavy: bool = False, session: str = ""):
+		"""Wait until the query is admitted and hold its slot while running"""
+		ticket_id = uuid.uuid4().hex
+		now = time.time()
+		ticket = Ticket(priority=priority, heavy=heavy, session=session, enqueued_at=now, seen_at=now)
+		queue = self._get_queue()
+		loop = asyncio.get_running_loop()
+		executor = self._get_executor()
+		acquiring = False
+		try:
+			async with queue.condition:
+				queue.waiting[ticket_id] = ticket
+				self._admit(queue)
+				await queue.condition.wait_for(lambda: ticket_id in queue.running)
+			acquiring = True
+			while not await loop.run_in_executor(executor, self._acquire_shared, ticket_id, ticket):
+				await asyncio.sleep(SCHEDULER_POLL_INTERVAL)
+			yield
+		finally:
+			if acquiring:
+				executor.submit(self._release_shared, ticket_id)
+			async with queue.condition:
+				queue.running.pop(ticket_id, None)
+				queue.waiting.pop(ticket_id, None)
+				self._admit(queue)
+
+	def _admit(self, queue: SchedulerQueue):
+		"""Admit all waiting tickets that fit the limits and wake up their queries (called holding the condition)"""
+		admitted = False
+		while (next_id := self._get_next(queue.running, queue.waiting)) is not None:
+			queue.running[next_id] = queue.waiting.pop(next_id)
+			admitted = True
+		if admitted:
+			queue.condition.notify_all()
+
+	def _acquire_shared(self, ticket_id: str, ticket: Ticket) -> bool:
+		"""Take a slot shared by all processes when the total and the heavy queries of all processes are within their limits"""
+		with self.store.transact():
+			running = self._get_shared()
+			if len(running) >= self.max_concurrency or (ticket.heavy and sum(1 for t in running.values() if t.heavy) >= self.max_heavy):
+				return False
+			ticket.seen_at = time.time()
+			running[ticket_id] = ticket
+			self.store.set(SCHEDULER_STATE_KEY, running)
+			return True
+
+	def _release_shared(self, ticket_id: str):
+		"""Give back the shared slot of a finished (or cancelled) query"""
+		with self.store.transact():
+			running = self._get_shared()
+			if running.pop(ticket_id, None) is not None:
+				self.store.set(SCHEDULER_STATE_KEY, running)
+
+	def _get_shared(self) -> Dict[str, Ticket]:
+		"""Get the shared slots taken, without the ones of crashed processes"""
+		now = time.time()
+		return { k: t for k, t in self.store.get(SCHEDULER_STATE_KEY, { }).items() if t.seen_at > now - SCHEDULER_RUNNING_EXPIRE }
+
+	def _get_next(self, running: Dict[str, Ticket], waiting: Dict[str, Ticket]) -> Optional[str]:
+		"""Get the next waiting ticket to admit, None when no waiting ticket fits the limits"""
+		if len(running) >= self.max_concurrency:
+			return None
+		per_class: Dict[str, int] = { }
+		per_session: Dict[str, int] = { }
+		for t in running.values():
+			per_class[t.priority] = per_class.get(t.priority, 0) + 1
+			per_session[t.session] = per_session.get(t.session, 0) + 1
+		heavy = sum(1 for t in running.values() if t.heavy)
+
+		admissible = [
+			(k, t) for k, t in waiting.items()
+			if per_class.get(t.priority, 0) < self.classes[t.priority].concurrency and (not t.heavy or heavy < self.max_heavy)
+		]
+		if not admissible:
+			return None
+		next_id, _ = min(admissible, key=lambda item: (self.classes[item[1].priority].rank, per_session.get(item[1].session, 0), item[1].enqueued_at))
+		return next_id
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+import os
+import re
+
+# local Parquet snapshots of the hourly outputs of the analytic functions, written by the exporter (_export_utils)
+# and read by the offline engine (_duckdb_utils), so this module needs neither Postgres nor DuckDB:
+# <SNAPSHOTS_DIR>/<function>/snapshot_hour=<YYYY-MM-DDTHH>/*.parquet, each row with the "bucket_start" hour it belongs to
+SNAPSHOTS_DIR = os.path.join(os.path.dirname(__file__), "snapshots")
+SNAPSHOT_HOUR_FORMAT = "%Y-%m-%dT%H"
+SNAPSHOT_PARTITION = "snapshot_hour"
+# analytic function calls of a query SQL (the functions with snapshots)
+FUNCTION_CALL = re.compile(r"\bFROM\s+(\w+)\s*\(", re.IGNORECASE)
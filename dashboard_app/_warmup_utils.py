@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from dashboard_app._db_utils import QueryManager, fetch_limit, query_session, query_state
+
+# warm the query cache for the preset date ranges on the app startup: "blocking" before the server takes traffic (resumable, so a restart
+# only warms what changed), "background" while it takes traffic, None not at all. WSGI servers importing the app do not run its startup,
+# run the warm-up as a stage before starting them instead: python -m dashboard_app._warmup_utils
+WARMUP_ON_STARTUP: Optional[str] = "blocking"
+# queries and database round-trips of the warm-up at once (a query fans out into sub-queries when bucketed or rolled up),
+# well below the pool size so the warm-up leaves room for other work
+WARMUP_CONCURRENCY = 4
+WARMUP_SESSION = "warmup"
+# progress of the warm-up per data version, older versions are not resumed
+WARMUP_PROGRESS_EXPIRE = 24 * 60 * 60  # seconds
+
+
+@dataclass
+class WarmupTask:
+	query_name: str
+	preset: str
+	parameters: Dict[str, Any]
+	query_key: str
+
+
+class CacheWarmer:
+	"""
+	Fills the query cache with every registered query crossed with the preset date ranges and the options of its other parameters.
+	Progress is kept per data version in the shared query state, so an interrupted warm-up resumes where it stopped
+	and a warm-up after new data is ingested starts over.
+	"""
+
+	def __init__(self, query_manager: QueryManager, presets: Dict[str, Tuple[str, str]], parameter_options: Optional[Dict[str, List[Any]]] = None, concurrency: int = WARMUP_CONCURRENCY):
+		self.query_manager = query_manager
+		self.presets = presets
+		self.parameter_options = parameter_options or { }
+		self.concurrency = concurrency
+
+	def get_tasks(self) -> List[WarmupTask]:
+		"""Get the query executions to warm, queries with parameters without options are skipped"""
+		tasks = []
+		for query_def in self.query_manager.registry.get_queries():
+			names = [param.name for param in query_def.parameters if param.name not in ("date_from", "date_to")]
+			missing = [name for name in names if name not in self.parameter_options]
+			if missing:
+				print(f"Skipping warm-up of query {query_def.name}, no options of parameters {missing}")
+				continue
+			for preset, (date_from, date_to) in self.presets.items():
+				for values in itertools.product(*[self.parameter_options[name] for name in names]):
+					date_range = { "date_from": datetime.datetime.fromisoformat(date_from), "date_to": datetime.datetime.fromisoformat(date_to) }
+					parameters = query_def.canonicalize({ **date_range, **dict(zip(names, values)) })
+					tasks.append(WarmupTask(query_def.name, preset, parameters, self.query_manager.get_query_key(query_def.name, parameters)))
+		# the presets share many ranges (e.g. "up-to-3" and "all")
+		return list({ task.query_key: task for task in tasks }.values())
+
+	async def warm(self) -> Dict[str, int]:
+		"""Execute the tasks not warmed yet for the current data version, returns the number of warmed, skipped and failed tasks"""
+		data_version = await self.query_manager.get_data_version()
+		progress_key = f"warmup/{data_version.version if data_version else ''}"
+		done = query_state.get(progress_key, set())
+		tasks = self.get_tasks()
+		pending = [task for task in tasks if task.query_key not in done]
+		counts = { "warmed": 0, "skipped": len(tasks) - len(pending), "failed": 0 }
+		print(f"🔥 Warming {len(pending)} of {len(tasks)} queries ({counts['skipped']} already warm)")
+
+		started = time.perf_counter()
+		semaphore = asyncio.Semaphore(self.concurrency)
+		# a query fans out into sub-queries (time buckets, rollup rows), so its round-trips are bounded too (the tasks inherit the context)
+		fetch_limit.set(asyncio.Semaphore(self.concurrency))
+		query_session.set(WARMUP_SESSION)
+
+		async def warm_task(task: WarmupTask):
+			async with semaphore:
+				try:
+					await self.query_manager.execute_query(task.query_name, task.parameters, None)
+				except Exception as e:
+					counts["failed"] += 1
+					print(f"🚨 Failed to warm query {task.query_name} ({task.preset}): {e}")
+					return
+			with query_state.transact():
+				query_state.set(progress_key, query_state.get(progress_key, set()) | { task.query_key }, expire=WARMUP_PROGRESS_EXPIRE)
+			counts["warmed"] += 1
+			finished = counts["warmed"] + counts["failed"]
+			print(f"🔥 [{finished}/{len(pending)}] Warmed query {task.query_name} ({task.preset}) after {time.perf_counter() - started:.1f}s")
+
+		await asyncio.gather(*[warm_task(task) for task in pending])
+		print(f"🔥 Cache warm-up finished in {time.perf_counter() - started:.1f}s: {counts}")
+		return counts
+
+
+if __name__ == '__main__':
+	# usage: python -m dashboard_app._warmup_utils (warms the cache of the preset date ranges, resumable)
+	from dashboard_app._async_utils import loop_runner
+	from dashboard_app.app import create_cache_warmer
+
+
+	async def main():
+		cache_warmer = create_cache_warmer()
+		await cache_warmer.warm()
+		await cache_warmer.query_manager.close_pool()
+
+
+	print("-- Warming the query cache --")
+	loop_runner.run(main())
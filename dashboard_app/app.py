@@ -1,18 +1,28 @@
 from __future__ import annotations
 
-import asyncio
-
 import dash as dash
 import dash_mantine_components as dmc
-import pandas as pd
-from dash import html
+import uuid
 
-from dashboard_app._dash_utils import background_callback_manager, create_cache_key, external_script, index_string
-from dashboard_app._query_manager import query_manager
+import flask
+import pandas as pd
+from dash import dcc, html
+
+from dashboard_app._async_utils import loop_runner
+from dashboard_app._dash_utils import callback_cache, external_script, index_string
+from dashboard_app._db_utils import query_session
+from dashboard_app._format_utils import parse_date
+from dashboard_app._metrics_utils import query_metrics
+from dashboard_app._mview_utils import MATERIALIZED_VIEWS_ENABLED
+from dashboard_app._query_manager import materialized_views, query_manager
+from dashboard_app._warmup_utils import CacheWarmer, WARMUP_ON_STARTUP
 from dashboard_app.sections.app_beverages_section import beverages_section_callbacks, beverages_section_children
 from dashboard_app.sections.app_cashflow_section import cashflow_section_callbacks, cashflow_section_children
 from dashboard_app.sections.app_customers_section import customers_section_callbacks, customers_section_children
-from dashboard_app.sections.app_performance_section import performance_section_callbacks, performance_section_children
+from dashboard_app.sections.app_performance_section import granularity_options, performance_section_callbacks, performance_section_children, time_series_day_start_hour
+
+# the cached query results are handed out as shallow copies, which must never write into the cache entries
+pd.set_option("mode.copy_on_write", True)
 
 # set the React version
 dash.dash._dash_renderer._set_react_version("18.2.0")
@@ -25,9 +35,22 @@ days = {
 	'up-to-1': ('2024-07-04 06:00:00', '2024-07-05 05:59:59'),
 	'up-to-2': ('2024-07-04 06:00:00', '2024-07-06 05:59:59'),
 	'up-to-3': ('2024-07-04 06:00:00', '2024-07-07 05:59:59'),
+	'all': ('2024-07-04 06:00:00', '2024-07-07 05:59:59'),
 }
 
 
+def create_cache_warmer() -> CacheWarmer:
+	"""Create the warm-up of the preset date ranges crossed with the filter options of the sections"""
+	return CacheWarmer(
+		query_manager,
+		presets=days,
+		parameter_options={
+			"granularity_minutes": [int(option['value']) for option in granularity_options],
+			"day_start_hour": [time_series_day_start_hour],
+		}
+	)
+
+
 # ---- Dash Application ----
 class MainApplication:
 	def __init__(self):
@@ -38,20 +61,34 @@ class MainApplication:
 			update_title="🔄 Reloading...",
 			external_stylesheets=[dmc.styles.ALL, dmc.styles.DATES, dmc.styles.CHARTS],
 			external_scripts=external_script,
-			background_callback_manager=background_callback_manager,
 			index_string=index_string,
 		)
 		self.__app.enable_async_callbacks = True
 
-		# Set the app layout
-		self.__app.layout = self._create_layout()
+		# Set the app layout (created per page load, so every browser session gets its own id)
+		self.__app.layout = self._create_layout
 
 		# Query manager
 		self.query_manager = query_manager
 
+		# Refresh the hourly rollups of the materialized queries on a schedule
+		if MATERIALIZED_VIEWS_ENABLED and query_manager.offline_engine is None:
+			materialized_views.start()
+
+		# Warm the query cache of the preset date ranges in the background, the app takes traffic meanwhile (a blocking warm-up runs before the server starts)
+		if WARMUP_ON_STARTUP == "background":
+			loop_runner.submit(create_cache_warmer().warm())
+
+		# Prometheus metrics of the query execution
+		self.__app.server.add_url_rule("/metrics", "metrics", self._metrics)
+
 		# Register callbacks
 		self._register_callbacks()
 
+	@staticmethod
+	def _metrics():
+		return flask.Response(query_metrics.render(), mimetype="text/plain; version=0.0.4")
+
 	def register_callback(self, output, inputs, prevent_initial_call=False, background=False, *args, **kwargs):
 		"""
 		Decorator for Dash callbacks that handles async operations and error handling.
@@ -60,11 +97,12 @@ class MainApplication:
 				output: Dash Output or tuple of Outputs
 				inputs: Dash Input or tuple of Inputs
 				prevent_initial_call: Boolean to prevent initial callback
-				background: Boolean to run callback in background
+				background: Boolean to run the callback as a query callback, in the server process with its output cached across sessions
 		"""
 
 		def decorator(func):
 			# print(f"Registering callback for function {func.__name__}, Output: {output}")
+			callback_id = callback_cache.get_callback_id(func)
 
 			def async_callback_wrapper(_self, *args, **kwargs):
 				"""Async callback wrapper implementation"""
@@ -72,7 +110,10 @@ class MainApplication:
 				async def async_function():
 					try:
 						# TODO: parse args logic?
-						parsed_args = args
+						# the last argument is the browser session id (appended state of query callbacks)
+						parsed_args = args[:-1] if background else args
+						if background:
+							query_session.set(args[-1] or "")
 
 						# Call the original function with parsed arguments
 						return await func(_self, *parsed_args, **kwargs)
@@ -80,12 +121,19 @@ class MainApplication:
 						print(f"🚨 Error in callback {func.__name__}: {str(e)}")
 						raise dash.exceptions.PreventUpdate
 
-				try:
-					loop = asyncio.new_event_loop()
-					asyncio.set_event_loop(loop)
-					return loop.run_until_complete(async_function())
-				finally:
-					loop.close()
+				# the cached outputs are shared across sessions (the session id is not part of the key)
+				cache_key = callback_cache.get_key(callback_id, (_self, *args[:-1]) if background else (_self, *args))
+				cached, output = callback_cache.get(cache_key)
+				if cached:
+					return output
+
+				# run on the long-lived loop of the server process (not in a forked background callback process),
+				# so the query manager pool, its prepared statements and the memory cache are reused across callbacks.
+				# The request thread waits for its output (the server is threaded), while the loop runs the queries of all threads concurrently;
+				# a background callback manager would fork a process per call and pay the connection and cold cache cost every time
+				output = loop_runner.run(async_function())
+				callback_cache.set(cache_key, output)
+				return output
 
 			def sync_callback_wrapper(_self, *args, **kwargs):
 				"""Sync callback wrapper implementation"""
@@ -105,9 +153,8 @@ class MainApplication:
 				return self.__app.callback(
 					output=output,
 					inputs=inputs,
-					background=True,
+					state=(dash.State("session-id", "data"),),
 					prevent_initial_call=prevent_initial_call,
-					manager=create_cache_key(func.__name__),
 					*args, **kwargs
 				)(async_callback_wrapper)
 			else:
@@ -125,6 +172,8 @@ class MainApplication:
 			html.Div(
 				className="grow",
 				children=[
+					# browser session id, the query scheduler queues fairly across sessions
+					dcc.Store(id="session-id", storage_type="session", data=uuid.uuid4().hex),
 					dmc.Container(
 						className="grid grid-cols-1 gap-8 py-8 pb-[250px]",
 						size="xl",
@@ -211,7 +260,16 @@ class MainApplication:
 			inputs=(dash.Input("filter-date-preset", "value")),
 		)
 		def sync_date_preset(preset):
-			return days[preset] if preset in days else (days['1'][0], days['3'][1])
+			return days[preset] if preset in days else days['all']
+
+		# show the effective date range of the date inputs
+		@self.register_callback(
+			output=dash.Output("filter-date-range", "children"),
+			inputs=(dash.Input("filter-date-from", "value"), dash.Input("filter-date-to", "value")),
+		)
+		def sync_date_range(date_from, date_to):
+			effective_from, effective_to = self.query_manager.get_effective_range(parse_date(date_from), parse_date(date_to))
+			return f"Showing data from {effective_from:%Y-%m-%d %H:%M:%S} to {effective_to:%Y-%m-%d %H:%M:%S}"
 
 		# register cashflow section callbacks
 		cashflow_section_callbacks(self)
@@ -240,5 +298,9 @@ if __name__ == '__main__':
 	print("----------------------------------------------")
 	Application = MainApplication()
 	app = Application.app
-	app.run(debug=False, port=4001)
+	# the first requests of the preset date ranges are served from the cache
+	if WARMUP_ON_STARTUP == "blocking":
+		loop_runner.run(create_cache_warmer().warm())
+	# the query callbacks block their request thread until the loop runner returns their output
+	app.run(debug=False, port=4001, threaded=True)
 # app.run_server(debug=False, host='192.168.0.167', port=4000)
@@ -0,0 +1,6 @@
+-- description: Spirits brands
+-- default_data: FSCacheDefault
+-- priority: chart
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM beverage_an_spirits_brands(:date_from$1, :date_to$2);
@@ -0,0 +1,6 @@
+-- description: Beverage category popularity
+-- default_data: FSCacheDefault
+-- priority: chart
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM beverage_an_category_popularity(:date_from$1, :date_to$2);
@@ -0,0 +1,7 @@
+-- description: Active chips per event day
+-- default_data: FSCacheDefault
+-- priority: chart
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM customer_an_attendance(:date_from$1, :date_to$2)
+ORDER BY active_chips DESC;
@@ -0,0 +1,6 @@
+-- description: Non-alcoholic beverage brands
+-- default_data: FSCacheDefault
+-- priority: chart
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM beverage_an_nonalcoholic_brands(:date_from$1, :date_to$2);
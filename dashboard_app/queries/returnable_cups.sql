@@ -0,0 +1,6 @@
+-- description: Returnable cups issued and returned
+-- default_data: FSCacheDefault
+-- priority: kpi
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM beverage_an_returnable_cups(:date_from$1, :date_to$2);
@@ -0,0 +1,8 @@
+-- description: Money flows between top-ups, sales and refunds (also the headline cashflow cards)
+-- default_data: FSCacheDefault
+-- priority: kpi
+-- fresh_for: 60
+-- max_staleness: 900
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM get_sankey_diagram_data(:date_from$1, :date_to$2)
@@ -0,0 +1,11 @@
+-- description: Transaction time series at the selected granularity
+-- default_data: FSCacheDefault
+-- priority: chart
+-- heavy: true
+-- fresh_for: 60
+-- max_staleness: 900
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+-- param granularity_minutes: int
+-- param day_start_hour: int
+SELECT * FROM get_time_series(:date_from$1, :date_to$2, :granularity_minutes$3, :day_start_hour$4)
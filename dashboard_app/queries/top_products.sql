@@ -0,0 +1,6 @@
+-- description: Top 10 products
+-- default_data: FSCacheDefault
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM performance_an_best_products(:date_from$1, :date_to$2)
+LIMIT 10
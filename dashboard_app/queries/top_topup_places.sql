@@ -0,0 +1,6 @@
+-- description: Top 10 top-up points
+-- default_data: FSCacheDefault
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM performance_an_best_topup_points(:date_from$1, :date_to$2)
+LIMIT 10
@@ -0,0 +1,6 @@
+-- description: Top 10 vendors
+-- default_data: FSCacheDefault
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM performance_an_best_vendors(:date_from$1, :date_to$2)
+LIMIT 10
@@ -0,0 +1,8 @@
+-- description: Total active chips
+-- default_data: FSCacheDefault
+-- priority: kpi
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT
+	MAX(total_chips) as total_active
+FROM customer_an_attendance(:date_from$1, :date_to$2)
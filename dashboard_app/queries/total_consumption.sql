@@ -0,0 +1,8 @@
+-- description: Total beverage consumption
+-- default_data: FSCacheDefault
+-- priority: kpi
+-- buckets: day, hour
+-- materialized: true
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT * FROM beverage_an_total_consumption(:date_from$1, :date_to$2);
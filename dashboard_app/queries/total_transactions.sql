@@ -0,0 +1,10 @@
+-- description: Total number of transactions
+-- default_data: FSCacheDefault
+-- priority: kpi
+-- buckets: day, hour
+-- materialized: true
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT
+	SUM(t.count) as count
+FROM performance_an_transaction_processing_hourly(:date_from$1, :date_to$2) t;
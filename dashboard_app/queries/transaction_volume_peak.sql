@@ -0,0 +1,15 @@
+-- description: Hour of the day with the most transactions
+-- default_data: FSCacheDefault
+-- priority: kpi
+-- buckets: day, hour
+-- materialized: true
+-- bucket_keys: hour
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+SELECT
+	t.hour,
+	SUM(t.count) as count
+FROM performance_an_transaction_processing_hourly(:date_from$1, :date_to$2) t
+GROUP BY t.hour
+ORDER BY count DESC
+LIMIT 1;
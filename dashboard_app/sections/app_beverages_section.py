@@ -1,12 +1,9 @@
 from __future__ import annotations
 
-import datetime
-
 import dash_mantine_components as dmc
 from dash import dash, dcc, html
 from dash_iconify import DashIconify
 
-from dashboard_app._db_utils import QueryDefinition, QueryManager, QueryParameter
 from dashboard_app._format_utils import format_number, format_number_short, format_volume, interpolated_text_with_components, parse_date
 
 
@@ -154,90 +151,12 @@ def beverages_section_callbacks(app):
 				'non_alcoholic_brands',
 				'alcoholic_brands',
 			],
-			or_query_defs={
-				'total_consumption': QueryDefinition(
-					name="total_consumption",
-					sql=QueryManager.process_sql_query(
-						"""
-							SELECT * FROM beverage_an_total_consumption(:date_from$1, :date_to$2);
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault"
-				),
-				'returnable_cups': QueryDefinition(
-					name="returnable_cups",
-					sql=QueryManager.process_sql_query(
-						"""
-							SELECT * FROM beverage_an_returnable_cups(:date_from$1, :date_to$2);
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault"
-				),
-				'category_popularity': QueryDefinition(
-					name="category_popularity",
-					sql=QueryManager.process_sql_query(
-						"""
-							SELECT * FROM beverage_an_category_popularity(:date_from$1, :date_to$2);
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault"
-				),
-				'beer_brands': QueryDefinition(
-					name="beer_brands",
-					sql=QueryManager.process_sql_query(
-						"""
-							SELECT * FROM beverage_an_beer_brands(:date_from$1, :date_to$2);
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault"
-				),
-				'non_alcoholic_brands': QueryDefinition(
-					name="non_alcoholic_brands",
-					sql=QueryManager.process_sql_query(
-						"""
-							SELECT * FROM beverage_an_nonalcoholic_brands(:date_from$1, :date_to$2);
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault"
-				),
-				'alcoholic_brands': QueryDefinition(
-					name="alcoholic_brands",
-					sql=QueryManager.process_sql_query(
-						"""
-							SELECT * FROM beverage_an_spirits_brands(:date_from$1, :date_to$2);
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault"
-				),
-			},
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
-			}
+			},
+			# cheap aggregates of the same date range, one connection for all of them
+			batch=True,
 		)
 		total_consumption_liters = round(results['total_consumption'].iloc[0].get("total_consumption_liters", 0))
 		returnable_cups_res = results['returnable_cups'].iloc[0]
@@ -207,6 +207,9 @@ def cashflow_section_callbacks(app):
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to)
+			},
+			columns={
+				"sankey_diagram": ['vendor_external_commission', 'vendor_organizer_sales', 'vendor_organizer_expenses', 'balance_unused_unclaimed_organizer'],
 			}
 		)
 		sankey_data = results['sankey_diagram'].iloc[0]
@@ -265,6 +268,9 @@ def cashflow_section_callbacks(app):
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to)
+			},
+			columns={
+				"sankey_diagram": ['balance_unused', 'balance_unused_unclaimed_organizer', 'balance_unused_refunded'],
 			}
 		)
 		sankey_data = results['sankey_diagram'].iloc[0]
@@ -323,6 +329,9 @@ def cashflow_section_callbacks(app):
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to)
+			},
+			columns={
+				"sankey_diagram": ['top_up_total', 'top_up_online', 'top_up_card', 'top_up_cash', 'top_up_vip'],
 			}
 		)
 		sankey_data = results['sankey_diagram'].iloc[0]
@@ -458,6 +467,9 @@ def cashflow_section_callbacks(app):
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to)
+			},
+			columns={
+				"sankey_diagram": ['vendor_organizer_sales', 'vendor_organizer_sales_non_alcoholic', 'vendor_organizer_sales_beer', 'vendor_organizer_sales_wine', 'vendor_organizer_sales_spirits', 'vendor_organizer_sales_salty', 'vendor_organizer_sales_sweet', 'vendor_organizer_sales_complimentary', 'vendor_organizer_sales_other', 'vendor_organizer_sales_ticket'],
 			}
 		)
 		sankey_data = results['sankey_diagram'].iloc[0]
@@ -572,6 +584,9 @@ def cashflow_section_callbacks(app):
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to)
+			},
+			columns={
+				"sankey_diagram": ['vendor_external_sales', 'vendor_external_commission', 'vendor_external_payout'],
 			}
 		)
 		sankey_data = results['sankey_diagram'].iloc[0]
@@ -1,16 +1,24 @@
 from __future__ import annotations
 
-import datetime
-
 import dash as dash
 import dash_ag_grid as dag
 import dash_mantine_components as dmc
 from dash import dcc, html
 from dash_iconify import DashIconify
 
-from dashboard_app._db_utils import QueryDefinition, QueryManager, QueryParameter
 from dashboard_app._format_utils import format_event_datetime, format_number, interpolated_text_with_components, locale_cs_d3, parse_date, to_timestamp
 
+# granularity options of the time series (minutes)
+granularity_options = [
+	{ 'value': '1', 'label': 'Minute' },
+	{ 'value': '15', 'label': '15 Minutes' },
+	{ 'value': '30', 'label': '30 Minutes' },
+	{ 'value': '60', 'label': 'Hour' },
+	{ 'value': '1440', 'label': 'Day' },
+]
+# when daily, start at 6am (4 UTC + 2 CEST), timezones go brr
+time_series_day_start_hour = 4
+
 
 def performance_section_children(app):
 	return html.Section(
@@ -174,13 +182,7 @@ def performance_section_children(app):
 																		id="filter-granularity",
 																		label="Granularity",
 																		value="60",
-																		data=[
-																			{ 'value': '1', 'label': 'Minute' },
-																			{ 'value': '15', 'label': '15 Minutes' },
-																			{ 'value': '30', 'label': '30 Minutes' },
-																			{ 'value': '60', 'label': 'Hour' },
-																			{ 'value': '1440', 'label': 'Day' },
-																		],
+																		data=granularity_options,
 																	),
 																]
 															)
@@ -311,8 +313,7 @@ def performance_section_callbacks(app):
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
 				"granularity_minutes": int(granularity),
-				# when daily, start at 6am (4 UTC + 2 CEST), timezones go brr
-				"day_start_hour": int(4),
+				"day_start_hour": time_series_day_start_hour,
 			}
 		)
 		time_series_data = results['time_series'].to_dict(orient='records')
@@ -437,41 +438,12 @@ def performance_section_callbacks(app):
 				"customers_per_day",
 				"total_active"
 			],
-			or_query_defs={
-				'customers_per_day': QueryDefinition(
-					name="customers_per_day",
-					sql=QueryManager.process_sql_query(
-						"""
-							SELECT * FROM customer_an_attendance(:date_from$1, :date_to$2)
-							ORDER BY active_chips DESC;
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault"
-				),
-				'total_active': QueryDefinition(
-					name="total_active",
-					sql=QueryManager.process_sql_query(
-						"""
-						SELECT
-							MAX(total_chips) as total_active
-						FROM customer_an_attendance(:date_from$1, :date_to$2)
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault"
-				),
-			},
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
-			}
+			},
+			# cheap aggregates of the same date range, one connection for all of them
+			batch=True,
 		)
 		customers_per_day = results['customers_per_day']
 		most_active_day = customers_per_day.iloc[0]
@@ -550,23 +522,6 @@ def performance_section_callbacks(app):
 			query_names=[
 				"total_transactions"
 			],
-			or_query_defs={
-				'total_transactions': QueryDefinition(
-					name="total_transactions",
-					sql=QueryManager.process_sql_query(
-						"""
-						SELECT
-							SUM(t.count) as count
-						FROM performance_an_transaction_processing_hourly(:date_from$1, :date_to$2) t;
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault",
-				),
-			},
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
@@ -630,27 +585,6 @@ def performance_section_callbacks(app):
 			query_names=[
 				"transaction_volume_peak"
 			],
-			or_query_defs={
-				'transaction_volume_peak': QueryDefinition(
-					name="transaction_volume_peak",
-					sql=QueryManager.process_sql_query(
-						"""
-						SELECT
-							t.hour,
-							SUM(t.count) as count
-						FROM performance_an_transaction_processing_hourly(:date_from$1, :date_to$2) t
-						GROUP BY t.hour
-						ORDER BY count DESC
-						LIMIT 1;
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault",
-				),
-			},
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
@@ -716,22 +650,6 @@ def performance_section_callbacks(app):
 			query_names=[
 				"top_selling_places"
 			],
-			or_query_defs={
-				'top_selling_places': QueryDefinition(
-					name="top_selling_places",
-					sql=QueryManager.process_sql_query(
-						"""
-						SELECT * FROM performance_an_best_sale_places(:date_from$1, :date_to$2)
-						LIMIT 10
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault",
-				),
-			},
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
@@ -755,22 +673,6 @@ def performance_section_callbacks(app):
 			query_names=[
 				"top_topup_places"
 			],
-			or_query_defs={
-				'top_topup_places': QueryDefinition(
-					name="top_topup_places",
-					sql=QueryManager.process_sql_query(
-						"""
-						SELECT * FROM performance_an_best_topup_points(:date_from$1, :date_to$2)
-						LIMIT 10
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault",
-				),
-			},
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
@@ -794,22 +696,6 @@ def performance_section_callbacks(app):
 			query_names=[
 				"top_vendors"
 			],
-			or_query_defs={
-				'top_vendors': QueryDefinition(
-					name="top_vendors",
-					sql=QueryManager.process_sql_query(
-						"""
-						SELECT * FROM performance_an_best_vendors(:date_from$1, :date_to$2)
-						LIMIT 10
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault",
-				),
-			},
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
@@ -833,22 +719,6 @@ def performance_section_callbacks(app):
 			query_names=[
 				"top_products"
 			],
-			or_query_defs={
-				'top_products': QueryDefinition(
-					name="top_products",
-					sql=QueryManager.process_sql_query(
-						"""
-						SELECT * FROM performance_an_best_products(:date_from$1, :date_to$2)
-						LIMIT 10
-						"""
-					),
-					parameters=[
-						QueryParameter("date_from", datetime.datetime),
-						QueryParameter("date_to", datetime.datetime)
-					],
-					default_data="FSCacheDefault",
-				),
-			},
 			parameters={
 				"date_from": parse_date(date_from),
 				"date_to": parse_date(date_to),
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Dict, List, Tuple
+
+import diskcache
+import pandas as pd
+import pytest
+
+import dashboard_app._db_utils as db_utils
+import dashboard_app._mview_utils as mview_utils
+import dashboard_app._warmup_utils as warmup_utils
+from dashboard_app._metrics_utils import query_metrics
+
+
+@pytest.fixture(autouse=True)
+def query_state(tmp_path, monkeypatch):
+	"""Shared query state and metrics of the test only, not the ones of the app"""
+	state = diskcache.Cache(directory=str(tmp_path / "query-state"))
+	monkeypatch.setattr(db_utils, "query_state", state)
+	monkeypatch.setattr(mview_utils, "query_state", state)
+	monkeypatch.setattr(warmup_utils, "query_state", state)
+	monkeypatch.setattr(query_metrics, "_store", diskcache.Cache(directory=str(tmp_path / "metrics")))
+	yield state
+	state.close()
+
+
+@pytest.fixture
+def query_manager(tmp_path, monkeypatch):
+	"""Query manager with its caches in the test directory, without a database (see the database fixture)"""
+	monkeypatch.setattr(db_utils, "CACHE_QUERIES_DIR", str(tmp_path / "cached-queries"))
+	monkeypatch.setattr(db_utils, "QUERY_LOCKS_DIR", str(tmp_path / "query-locks"))
+	query_manager = db_utils.QueryManager({ "host": "localhost", "port": 5432 }, shared_cache_bytes=0)
+
+	async def no_data_version():
+		return None
+
+	async def noop():
+		pass
+
+	query_manager.get_data_version = no_data_version
+	query_manager.init_pool = noop
+	query_manager._probe_hosts = noop
+	query_manager._select_host = lambda query_def: query_manager.primary
+	return query_manager
+
+
+class FakeDatabase:
+	"""Replaces the database round-trips of a query manager, records them and answers with the result of the handler"""
+
+	def __init__(self, query_manager: db_utils.QueryManager):
+		# (host name, query name, parameters) of every round-trip
+		self.calls: List[Tuple[str, str, Dict[str, Any]]] = []
+		self.delay = 0.0
+		self.handler: Callable[[str, Dict[str, Any]], pd.DataFrame] = lambda query_name, parameters: pd.DataFrame({ "count": [1, 2, 3] })
+		query_manager._fetch_from_host = self.fetch
+
+	async def fetch(self, host, query_name, query_def, parameters, query_key, metadata):
+		self.calls.append((host.name, query_name, parameters))
+		await asyncio.sleep(self.delay)
+		return self.handler(query_name, parameters), metadata
+
+
+@pytest.fixture
+def database(query_manager) -> FakeDatabase:
+	return FakeDatabase(query_manager)
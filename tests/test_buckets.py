@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+
+import pandas as pd
+
+from dashboard_app._db_utils import BucketSpec, QueryDefinition, QueryParameter, get_time_buckets
+
+DAY = datetime.timedelta(days=1)
+HOUR = datetime.timedelta(hours=1)
+# the event days start at 06:00
+ORIGIN = datetime.timedelta(hours=6)
+
+
+def test_range_is_split_into_aligned_buckets_largest_grid_first():
+	buckets = get_time_buckets(datetime.datetime(2024, 7, 4, 4, 30), datetime.datetime(2024, 7, 5, 7, 59, 59), [DAY, HOUR], ORIGIN)
+	assert buckets == [
+		# the partial hour at the start is kept as it is
+		(datetime.datetime(2024, 7, 4, 4, 30), datetime.datetime(2024, 7, 4, 4, 59, 59)),
+		(datetime.datetime(2024, 7, 4, 5), datetime.datetime(2024, 7, 4, 5, 59, 59)),
+		(datetime.datetime(2024, 7, 4, 6), datetime.datetime(2024, 7, 5, 5, 59, 59)),
+		(datetime.datetime(2024, 7, 5, 6), datetime.datetime(2024, 7, 5, 6, 59, 59)),
+		(datetime.datetime(2024, 7, 5, 7), datetime.datetime(2024, 7, 5, 7, 59, 59)),
+	]
+
+
+def test_range_within_a_bucket_is_not_split():
+	date_from, date_to = datetime.datetime(2024, 7, 4, 6, 10), datetime.datetime(2024, 7, 4, 6, 20)
+	assert get_time_buckets(date_from, date_to, [DAY, HOUR], ORIGIN) == [(date_from, date_to)]
+
+
+def test_moving_the_range_fetches_only_the_new_buckets(query_manager, database):
+	query_manager.registry.register_query(QueryDefinition("sales", "SELECT 1", [
+		QueryParameter("date_from", datetime.datetime, grid="minute"),
+		QueryParameter("date_to", datetime.datetime, grid="minute", bound="end"),
+	], default_data="FSCacheDefault", buckets=BucketSpec(keys=["vendor"])))
+	# every day sells 1 at vendor a and 2 at vendor b
+	database.handler = lambda query_name, parameters: pd.DataFrame({ "vendor": ["a", "b"], "count": [1, 2] })
+
+	first = asyncio.run(query_manager.execute_query("sales", { "date_from": datetime.datetime(2024, 7, 4, 6), "date_to": datetime.datetime(2024, 7, 6, 5, 59, 59) }, None))
+	assert first.set_index("vendor")["count"].to_dict() == { "a": 2, "b": 4 }
+	assert len(database.calls) == 2
+
+	database.calls.clear()
+	moved = asyncio.run(query_manager.execute_query("sales", { "date_from": datetime.datetime(2024, 7, 5, 6), "date_to": datetime.datetime(2024, 7, 7, 5, 59, 59) }, None))
+	assert moved.set_index("vendor")["count"].to_dict() == { "a": 2, "b": 4 }
+	assert [call[2]["date_from"] for call in database.calls] == [datetime.datetime(2024, 7, 6, 6)]
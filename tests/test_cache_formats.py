@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+
+import pandas as pd
+import pytest
+
+from dashboard_app._cache_utils import CACHE_TMP_SUFFIX, get_cache_format
+
+CACHE_FORMATS = ["parquet", "arrow", "csv"]
+
+
+def files_of(directory) -> list:
+	return sorted(file for _, _, files in os.walk(directory) for file in files)
+
+
+@pytest.mark.parametrize("format_name", CACHE_FORMATS)
+def test_write_atomic_round_trips_result_and_metadata(tmp_path, format_name):
+	cache_format = get_cache_format(format_name)
+	path = str(tmp_path / f"result.{cache_format.extension}")
+	df = pd.DataFrame({ "vendor": ["a", "b"], "count": [1, 2] })
+	cache_format.write_atomic(path, df, { "data_version": "42" })
+	assert cache_format.read(path).equals(df)
+	assert cache_format.read_metadata(path)["data_version"] == "42"
+	assert not any(file.endswith(CACHE_TMP_SUFFIX) for file in files_of(tmp_path))
+
+
+@pytest.mark.parametrize("format_name", CACHE_FORMATS)
+def test_failed_write_keeps_the_previous_result(tmp_path, monkeypatch, format_name):
+	cache_format = get_cache_format(format_name)
+	path = str(tmp_path / f"result.{cache_format.extension}")
+	df = pd.DataFrame({ "count": [1, 2] })
+	cache_format.write_atomic(path, df)
+
+	def failing_write(tmp_path, df, metadata=None):
+		with open(tmp_path, "wb") as f:
+			f.write(b"partial")
+		raise OSError("disk full")
+
+	monkeypatch.setattr(cache_format, "write", failing_write)
+	with pytest.raises(OSError):
+		cache_format.write_atomic(path, pd.DataFrame({ "count": [3] }))
+	assert get_cache_format(format_name).read(path).equals(df)
+	assert not any(file.endswith(CACHE_TMP_SUFFIX) for file in files_of(tmp_path))
+
+
+@pytest.mark.parametrize("format_name", CACHE_FORMATS)
+def test_chunks_are_written_atomically(tmp_path, format_name):
+	cache_format = get_cache_format(format_name)
+	path = str(tmp_path / f"result.{cache_format.extension}")
+	chunks = [pd.DataFrame({ "id": [i, i + 1], "name": ["x", "y"] }) for i in range(0, 6, 2)]
+	with cache_format.open_writer_atomic(path, { "data_version": "1" }) as writer:
+		for chunk in chunks:
+			writer.write(chunk)
+		# nothing appears before the last chunk is written
+		assert not os.path.exists(path)
+	assert cache_format.read(path)["id"].tolist() == list(range(6))
+
+	with pytest.raises(RuntimeError):
+		with cache_format.open_writer_atomic(str(tmp_path / f"failed.{cache_format.extension}")) as writer:
+			writer.write(chunks[0])
+			raise RuntimeError("cursor closed")
+	assert not any(file.startswith("failed") for file in files_of(tmp_path))
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from dashboard_app._cache_utils import CacheManifest
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+	"""File cache directory of its own (the test directory holds the query state too)"""
+	return tmp_path / "cached-queries"
+
+
+def write_entry(manifest: CacheManifest, directory, name: str, size: int):
+	path = directory / name / "q.parquet"
+	path.parent.mkdir(parents=True, exist_ok=True)
+	path.write_bytes(b"x" * size)
+	manifest.record_write(f"{name}/q", "q", str(path), size)
+	return path
+
+
+def test_least_recently_used_entries_are_evicted_over_the_budget(cache_dir):
+	manifest = CacheManifest(str(cache_dir), max_bytes=250)
+	first = write_entry(manifest, cache_dir, "a", 100)
+	second = write_entry(manifest, cache_dir, "b", 100)
+	time.sleep(0.01)
+	manifest.record_access("a/q")
+	third = write_entry(manifest, cache_dir, "c", 100)
+	assert first.exists() and third.exists()
+	assert not second.exists() and not second.parent.exists()
+	assert manifest.get_size() == 200
+
+
+def test_expired_entries_are_removed(cache_dir):
+	manifest = CacheManifest(str(cache_dir), ttl=0.05)
+	expired = write_entry(manifest, cache_dir, "a", 10)
+	time.sleep(0.1)
+	assert manifest.evict() == 10
+	assert not expired.exists()
+	assert manifest.get_keys("q") == []
+
+
+def test_gc_interval_is_shared_by_all_processes(cache_dir):
+	write_entry(CacheManifest(str(cache_dir), ttl=0.05), cache_dir, "a", 10)
+	time.sleep(0.1)
+	# a new process (manifest instance) within the GC interval of the last scan does not scan again
+	write_entry(CacheManifest(str(cache_dir), ttl=0.05), cache_dir, "b", 10)
+	assert CacheManifest(str(cache_dir)).get_size() == 20
+
+
+def test_existing_files_are_indexed_when_the_manifest_is_created(cache_dir):
+	(cache_dir / "a").mkdir(parents=True)
+	(cache_dir / "a" / "q.parquet").write_bytes(b"x" * 10)
+	manifest = CacheManifest(str(cache_dir))
+	assert manifest.get_keys("q") == ["a/q"]
+	assert manifest.get_size() == 10
+
+
+def test_entries_of_another_key_version_are_purged_once(cache_dir):
+	old = write_entry(CacheManifest(str(cache_dir), key_version="1"), cache_dir, "a", 10)
+	manifest = CacheManifest(str(cache_dir), key_version="2")
+	assert manifest.get_size() == 0
+	assert not old.exists()
+	write_entry(manifest, cache_dir, "b", 10)
+	assert CacheManifest(str(cache_dir), key_version="2").get_size() == 10
+
+
+def test_first_write_of_a_new_cache_is_not_purged(query_manager):
+	query_manager._write_fs_cache("q", "a/q", pd.DataFrame({ "count": [1] }), { })
+	assert os.path.exists(query_manager.get_cache_path("a/q"))
+	assert query_manager.cache_manifest.get_keys("q") == ["a/q"]
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import datetime
+import os
+
+import pytest
+
+from dashboard_app._catalog_utils import QUERIES_DIR, QueryCatalog, parse_sql_query
+
+SQL_FILE = """-- description: Top vendors
+-- priority: table
+-- heavy: true
+-- ttl: 60
+-- buckets: day, hour
+-- bucket_keys: vendor
+-- param date_from: datetime grid=minute
+-- param date_to: datetime grid=minute bound=end
+-- param top: int
+SELECT * FROM top_vendors(:date_from$1, :date_to$2) LIMIT :top$3;
+"""
+
+
+def test_header_options_and_parameters_are_parsed():
+	query_def = parse_sql_query("top_vendors", SQL_FILE)
+	assert query_def.description == "Top vendors"
+	assert query_def.priority == "table" and query_def.heavy is True and query_def.ttl == 60.0
+	assert query_def.buckets.grids == ["day", "hour"] and query_def.buckets.keys == ["vendor"]
+	assert [(param.name, param.type, param.grid, param.bound) for param in query_def.parameters] == [
+		("date_from", datetime.datetime, "minute", "start"),
+		("date_to", datetime.datetime, "minute", "end"),
+		("top", int, "second", "start"),
+	]
+	assert "top_vendors($1, $2) LIMIT $3" in query_def.sql
+
+
+def test_parameters_are_ordered_by_position():
+	query_def = parse_sql_query("q", "-- param b: int\n-- param a: str\nSELECT :a$2, :b$1, :b$1")
+	assert [param.name for param in query_def.parameters] == ["b", "a"]
+	assert query_def.sql == "-- param b: int\n-- param a: str\nSELECT $2, $1, $1"
+
+
+def test_overrides_replace_declared_options():
+	query_def = parse_sql_query("q", "-- ttl: 60\nSELECT 1", { "ttl": 5 })
+	assert query_def.ttl == 5
+
+
+@pytest.mark.parametrize("sql_file", [
+	# unknown parameter type
+	"-- param a: decimal\nSELECT :a$1",
+	# unknown parameter option
+	"-- param a: datetime step=minute\nSELECT :a$1",
+	# unknown grid
+	"-- param a: datetime grid=week\nSELECT :a$1",
+	# unknown header option
+	"-- cache: forever\nSELECT 1",
+	# invalid option value
+	"-- heavy: yes\nSELECT 1",
+	# two parameters at the same position
+	"-- param a: int\n-- param b: int\nSELECT :a$1, :b$1",
+	# positions with a gap
+	"-- param a: int\n-- param b: int\nSELECT :a$1, :b$3",
+	# placeholder without a type declaration
+	"-- param a: int\nSELECT :a$1, :b$2",
+	# unknown priority class
+	"-- priority: urgent\nSELECT 1",
+])
+def test_invalid_declarations_are_rejected(sql_file):
+	with pytest.raises(ValueError):
+		parse_sql_query("q", sql_file)
+
+
+def test_declarations_end_at_the_first_statement_line():
+	query_def = parse_sql_query("q", "-- ttl: 60\n\nSELECT 1\n-- cache: forever\n")
+	assert query_def.ttl == 60.0
+
+
+def test_catalog_files_compile():
+	names = [file[:-len(".sql")] for file in os.listdir(QUERIES_DIR) if file.endswith(".sql")]
+	assert names
+	for name in names:
+		with open(os.path.join(QUERIES_DIR, name + ".sql")) as f:
+			assert parse_sql_query(name, f.read()).name == name
+
+
+def test_catalog_registers_and_reloads_changed_files(tmp_path, query_manager):
+	queries_dir = tmp_path / "queries"
+	queries_dir.mkdir()
+	path = queries_dir / "q.sql"
+	path.write_text("-- ttl: 60\nSELECT 1")
+	catalog = QueryCatalog(query_manager, str(queries_dir))
+	assert catalog.load() == ["q"]
+	assert catalog.load() == []
+
+	path.write_text("-- ttl: 30\nSELECT 2")
+	os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))
+	assert catalog.load() == ["q"]
+	assert query_manager.registry.get_query("q").ttl == 30.0
+
+	# a file failing to compile keeps its previous definition
+	path.write_text("-- ttl: soon\nSELECT 3")
+	os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 20))
+	assert catalog.load() == []
+	assert query_manager.registry.get_query("q").ttl == 30.0
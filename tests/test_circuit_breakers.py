@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from dashboard_app._breaker_utils import BREAKER_FAILURE_THRESHOLD, CircuitBreaker, CircuitOpenError
+from dashboard_app._db_utils import QueryDefinition
+
+
+def test_breaker_opens_after_consecutive_failures_and_lets_one_trial_through(query_state):
+	breaker = CircuitBreaker(query_state, "q", failure_threshold=2, reset_timeout=0.05)
+	breaker.record_failure()
+	breaker.check()
+	breaker.record_failure()
+	assert breaker.is_open()
+	with pytest.raises(CircuitOpenError):
+		breaker.check()
+
+	time.sleep(0.06)
+	# half-open: the trial call goes through, the other callers are rejected until it finishes
+	breaker.check()
+	with pytest.raises(CircuitOpenError):
+		breaker.check()
+	breaker.record_success()
+	breaker.check()
+	assert not breaker.is_open()
+
+
+def test_breakers_are_shared_by_all_processes(query_state):
+	CircuitBreaker(query_state, "q", failure_threshold=1).record_failure()
+	with pytest.raises(CircuitOpenError):
+		CircuitBreaker(query_state, "q", failure_threshold=1).check()
+
+
+def test_failing_query_fails_fast_once_its_breaker_is_open(query_manager, database):
+	query_manager.registry.register_query(QueryDefinition("failing", "SELECT 1", []))
+
+	def fail(query_name, parameters):
+		raise ValueError("division by zero")
+
+	database.handler = fail
+	for _ in range(BREAKER_FAILURE_THRESHOLD):
+		with pytest.raises(ValueError):
+			asyncio.run(query_manager.execute_query("failing", { }, None))
+	with pytest.raises(CircuitOpenError):
+		asyncio.run(query_manager.execute_query("failing", { }, None))
+	assert len(database.calls) == BREAKER_FAILURE_THRESHOLD
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from dashboard_app._db_utils import QueryDefinition
+
+QUERY = QueryDefinition("q", "SELECT 1", [])
+
+
+def test_concurrent_callers_share_one_round_trip(query_manager, database):
+	database.delay = 0.1
+
+	async def main():
+		return await asyncio.gather(*[query_manager.execute_query("q", { }, QUERY) for _ in range(5)])
+
+	results = asyncio.run(main())
+	assert len(database.calls) == 1
+	assert all(df["count"].tolist() == [1, 2, 3] for df in results)
+	# every caller gets its own DataFrame
+	results[0]["added"] = 1
+	assert all("added" not in df.columns for df in results[1:])
+
+
+def test_different_parameters_are_not_coalesced(query_manager, database):
+	database.delay = 0.05
+
+	async def main():
+		return await asyncio.gather(query_manager.execute_query("q", { "top": 1 }, QUERY), query_manager.execute_query("q", { "top": 2 }, QUERY))
+
+	asyncio.run(main())
+	assert len(database.calls) == 2
+
+
+def test_failure_is_raised_to_all_waiters(query_manager, database):
+	database.delay = 0.1
+
+	def fail(query_name, parameters):
+		raise ValueError("syntax error")
+
+	database.handler = fail
+
+	async def main():
+		return await asyncio.gather(*[query_manager.execute_query("q", { }, QUERY) for _ in range(3)], return_exceptions=True)
+
+	results = asyncio.run(main())
+	assert len(database.calls) == 1
+	assert all(isinstance(result, ValueError) for result in results)
+	assert query_manager._in_flight == { }
+
+
+def test_waiters_take_over_when_the_executing_caller_is_cancelled(query_manager, database):
+	database.delay = 0.2
+
+	async def main():
+		owner = asyncio.create_task(query_manager.execute_query("q", { }, QUERY))
+		await asyncio.sleep(0.05)
+		waiters = [asyncio.create_task(query_manager.execute_query("q", { }, QUERY)) for _ in range(3)]
+		await asyncio.sleep(0.05)
+		owner.cancel()
+		with pytest.raises(asyncio.CancelledError):
+			await owner
+		return await asyncio.wait_for(asyncio.gather(*waiters), 2)
+
+	results = asyncio.run(main())
+	# one of the waiters executes the query again, the others await it
+	assert len(database.calls) == 2
+	assert all(df["count"].tolist() == [1, 2, 3] for df in results)
+
+
+def test_cancelled_waiter_does_not_cancel_the_query(query_manager, database):
+	database.delay = 0.2
+
+	async def main():
+		owner = asyncio.create_task(query_manager.execute_query("q", { }, QUERY))
+		await asyncio.sleep(0.05)
+		waiter = asyncio.create_task(query_manager.execute_query("q", { }, QUERY))
+		await asyncio.sleep(0.05)
+		waiter.cancel()
+		with pytest.raises(asyncio.CancelledError):
+			await waiter
+		return await asyncio.wait_for(owner, 2)
+
+	df = asyncio.run(main())
+	assert len(database.calls) == 1
+	assert df["count"].tolist() == [1, 2, 3]
+	assert query_manager._in_flight == { }
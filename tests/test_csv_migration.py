@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+import dashboard_app._db_utils as db_utils
+from dashboard_app._db_utils import CacheManifest, DataVersion, QueryDefinition, QueryParameter
+
+QUERY = QueryDefinition("total", "SELECT 1", [
+	QueryParameter("date_from", datetime.datetime, grid="minute"),
+	QueryParameter("date_to", datetime.datetime, grid="minute", bound="end"),
+], default_data="FSCacheDefault")
+DAYS = [(datetime.datetime(2024, 7, day, 6), datetime.datetime(2024, 7, day + 1, 5, 59, 59)) for day in (4, 5)]
+
+
+@pytest.fixture
+def legacy_cache(query_manager):
+	"""Legacy CSV cache of the two days and of an unknown execution, written before the manifest existed"""
+	query_manager.registry.register_query(QUERY)
+	paths = []
+	for i, (date_from, date_to) in enumerate([*DAYS, (datetime.datetime(2024, 7, 1), datetime.datetime(2024, 7, 2))]):
+		legacy_key = query_manager.get_legacy_query_key("total", { "date_from": date_from, "date_to": date_to })
+		path = os.path.join(db_utils.CACHE_QUERIES_DIR, f"{legacy_key}.csv")
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		pd.DataFrame({ "count": [i], "day": [date_from.isoformat()] }).to_csv(path, index=False)
+		paths.append(path)
+	return paths
+
+
+def test_legacy_entries_are_rekeyed_and_survive_the_purge(query_manager, legacy_cache):
+	executions = [("total", { "date_from": date_from, "date_to": date_to }) for date_from, date_to in DAYS]
+	assert asyncio.run(query_manager.migrate_csv_cache(executions)) == 2
+	assert not any(os.path.exists(path) for path in legacy_cache)
+	for i, (_, parameters) in enumerate(executions):
+		query_key = query_manager.get_query_key("total", QUERY.canonicalize(parameters))
+		df = query_manager.cache_format.read(query_manager.get_cache_path(query_key))
+		assert df["count"].tolist() == [i]
+		assert df["day"].dtype.kind == "M"
+	# the next process keeps the migrated entries, the unknown execution was purged with the previous key version
+	manifest = CacheManifest(db_utils.CACHE_QUERIES_DIR, key_version=db_utils.CACHE_KEY_VERSION)
+	assert len(manifest.get_keys("total")) == 2
+	assert not os.path.exists(f"{db_utils.CACHE_QUERIES_DIR}-migration")
+
+
+def test_migrated_entries_are_served_from_the_cache(query_manager, database, legacy_cache):
+	data_version = DataVersion("42", datetime.datetime(2024, 7, 10))
+
+	async def get_data_version():
+		return data_version
+
+	query_manager.get_data_version = get_data_version
+	date_from, date_to = DAYS[0]
+	written_at = os.path.getmtime(legacy_cache[0])
+	asyncio.run(query_manager.migrate_csv_cache([("total", { "date_from": date_from, "date_to": date_to })]))
+	query_key = query_manager.get_query_key("total", QUERY.canonicalize({ "date_from": date_from, "date_to": date_to }))
+	metadata = query_manager.cache_format.read_metadata(query_manager.get_cache_path(query_key))
+	assert metadata["data_version"] == "42"
+	assert float(metadata["cached_at"]) == written_at
+	# the range ended before the watermark, so the entry stays valid when the data version changes
+	data_version = DataVersion("43", datetime.datetime(2024, 7, 10))
+	df = asyncio.run(query_manager.execute_query("total", { "date_from": date_from, "date_to": date_to }, None))
+	assert df["count"].tolist() == [0]
+	assert database.calls == []
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dashboard_app._decode_utils import OID_INT8, OID_NUMERIC, OID_TIMESTAMPTZ, records_to_dataframe
+
+
+def attribute(name: str, oid: int):
+	"""Statement attribute like the ones of asyncpg (name and type OID)"""
+	return SimpleNamespace(name=name, type=SimpleNamespace(oid=oid))
+
+
+def test_numeric_columns_have_the_same_dtype_in_every_chunk():
+	attributes = [attribute("amount", OID_NUMERIC)]
+	integral = records_to_dataframe([(Decimal("100"),), (Decimal("250"),)], attributes)
+	fractional = records_to_dataframe([(Decimal("12.5"),), (None,)], attributes)
+	assert integral["amount"].dtype == fractional["amount"].dtype == np.float64
+	assert integral["amount"].tolist() == [100.0, 250.0]
+	assert fractional["amount"].iloc[0] == 12.5
+	assert np.isnan(fractional["amount"].iloc[1])
+	# the streamed chunks are written to one Arrow file, which needs one schema
+	schemas = { pa.Schema.from_pandas(df, preserve_index=False) for df in (integral, fractional) }
+	assert len(schemas) == 1
+
+
+def test_columns_are_decoded_by_their_type():
+	attributes = [attribute("count", OID_INT8), attribute("at", OID_TIMESTAMPTZ)]
+	at = datetime.datetime(2024, 7, 4, 8, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+	df = records_to_dataframe([(1, at), (None, None)], attributes)
+	assert df["count"].dtype == "Int64"
+	assert df["at"].iloc[0] == pd.Timestamp("2024-07-04 06:00", tz="UTC")
+	assert df["at"].isna().iloc[1]
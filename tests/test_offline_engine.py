@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+
+import pandas as pd
+import pytest
+
+from dashboard_app._db_utils import BucketSpec, QueryDefinition, QueryParameter
+
+duckdb_utils = pytest.importorskip("dashboard_app._duckdb_utils")
+
+HOURS = { "2024-07-04T06": 10, "2024-07-04T07": 20, "2024-07-04T08": 40 }
+
+
+@pytest.fixture
+def offline(query_manager, tmp_path):
+	"""Offline engine over hourly snapshots of a function, returns the executed SQL arguments"""
+	for hour, liters in HOURS.items():
+		partition = tmp_path / "snapshots" / "beverage_total" / f"snapshot_hour={hour}"
+		partition.mkdir(parents=True)
+		pd.DataFrame({ "bucket_start": [datetime.datetime.strptime(hour, "%Y-%m-%dT%H")], "liters": [liters] }).to_parquet(partition / "part.parquet")
+	query_manager.offline_engine = duckdb_utils.OfflineEngine(str(tmp_path / "snapshots"))
+	query_manager.registry.register_query(QueryDefinition("total", "SELECT SUM(liters) AS liters FROM beverage_total($1, $2)", [
+		QueryParameter("date_from", datetime.datetime, grid="minute"),
+		QueryParameter("date_to", datetime.datetime, grid="minute", bound="end"),
+	], default_data="FSCacheDefault", buckets=BucketSpec()))
+	executed = []
+	execute = query_manager.offline_engine.execute
+
+	async def record(sql, args):
+		executed.append(args)
+		return await execute(sql, args)
+
+	query_manager.offline_engine.execute = record
+	return executed
+
+
+def test_offline_ranges_are_widened_to_whole_hours(query_manager, offline):
+	parameters = { "date_from": datetime.datetime(2024, 7, 4, 6, 30), "date_to": datetime.datetime(2024, 7, 4, 7, 14, 59) }
+	df = asyncio.run(query_manager.execute_query("total", parameters, None))
+	# the snapshots hold whole hours, the result is the one of 06:00 - 07:59:59
+	assert df["liters"].iloc[0] == 30
+	assert offline == [[datetime.datetime(2024, 7, 4, 6), datetime.datetime(2024, 7, 4, 7, 59, 59)]]
+	query_def = query_manager.registry.get_query("total")
+	assert query_manager.memory_cache.get(query_manager.get_query_key("total", query_def.canonicalize(parameters))) is None
+	assert query_manager.memory_cache.get(query_manager.get_query_key("total", query_manager.get_offline_parameters(query_def, query_def.canonicalize(parameters)))) is not None
+
+	# another range within the same hours shares the widened result
+	df = asyncio.run(query_manager.execute_query("total", { "date_from": datetime.datetime(2024, 7, 4, 6, 45), "date_to": datetime.datetime(2024, 7, 4, 7, 0) }, None))
+	assert df["liters"].iloc[0] == 30
+	assert len(offline) == 1
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import asyncio
+
+from dashboard_app._db_utils import QueryDefinition
+
+
+class PreparingConnection:
+	"""Pool connection recording the statements it prepares, failing on the broken ones"""
+
+	def __init__(self):
+		self.prepared = []
+
+	async def prepare_cached(self, sql: str, query_name: str):
+		if "broken" in sql:
+			raise ValueError("syntax error")
+		self.prepared.append(query_name)
+
+
+def test_registered_queries_are_prepared_on_connect(query_manager):
+	query_manager.registry.register_query(QueryDefinition("broken", "SELECT broken", []))
+	query_manager.registry.register_query(QueryDefinition("last", "SELECT 1", []))
+	conn = PreparingConnection()
+	asyncio.run(query_manager._prepare_queries(conn))
+	# a query failing to prepare does not fail the connection, it is prepared again on first use
+	assert conn.prepared == [query_def.name for query_def in query_manager.registry.get_queries() if query_def.name != "broken"]
+	assert conn.prepared[-1] == "last"
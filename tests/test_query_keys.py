@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import datetime
+import os
+
+import pytest
+
+from dashboard_app._catalog_utils import QUERIES_DIR, parse_sql_query
+from dashboard_app._db_utils import CACHE_KEY_VERSION, QueryDefinition, QueryParameter, serialize_parameter
+
+
+def test_query_key_format_is_stable(query_manager):
+	# a failing assertion means the cache keys changed format: bump CACHE_KEY_VERSION and update the expected keys
+	assert CACHE_KEY_VERSION == "2"
+	parameters = { "date_from": datetime.datetime(2024, 7, 4, 6), "granularity_minutes": 15 }
+	assert query_manager.get_query_key("time_series", parameters) == "2075f84644da1f6e9e2b573b81c4b51b/time_series"
+
+
+def test_query_key_ignores_parameter_order(query_manager):
+	assert query_manager.get_query_key("q", { "a": 1, "b": "x" }) == query_manager.get_query_key("q", { "b": "x", "a": 1 })
+
+
+def test_serialized_parameters_keep_their_type():
+	values = [1, 1.0, True, "1", None, datetime.date(2024, 7, 4), datetime.datetime(2024, 7, 4)]
+	assert len({ serialize_parameter(value) for value in values }) == len(values)
+
+
+def test_same_instant_in_any_time_zone_has_the_same_key(query_manager):
+	query_def = QueryDefinition("q", "SELECT 1", [QueryParameter("date_from", datetime.datetime)])
+	naive_utc = datetime.datetime(2024, 7, 4, 6)
+	prague = datetime.datetime(2024, 7, 4, 8, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+	keys = { query_manager.get_query_key("q", query_def.canonicalize({ "date_from": value })) for value in (naive_utc, prague) }
+	assert len(keys) == 1
+
+
+def test_datetimes_snap_to_the_parameter_grid():
+	date_from = QueryParameter("date_from", datetime.datetime, grid="minute")
+	date_to = QueryParameter("date_to", datetime.datetime, grid="minute", bound="end")
+	assert date_from.canonicalize(datetime.datetime(2024, 7, 4, 6, 0, 42, 123)) == datetime.datetime(2024, 7, 4, 6, 0)
+	assert date_to.canonicalize(datetime.datetime(2024, 7, 5, 5, 59, 1)) == datetime.datetime(2024, 7, 5, 5, 59, 59)
+
+
+def test_numbers_canonicalize_to_the_declared_type():
+	assert QueryParameter("n", int).canonicalize(15.0) == 15
+	assert isinstance(QueryParameter("n", int).canonicalize(15.0), int)
+	assert isinstance(QueryParameter("x", float).canonicalize(2), float)
+
+
+def test_unknown_grid_is_rejected():
+	with pytest.raises(ValueError):
+		QueryParameter("date_from", datetime.datetime, grid="week")
+
+
+def test_catalog_date_ranges_snap_to_minutes():
+	# coarser grids would silently widen the ranges the dashboard shows
+	for file in os.listdir(QUERIES_DIR):
+		if not file.endswith(".sql"):
+			continue
+		with open(os.path.join(QUERIES_DIR, file)) as f:
+			query_def = parse_sql_query(file[:-len(".sql")], f.read())
+		for param in query_def.parameters:
+			if param.type is datetime.datetime:
+				assert param.grid in ("second", "minute"), f"{query_def.name}.{param.name} snaps to {param.grid}"
+
+
+def test_effective_range_uses_the_coarsest_grid(query_manager):
+	query_manager.registry.register_query(QueryDefinition("q", "SELECT 1", [
+		QueryParameter("date_from", datetime.datetime, grid="minute"),
+		QueryParameter("date_to", datetime.datetime, grid="minute", bound="end"),
+	]))
+	assert query_manager.get_effective_range(datetime.datetime(2024, 7, 4, 6, 0, 30), datetime.datetime(2024, 7, 5, 5, 59)) == (
+		datetime.datetime(2024, 7, 4, 6, 0), datetime.datetime(2024, 7, 5, 5, 59, 59)
+	)
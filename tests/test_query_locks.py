@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+
+from dashboard_app._cache_utils import QueryLocks
+
+
+def test_lock_excludes_tasks_of_the_same_process(tmp_path):
+	locks = QueryLocks(str(tmp_path))
+	inside = []
+
+	async def hold(name: str):
+		async with locks.hold("q/key"):
+			inside.append(name)
+			assert len(inside) == 1
+			await asyncio.sleep(0.05)
+			inside.remove(name)
+
+	async def main():
+		await asyncio.gather(*[hold(str(i)) for i in range(3)])
+
+	asyncio.run(main())
+
+
+def _hold_lock(directory: str, key: str, held, release):
+	async def main():
+		async with QueryLocks(directory).hold(key):
+			held.set()
+			release.wait(5)
+
+	asyncio.run(main())
+
+
+def test_lock_excludes_other_processes_and_is_released_on_exit(tmp_path):
+	context = multiprocessing.get_context("fork")
+	held, release = context.Event(), context.Event()
+	process = context.Process(target=_hold_lock, args=(str(tmp_path), "q/key", held, release))
+	process.start()
+	assert held.wait(5)
+
+	async def acquire(timeout: float) -> bool:
+		try:
+			async with asyncio.timeout(timeout):
+				async with QueryLocks(str(tmp_path)).hold("q/key"):
+					return True
+		except TimeoutError:
+			return False
+
+	assert not asyncio.run(acquire(0.2))
+	# the operating system releases the lock of a killed process
+	process.kill()
+	process.join()
+	assert asyncio.run(acquire(1))
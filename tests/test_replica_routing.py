@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import datetime
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import dashboard_app._db_utils as db_utils
+from dashboard_app._breaker_utils import BREAKER_FAILURE_THRESHOLD
+from dashboard_app._db_utils import DEFAULT_MAX_REPLICA_LAG, HostHealth, QueryDefinition, QueryParameter
+from dashboard_app._decode_utils import OID_INT8
+
+
+class FakeConnection:
+	"""Pool connection seeing the data version of its host"""
+
+	def __init__(self, version: str):
+		self.version = version
+
+	async def fetchrow(self, sql: str):
+		return { "version": self.version, "max_timestamp": None }
+
+	async def prepare_cached(self, sql: str, query_name: str):
+		async def fetch(*args):
+			return [(1,)]
+
+		return SimpleNamespace(fetch=fetch, get_attributes=lambda: [SimpleNamespace(name="count", type=SimpleNamespace(oid=OID_INT8))])
+
+
+class FakePool:
+	def __init__(self, version: str):
+		self.version = version
+
+	@contextlib.asynccontextmanager
+	async def acquire(self):
+		yield FakeConnection(self.version)
+
+
+@pytest.fixture
+def replicated(query_manager):
+	"""Query manager with a primary and two replicas, all with a pool"""
+	manager = db_utils.QueryManager([
+		{ "host": "primary", "port": 5432, "role": "primary" },
+		{ "host": "replica-1", "port": 5432, "role": "replica" },
+		{ "host": "replica-2", "port": 5432, "role": "replica" },
+	], shared_cache_bytes=0)
+	for host in manager.hosts:
+		host.pool = FakePool(f"{host.config['host']}-version")
+	return manager
+
+
+def set_lag(manager, name: str, lag: float, healthy: bool = True):
+	host = next(host for host in manager.hosts if host.config["host"] == name)
+	manager._set_host_health(host, HostHealth(healthy=healthy, lag=lag, checked_at=time.time()))
+	return host
+
+
+def test_read_only_queries_go_to_the_least_busy_replica_within_the_lag(replicated):
+	query_def = QueryDefinition("q", "SELECT 1", [])
+	set_lag(replicated, "replica-1", 0).outstanding = 3
+	set_lag(replicated, "replica-2", 0)
+	assert replicated._select_host(query_def).config["host"] == "replica-2"
+
+	set_lag(replicated, "replica-2", DEFAULT_MAX_REPLICA_LAG + 1)
+	assert replicated._select_host(query_def).config["host"] == "replica-1"
+	# a query tolerating more lag can still use the lagging replica
+	tolerant = QueryDefinition("q", "SELECT 1", [], max_replica_lag=DEFAULT_MAX_REPLICA_LAG * 2)
+	assert replicated._select_host(tolerant).config["host"] == "replica-2"
+
+
+def test_queries_fail_over_to_the_primary(replicated):
+	set_lag(replicated, "replica-1", 0, healthy=False)
+	set_lag(replicated, "replica-2", 0)
+	# the other replica is cut off by its host breaker
+	for _ in range(BREAKER_FAILURE_THRESHOLD):
+		replicated.get_breaker("host/replica-2:5432").record_failure()
+	assert replicated._select_host(QueryDefinition("q", "SELECT 1", [])).role == "primary"
+	# queries that are not read-only never go to a replica
+	set_lag(replicated, "replica-1", 0)
+	assert replicated._select_host(QueryDefinition("q", "SELECT 1", [], read_only=False)).role == "primary"
+
+
+def test_replica_results_are_stamped_with_the_replica_data_version(replicated):
+	query_def = QueryDefinition("q", "SELECT 1", [QueryParameter("date_to", datetime.datetime)])
+	replicated.registry.register_query(query_def)
+	parameters = { "date_to": datetime.datetime(2024, 7, 5, 5, 59, 59) }
+	primary_metadata = replicated.get_cache_metadata(parameters, db_utils.DataVersion("primary-version"))
+	replica = next(host for host in replicated.hosts if host.role == "replica")
+
+	df, metadata = asyncio.run(replicated._fetch_from_host(replica, "q", query_def, parameters, "key/q", primary_metadata))
+	assert df["count"].tolist() == [1]
+	assert metadata["data_version"] == "replica-1-version"
+	df, metadata = asyncio.run(replicated._fetch_from_host(replicated.primary, "q", query_def, parameters, "key/q", primary_metadata))
+	assert metadata["data_version"] == "primary-version"
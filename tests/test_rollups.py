@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import time
+
+import pandas as pd
+import pytest
+
+import dashboard_app._mview_utils as mview_utils
+from dashboard_app._db_utils import BucketSpec, QueryDefinition, QueryParameter
+from dashboard_app._mview_utils import MaterializedViewManager, MaterializedViewState
+
+HOUR = datetime.timedelta(hours=1)
+WATERMARK = datetime.datetime(2024, 7, 5, 12)
+
+
+@pytest.fixture
+def materialized(query_manager):
+	"""Materialized query with a rollup refreshed up to the watermark, whose hours are final until an hour before it"""
+	query_def = QueryDefinition("sales", "SELECT count(*) FROM sales($1, $2)", [
+		QueryParameter("date_from", datetime.datetime, grid="minute"),
+		QueryParameter("date_to", datetime.datetime, grid="minute", bound="end"),
+	], default_data="FSCacheDefault", buckets=BucketSpec(), materialized=True)
+	query_manager.registry.register_query(query_def)
+	views = MaterializedViewManager(query_manager)
+	state = MaterializedViewState(time.time(), 1.0, 36, WATERMARK, datetime.datetime(2024, 7, 4), WATERMARK - HOUR)
+	# the state of a refresh (the query state of the test)
+	mview_utils.query_state.set(f"mview/{views.get_view_name(query_def)}", state)
+	return views
+
+
+def test_covered_range_is_the_whole_final_hours(materialized, query_manager):
+	query_def = query_manager.registry.get_query("sales")
+	assert materialized.get_covered_range(query_def, datetime.datetime(2024, 7, 4, 6, 30), datetime.datetime(2024, 7, 5, 11, 59, 59)) == (
+		datetime.datetime(2024, 7, 4, 7), datetime.datetime(2024, 7, 5, 11)
+	)
+	# a range within an hour covers no whole hour
+	assert materialized.get_covered_range(query_def, datetime.datetime(2024, 7, 4, 6, 30), datetime.datetime(2024, 7, 4, 7, 29, 59)) is None
+
+
+def test_final_hours_are_summed_from_the_rollup_and_the_edges_from_the_raw_data(materialized, query_manager, database):
+	def handler(query_name, parameters):
+		if query_name == "sales@rollup":
+			hours = pd.date_range(parameters["rollup_from"], parameters["rollup_to"] - HOUR, freq="h")
+			return pd.DataFrame({ "bucket_start": hours, "bucket_row": 1, "count": 1 })
+		return pd.DataFrame({ "count": [1] })
+
+	database.handler = handler
+	df = asyncio.run(query_manager.execute_query("sales", { "date_from": datetime.datetime(2024, 7, 4, 6, 30), "date_to": datetime.datetime(2024, 7, 5, 11, 59, 59) }, None))
+	# 28 rollup hours and one row for each edge
+	assert df["count"].tolist() == [30]
+	assert sorted((name, params.get("rollup_from", params.get("date_from"))) for _, name, params in database.calls) == [
+		("sales", datetime.datetime(2024, 7, 4, 6, 30)),
+		("sales", datetime.datetime(2024, 7, 5, 11)),
+		("sales@rollup", datetime.datetime(2024, 7, 4, 7)),
+	]
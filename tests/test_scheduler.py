@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from dashboard_app._scheduler_utils import PriorityClass, QueryScheduler
+
+CLASSES = { "kpi": PriorityClass(rank=0, concurrency=1), "chart": PriorityClass(rank=1, concurrency=1) }
+
+
+async def run_query(scheduler: QueryScheduler, order: list, name: str, priority: str, session: str = "", heavy: bool = False, hold: float = 0.01):
+	async with scheduler.slot(priority, heavy, session):
+		order.append(name)
+		await asyncio.sleep(hold)
+
+
+async def queue_behind(scheduler: QueryScheduler, order: list, queries: list) -> None:
+	"""Start a blocking query, queue the others while it runs and wait for all of them"""
+	first = asyncio.create_task(run_query(scheduler, order, "first", "chart", hold=0.1))
+	await asyncio.sleep(0.02)
+	tasks = []
+	for name, priority, session in queries:
+		tasks.append(asyncio.create_task(run_query(scheduler, order, name, priority, session)))
+		await asyncio.sleep(0.001)
+	await asyncio.gather(first, *tasks)
+
+
+def test_higher_priority_classes_are_admitted_first(query_state):
+	scheduler = QueryScheduler(query_state, CLASSES, max_concurrency=1)
+	order = []
+	asyncio.run(queue_behind(scheduler, order, [("chart", "chart", ""), ("kpi", "kpi", "")]))
+	assert order == ["first", "kpi", "chart"]
+
+
+def test_sessions_are_served_round_robin(query_state):
+	scheduler = QueryScheduler(query_state, { "chart": PriorityClass(rank=0, concurrency=2) }, max_concurrency=2)
+	order = []
+
+	async def main():
+		# session a keeps one query running, so the query of session b goes ahead of its second one
+		running = asyncio.create_task(run_query(scheduler, order, "a1", "chart", "a", hold=0.2))
+		await asyncio.sleep(0.02)
+		await queue_behind(scheduler, order, [("a2", "chart", "a"), ("b1", "chart", "b")])
+		await running
+
+	asyncio.run(main())
+	assert order.index("b1") < order.index("a2")
+
+
+def test_heavy_queries_are_capped_across_processes(query_state):
+	# two schedulers sharing the store stand for two worker processes
+	schedulers = [QueryScheduler(query_state, CLASSES, max_heavy=1) for _ in range(2)]
+	order = []
+
+	async def main():
+		await asyncio.gather(
+			run_query(schedulers[0], order, "a", "kpi", heavy=True, hold=0.2),
+			run_query(schedulers[1], order, "b", "chart", heavy=True),
+			run_query(schedulers[1], order, "c", "kpi"),
+		)
+
+	asyncio.run(main())
+	# the heavy query of the other process waits for the shared heavy slot, the light one does not
+	assert order == ["a", "c", "b"]
+
+
+def test_cancelled_queries_give_back_their_slots(query_state):
+	scheduler = QueryScheduler(query_state, CLASSES, max_concurrency=1)
+	order = []
+
+	async def main():
+		running = asyncio.create_task(run_query(scheduler, order, "running", "kpi", hold=10))
+		waiting = asyncio.create_task(run_query(scheduler, order, "waiting", "kpi"))
+		await asyncio.sleep(0.05)
+		running.cancel()
+		waiting.cancel()
+		await asyncio.gather(running, waiting, return_exceptions=True)
+		await asyncio.wait_for(run_query(scheduler, order, "next", "kpi"), timeout=1)
+
+	asyncio.run(main())
+	assert order == ["running", "next"]
+	# the shared slots are given back in order on the thread of the scheduler
+	scheduler._get_executor().submit(lambda: None).result()
+	assert scheduler._get_shared() == { }
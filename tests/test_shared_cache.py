@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import gc
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from dashboard_app._cache_utils import SHARED_MEMORY_DIR, SharedMemoryCache
+
+pytestmark = pytest.mark.skipif(not os.path.isdir(SHARED_MEMORY_DIR), reason="needs a shared memory filesystem")
+
+
+@pytest.fixture
+def shared_cache(tmp_path):
+	shared_cache = SharedMemoryCache(str(tmp_path / "shared-cache.sqlite"), max_bytes=64 * 1024 * 1024)
+	yield shared_cache
+	# unlink the segments of the test
+	shared_cache.clear()
+
+
+def result(rows: int = 1000) -> pd.DataFrame:
+	return pd.DataFrame({ "id": range(rows), "amount": [i * 0.5 for i in range(rows)], "vendor": [f"v{i % 7}" for i in range(rows)] })
+
+
+def _read_in_child(shared_cache: SharedMemoryCache, key: str, queue):
+	df = shared_cache.get(key)
+	queue.put(None if df is None else df.to_dict("list"))
+
+
+def _put_in_child(shared_cache: SharedMemoryCache, key: str):
+	shared_cache.put(key, result(10))
+
+
+def test_result_written_by_one_process_is_read_by_another(shared_cache):
+	shared_cache.put("k/q", result(), metadata={ "data_version": "42" })
+	context = multiprocessing.get_context("fork")
+	queue = context.Queue()
+	process = context.Process(target=_read_in_child, args=(shared_cache, "k/q", queue))
+	process.start()
+	assert queue.get(timeout=5) == result().to_dict("list")
+	process.join()
+
+	process = context.Process(target=_put_in_child, args=(shared_cache, "child/q"))
+	process.start()
+	process.join()
+	assert process.exitcode == 0
+	assert shared_cache.get("child/q").equals(result(10))
+	assert shared_cache.get_entry("k/q").metadata == { "data_version": "42" }
+
+
+def test_misses_and_expired_entries(shared_cache):
+	assert shared_cache.get("missing/q") is None
+	shared_cache.put("k/q", result(), ttl=0.05)
+	assert shared_cache.get("k/q") is not None
+	time.sleep(0.1)
+	assert shared_cache.get("k/q") is None
+
+
+def test_evicted_segment_is_kept_while_a_reader_holds_it(shared_cache):
+	shared_cache.put("k/q", result())
+	df = shared_cache.get("k/q")
+	shared_cache.invalidate("k/q")
+	assert shared_cache.get("k/q") is None
+	stats = shared_cache.get_stats()
+	assert stats["entries"] == 0 and stats["held"] == 1
+	# the view is still readable after the eviction
+	assert df["id"].sum() == sum(range(1000))
+	del df
+	gc.collect()
+	assert shared_cache.get_stats()["held"] == 0
+
+
+def _hold_in_child(shared_cache: SharedMemoryCache, key: str):
+	df = shared_cache.get(key)
+	# record the hit, then exit without releasing the view
+	shared_cache.get_stats()
+	os._exit(0 if df is not None else 1)
+
+
+def test_holders_of_dead_processes_are_dropped(shared_cache):
+	shared_cache.put("k/q", result())
+	context = multiprocessing.get_context("fork")
+	process = context.Process(target=_hold_in_child, args=(shared_cache, "k/q"))
+	process.start()
+	process.join()
+	assert process.exitcode == 0
+	assert shared_cache._get_conn().execute("SELECT COUNT(*) FROM holders").fetchone()[0] == 1
+	shared_cache.invalidate("k/q")
+	assert shared_cache.get_stats()["held"] == 0
+
+
+def test_least_recently_used_results_are_evicted_over_the_budget(shared_cache):
+	shared_cache.put("a/q", result())
+	size = shared_cache.get_stats()["size"]
+	shared_cache.max_bytes = size * 5 // 2
+	shared_cache.put("b/q", result())
+	time.sleep(0.01)
+	assert shared_cache.get("a/q") is not None
+	shared_cache.put("c/q", result())
+	assert shared_cache.get("b/q") is None
+	assert shared_cache.get("a/q") is not None and shared_cache.get("c/q") is not None
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+
+import pandas as pd
+import pytest
+
+from dashboard_app._db_utils import DataVersion, QueryDefinition, QueryParameter
+
+PARAMETERS = { "date_from": datetime.datetime(2024, 7, 4, 6), "date_to": datetime.datetime(2024, 7, 5, 5, 59, 59) }
+
+
+@pytest.fixture
+def versioned(query_manager, database):
+	"""Database answering with the current data version, which the test changes"""
+	state = { "version": "1" }
+
+	async def get_data_version():
+		# no watermark, so the range stays on the live tail (never final)
+		return DataVersion(state["version"])
+
+	query_manager.get_data_version = get_data_version
+	database.handler = lambda query_name, parameters: pd.DataFrame({ "version": [state["version"]] })
+	return state
+
+
+def register(query_manager, max_staleness: float):
+	query_manager.registry.register_query(QueryDefinition("live", "SELECT 1", [
+		QueryParameter("date_from", datetime.datetime, grid="minute"),
+		QueryParameter("date_to", datetime.datetime, grid="minute", bound="end"),
+	], default_data="FSCacheDefault", fresh_for=60, max_staleness=max_staleness))
+
+
+def test_stale_result_is_returned_and_refreshed_in_the_background(query_manager, database, versioned):
+	register(query_manager, max_staleness=3600)
+
+	async def main():
+		assert (await query_manager.execute_query("live", PARAMETERS, None))["version"].tolist() == ["1"]
+		versioned["version"] = "2"
+		# the previous result is returned at once, the refresh runs after it
+		assert (await query_manager.execute_query("live", PARAMETERS, None))["version"].tolist() == ["1"]
+		assert len(database.calls) == 1
+		await asyncio.gather(*query_manager._revalidations)
+		assert len(database.calls) == 2
+		assert (await query_manager.execute_query("live", PARAMETERS, None))["version"].tolist() == ["2"]
+
+	asyncio.run(main())
+	assert len(database.calls) == 2
+
+
+def test_result_older_than_the_max_staleness_is_refreshed_blocking(query_manager, database, versioned):
+	register(query_manager, max_staleness=0)
+
+	async def main():
+		await query_manager.execute_query("live", PARAMETERS, None)
+		versioned["version"] = "2"
+		assert (await query_manager.execute_query("live", PARAMETERS, None))["version"].tolist() == ["2"]
+		assert not query_manager._revalidations
+
+	asyncio.run(main())
+	assert len(database.calls) == 2
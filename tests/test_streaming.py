@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from dashboard_app._cache_utils import get_cache_format
+from dashboard_app._db_utils import QueryDefinition
+from dashboard_app._decode_utils import OID_INT8, OID_NUMERIC
+
+
+# ---- Chunk writers ----
+@pytest.mark.parametrize("format_name", ["parquet", "arrow"])
+def test_later_chunks_widen_the_schema(tmp_path, format_name):
+	cache_format = get_cache_format(format_name)
+	directory = tmp_path / "cached-queries"
+	directory.mkdir()
+	path = str(directory / f"result.{cache_format.extension}")
+	with cache_format.open_writer_atomic(path, { "data_version": "42" }) as writer:
+		writer.write(pd.DataFrame({ "amount": [1, 2], "note": [None, None], "code": [1, 2] }))
+		writer.write(pd.DataFrame({ "amount": [2.5], "note": ["late"], "code": ["A"] }))
+		writer.write(pd.DataFrame({ "amount": [3], "note": [None], "code": [3] }))
+	df = cache_format.read(path)
+	assert df["amount"].tolist() == [1.0, 2.0, 2.5, 3.0]
+	assert df["note"].tolist()[2] == "late"
+	# incompatible types are kept as strings
+	assert df["code"].tolist() == ["1", "2", "A", "3"]
+	assert cache_format.read_metadata(path)["data_version"] == "42"
+	assert sorted(file.name for file in directory.iterdir()) == [f"result.{cache_format.extension}"]
+
+
+# ---- Streamed queries ----
+class FakeCursor:
+	def __init__(self, records):
+		self.records = records
+
+	async def fetch(self, n: int):
+		records, self.records = self.records[:n], self.records[n:]
+		return records
+
+
+class FakeStatement:
+	"""Prepared statement streaming its records through a cursor, integral amounts first"""
+
+	def __init__(self, records):
+		self.records = records
+
+	def get_attributes(self):
+		return [
+			SimpleNamespace(name="id", type=SimpleNamespace(oid=OID_INT8)),
+			SimpleNamespace(name="amount", type=SimpleNamespace(oid=OID_NUMERIC)),
+		]
+
+	async def cursor(self, *args):
+		return FakeCursor(list(self.records))
+
+
+class FakeConnection:
+	def transaction(self, readonly: bool = False):
+		@contextlib.asynccontextmanager
+		async def transaction():
+			yield
+
+		return transaction()
+
+
+@pytest.fixture
+def streamed(query_manager):
+	"""Streaming query whose round-trips go through the chunked path, returns the recorded round-trips"""
+	query_manager.registry.register_query(QueryDefinition("rows", "SELECT id, amount FROM rows", [], default_data="FSCacheDefault", streaming=True, chunk_size=2))
+	records = [(i, Decimal(i) if i < 3 else Decimal(i) / 4) for i in range(5)]
+	calls = []
+
+	async def fetch(host, query_name, query_def, parameters, query_key, metadata):
+		calls.append(query_name)
+		df = await query_manager._fetch_streaming(FakeConnection(), FakeStatement(records), query_name, query_key, query_def, [], metadata)
+		return df, metadata
+
+	query_manager._fetch_from_host = fetch
+	return calls
+
+
+def test_streamed_result_is_served_from_the_file_cache_only(query_manager, streamed):
+	df = asyncio.run(query_manager.execute_query("rows", { }, None))
+	assert df["id"].tolist() == [0, 1, 2, 3, 4]
+	assert df["amount"].tolist() == [0.0, 1.0, 2.0, 0.75, 1.0]
+	query_key = query_manager.get_query_key("rows", { })
+	# the unbounded result is not kept in the memory caches
+	assert query_manager.memory_cache.get(query_key) is None
+	assert query_manager.cache_manifest.get_keys("rows") == [query_key]
+
+	df = asyncio.run(query_manager.execute_query("rows", { }, None))
+	assert len(df) == 5
+	assert streamed == ["rows"]
+	assert query_manager.memory_cache.get(query_key) is None
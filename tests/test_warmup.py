@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+
+from dashboard_app._db_utils import QueryDefinition, QueryParameter
+from dashboard_app._warmup_utils import CacheWarmer
+
+PRESETS = {
+	"1": ("2024-07-04 06:00:00", "2024-07-05 05:59:59"),
+	"up-to-1": ("2024-07-04 06:00:00", "2024-07-05 05:59:59"),
+	"2": ("2024-07-05 06:00:00", "2024-07-06 05:59:59"),
+}
+
+
+def test_warm_up_resumes_where_it_stopped(query_manager, database):
+	query_manager.registry.register_query(QueryDefinition("total", "SELECT 1", [
+		QueryParameter("date_from", datetime.datetime, grid="minute"),
+		QueryParameter("date_to", datetime.datetime, grid="minute", bound="end"),
+	], default_data="FSCacheDefault"))
+	warmer = CacheWarmer(query_manager, PRESETS)
+	# the presets sharing a range are warmed once
+	assert len(warmer.get_tasks()) == 2
+
+	fail_on = { datetime.datetime(2024, 7, 5, 6) }
+	result = database.handler
+
+	def handler(query_name, parameters):
+		if parameters["date_from"] in fail_on:
+			raise ValueError("query failed")
+		return result(query_name, parameters)
+
+	database.handler = handler
+	assert asyncio.run(warmer.warm()) == { "warmed": 1, "skipped": 0, "failed": 1 }
+
+	fail_on.clear()
+	database.calls.clear()
+	assert asyncio.run(warmer.warm()) == { "warmed": 1, "skipped": 1, "failed": 0 }
+	assert [call[2]["date_from"] for call in database.calls] == [datetime.datetime(2024, 7, 5, 6)]